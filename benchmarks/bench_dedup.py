@@ -0,0 +1,87 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+"""
+Benchmark near-duplicate detection on synthetic job postings: each base
+posting is reposted with small random edits (word substitutions, a
+dropped or added sentence), and the clusters found by NearDuplicates are
+compared to the true reposting groups.
+
+    python benchmarks/bench_dedup.py
+"""
+
+import jobstruct
+import numpy as np
+import random
+import tempfile
+import time
+from argparse import ArgumentParser
+
+
+def posting(rng, vocabulary, sentences=30):
+    return [
+        " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 20))) + "."
+        for _ in range(sentences)
+    ]
+
+
+def mutate(rng, vocabulary, sentences, rate):
+    sentences = list(sentences)
+    if rng.random() < 0.5:
+        del sentences[rng.randrange(len(sentences))]
+    if rng.random() < 0.5:
+        sentences.insert(rng.randrange(len(sentences)), posting(rng, vocabulary, 1)[0])
+    words = " ".join(sentences).split()
+    for i in range(len(words)):
+        if rng.random() < rate:
+            words[i] = rng.choice(vocabulary)
+    return " ".join(words)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--bases", type=int, default=2000)
+    parser.add_argument("--copies", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.01, help="word substitution rate")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = ["w{}".format(i) for i in range(5000)]
+    texts = []
+    truth = []
+    for base in range(args.bases):
+        sentences = posting(rng, vocabulary)
+        texts.append(" ".join(sentences))
+        truth.append(base)
+        for _ in range(rng.randint(0, args.copies)):
+            texts.append(mutate(rng, vocabulary, sentences, args.rate))
+            truth.append(base)
+    order = list(range(len(texts)))
+    rng.shuffle(order)
+    texts = [texts[i] for i in order]
+    truth = np.array([truth[i] for i in order])
+
+    dedup = jobstruct.NearDuplicates(threshold=args.threshold)
+    with tempfile.NamedTemporaryFile() as f:
+        start = time.perf_counter()
+        signatures = dedup.signatures(texts, f.name)
+        signed = time.perf_counter()
+        canonical = dedup.cluster(signatures)
+        clustered = time.perf_counter()
+
+    n = len(texts)
+    duplicates = canonical != np.arange(n)
+    correct = truth[canonical] == truth
+    first = np.zeros(n, dtype=bool)
+    first[np.unique(truth, return_index=True)[1]] = True
+    print("postings:   {} ({} true duplicates)".format(n, int(np.sum(~first))))
+    print("signatures: {:.0f} postings/s".format(n / (signed - start)))
+    print("clustering: {:.0f} postings/s".format(n / (clustered - signed)))
+    print("precision:  {:.4f}".format(np.sum(duplicates & correct) / max(1, np.sum(duplicates))))
+    print("recall:     {:.4f}".format(np.sum(duplicates & correct) / max(1, np.sum(~first))))
+
+
+if __name__ == "__main__":
+    main()
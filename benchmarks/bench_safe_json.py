@@ -0,0 +1,102 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+"""
+Benchmark `Prompts.safe_json` on large synthetic `extract` outputs against
+the previous regex-based implementation, for outputs with trailing prose
+(which made the regex backtrack quadratically), outputs in the
+single-quoted style of the prompt schemas, and outputs truncated by
+`max_tokens`, reporting the time per output and the fraction of fields
+recovered.
+
+    python benchmarks/bench_safe_json.py
+"""
+
+import json
+import random
+import re
+import time
+from argparse import ArgumentParser
+from jobstruct import Prompts
+
+
+def legacy_safe_json(text, default):
+    text = re.sub(r"(^[^\{\[]*)|([^\]\}]*$)", "", text)
+    try:
+        return json.loads(text)
+    except json.decoder.JSONDecodeError:
+        return default
+
+
+def extract_output(rng, items):
+    words = ["design", "build", "operate", "services", "customers", "team", "data", "systems"]
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(5, 15))).capitalize() + "."
+
+    return {
+        "job_title": "Software Development Engineer",
+        "details": [sentence() for _ in range(items)],
+        "required": {
+            "education": "Bachelor's degree",
+            "major": ["Computer Science"],
+            "experience": 3,
+            "qualifications": [sentence() for _ in range(items)],
+        },
+        "benefits": [sentence() for _ in range(items // 4)],
+        "salary": [115000.0, 223600.0],
+        "full_time": True,
+        "remote": False,
+    }
+
+
+def fields(value):
+    if isinstance(value, dict):
+        return sum(fields(item) for item in value.values())
+    if isinstance(value, list):
+        return sum(fields(item) for item in value)
+    return 1
+
+
+def timed(func, texts):
+    start = time.perf_counter()
+    results = [func(text, {}) for text in texts]
+    return (time.perf_counter() - start) / len(texts), results
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--outputs", type=int, default=5)
+    parser.add_argument("--items", type=int, default=200, help="list items per field")
+    parser.add_argument("--prose", type=int, default=20000, help="characters of trailing prose")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    values = [extract_output(rng, args.items) for _ in range(args.outputs)]
+    total = sum(fields(value) for value in values)
+    prose = ("This output follows the schema. " * (args.prose // 32 + 1))[:args.prose]
+    cases = {
+        "clean": [json.dumps(value) for value in values],
+        "trailing prose": ["Here is the JSON:\n" + json.dumps(value) + "\n" + prose for value in values],
+        "single-quoted": [repr(value) for value in values],
+        "truncated": [],
+    }
+    for text in cases["clean"]:
+        cases["truncated"].append(text[:rng.randrange(len(text) // 2, len(text))])
+
+    print("{:<16} {:>12} {:>12} {:>10} {:>10}".format("output", "legacy ms", "safe_json ms", "legacy %", "fields %"))
+    for name, texts in cases.items():
+        legacy_time, legacy = timed(legacy_safe_json, texts)
+        new_time, new = timed(Prompts.safe_json, texts)
+        print("{:<16} {:>12.2f} {:>12.2f} {:>10.1f} {:>10.1f}".format(
+            name,
+            1000 * legacy_time,
+            1000 * new_time,
+            100 * sum(fields(result) for result in legacy) / total,
+            100 * sum(fields(result) for result in new) / total,
+        ))
+
+
+if __name__ == "__main__":
+    main()
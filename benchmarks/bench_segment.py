@@ -0,0 +1,61 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+"""
+Benchmark HTML segmentation against the original implementation, which
+called `get_text` and searched the subtree of every element, on synthetic
+postings with sections nested in deep chains of divs.
+
+    python benchmarks/bench_segment.py
+"""
+
+import jobstruct
+import sys
+import time
+from argparse import ArgumentParser
+from bs4 import BeautifulSoup
+from pathlib import Path
+
+# The original implementation is shared with the conformance tests.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests" / "jobstruct"))
+from legacy import LegacyJobStructHTML
+
+
+def nested_posting(depth, sections):
+    body = []
+    for i in range(sections):
+        heading = ["Responsibilities", "Basic Qualifications", "Benefits", "Overview"][i % 4]
+        paragraph = "<p>We build robots that move packages through fulfillment centers every day.</p>"
+        body.append("<div>" * depth + "<h3>{}</h3>".format(heading) + paragraph * 3 + "</div>" * depth)
+    return "<html><body>{}</body></html>".format("".join(body))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("{:>6} {:>12} {:>12} {:>8}".format("depth", "legacy (ms)", "new (ms)", "speedup"))
+    for depth in [1, 10, 50, 100, 200, 400]:
+        soup = BeautifulSoup(nested_posting(depth, args.sections), "html.parser")
+        timings = []
+        for cls in [LegacyJobStructHTML, jobstruct.JobStructHTML]:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                result = cls(soup).to_dict()
+            timings.append((time.perf_counter() - start) / args.repeat)
+            if cls is LegacyJobStructHTML:
+                expected = result
+        assert result == expected
+        print("{:>6} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+            depth,
+            1000 * timings[0],
+            1000 * timings[1],
+            timings[0] / timings[1],
+        ))
+
+
+if __name__ == "__main__":
+    main()
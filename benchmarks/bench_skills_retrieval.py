@@ -0,0 +1,95 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+"""
+Benchmark the token reduction and recall of embedding-based candidate
+retrieval for the skills prompt, on a synthetic taxonomy and synthetic
+postings that each mention a few of its skills.
+
+    python benchmarks/bench_skills_retrieval.py
+"""
+
+import jobstruct
+import random
+import time
+from argparse import ArgumentParser
+
+
+def word(rng):
+    return "".join(rng.choice("bcdfghklmnprstvz") + rng.choice("aeiou") for _ in range(rng.randint(2, 4)))
+
+
+def synthetic_taxonomy(rng, groups, skills_per_group):
+    vocabulary = sorted(set(word(rng) for _ in range(4 * groups * skills_per_group)))
+    tree = {"name": "Skills", "children": []}
+    for _ in range(groups):
+        group = {"name": word(rng).title(), "children": []}
+        for _ in range(skills_per_group):
+            group["children"].append({
+                "name": " ".join(rng.sample(vocabulary, rng.randint(1, 3))).title()
+            })
+        tree["children"].append(group)
+    return tree, vocabulary
+
+
+def synthetic_posting(rng, skills, vocabulary, mentions):
+    gold = rng.sample(skills, mentions)
+    sentences = [
+        "Experience with {} is required.".format(skill.lower())
+        for skill in gold
+    ] + [
+        " ".join(rng.sample(vocabulary, 12)).capitalize() + "."
+        for _ in range(3 * mentions)
+    ]
+    rng.shuffle(sentences)
+    return " ".join(sentences), set(gold)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, default=40)
+    parser.add_argument("--skills-per-group", type=int, default=50)
+    parser.add_argument("--postings", type=int, default=200)
+    parser.add_argument("--mentions", type=int, default=5)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tree, vocabulary = synthetic_taxonomy(rng, args.groups, args.skills_per_group)
+    taxonomy = jobstruct.SkillsTaxonomyAI(tree)
+    leaves = [leaf.name for leaf in taxonomy.root.leaves()]
+    postings = [
+        synthetic_posting(rng, leaves, vocabulary, args.mentions)
+        for _ in range(args.postings)
+    ]
+
+    start = time.perf_counter()
+    taxonomy.build_index(jobstruct.HashingEmbedder(args.dimensions))
+    print("indexed {} nodes in {:.2f}s".format(len(taxonomy.nodes), time.perf_counter() - start))
+
+    full = taxonomy.prompt_tokens()
+    print("full taxonomy: ~{} tokens per skills prompt".format(full))
+    print("{:>6} {:>10} {:>10} {:>8} {:>12}".format("top_k", "tokens", "reduction", "recall", "ms/posting"))
+    for k in (10, 25, 50, 100, 200, 400):
+        taxonomy.top_k = k
+        tokens = 0
+        found = 0
+        start = time.perf_counter()
+        for text, gold in postings:
+            candidates = set(node.name for node in taxonomy.candidates(text))
+            found += len(gold & candidates)
+            tokens += taxonomy.prompt_tokens(query=text)
+        elapsed = time.perf_counter() - start
+        print("{:>6} {:>10.0f} {:>9.1f}x {:>8.3f} {:>12.2f}".format(
+            k,
+            tokens / len(postings),
+            full * len(postings) / tokens,
+            found / (len(postings) * args.mentions),
+            1000 * elapsed / len(postings),
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+"""
+Benchmark the memory use and traversal times of the array-backed
+SkillsNode tree against the original object-per-node implementation, on a
+synthetic taxonomy with about a million nodes.
+
+    python benchmarks/bench_skills_tree.py
+"""
+
+import gc
+import jobstruct
+import json
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+
+class LegacySkillsNode:
+
+    def __init__(self, name, attributes={}):
+        self.name = name
+        self.attributes = attributes
+        self.root = True
+        self.parent = None
+        self.children = []
+
+    @classmethod
+    def from_tree_dict(cls, tree):
+        root = cls(tree["name"], tree.get("attributes", {}))
+
+        def traverse(node, subtree):
+            for child_tree in subtree.get("children", []):
+                child = cls(child_tree["name"], child_tree.get("attributes", {}))
+                node.children.append(child)
+                child.parent = node
+                child.root = False
+                traverse(child, child_tree)
+
+        traverse(root, tree)
+        return root
+
+    def leaves(self):
+        result = []
+
+        def traverse(node):
+            if not node.children:
+                result.append(node)
+            for child in node.children:
+                traverse(child)
+
+        traverse(self)
+        return result
+
+    def names(self):
+        result = []
+
+        def traverse(node):
+            result.append(node.name)
+            for child in node.children:
+                traverse(child)
+
+        traverse(self)
+        return result
+
+    def to_tree_dict(self, attributes=False):
+        def traverse(node):
+            result = {"name": node.name, "children": [traverse(child) for child in node.children]}
+            if attributes:
+                result["attributes"] = node.attributes
+            return result
+
+        return traverse(self)
+
+
+def synthetic_tree(branching, depth):
+    count = 0
+
+    def build(level):
+        nonlocal count
+        count += 1
+        node = {"name": "Skill {}".format(count), "attributes": {"terminal": False}}
+        if level < depth:
+            node["children"] = [build(level + 1) for _ in range(branching)]
+        return node
+
+    return build(0)
+
+
+def measure(label, func):
+    gc.collect()
+    start = time.perf_counter()
+    result = func()
+    print("  {:<16} {:>8.2f} s".format(label, time.perf_counter() - start))
+    return result
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--branching", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=6)
+    args = parser.parse_args()
+
+    text = json.dumps(synthetic_tree(args.branching, args.depth))
+    tree = json.loads(text)
+    for cls in [LegacySkillsNode, jobstruct.SkillsNode]:
+        print(cls.__name__)
+        # Load the taxonomy from JSON while tracing, so that the attribute
+        # dicts the legacy tree keeps from the input are counted against it,
+        # and the parsed input the array-backed tree discards is not.
+        gc.collect()
+        tracemalloc.start()
+        root = cls.from_tree_dict(json.loads(text))
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("  {:<16} {:>8.1f} MB".format("memory", memory / 1e6))
+        root = measure("from_tree_dict", lambda: cls.from_tree_dict(tree))
+        names = measure("names", root.names)
+        leaves = measure("leaves", root.leaves)
+        measure("leaf names", lambda: [leaf.name for leaf in leaves])
+        measure("to_tree_dict", lambda: root.to_tree_dict(attributes=True))
+        print("  {:<16} {:>8}".format("nodes", len(names)))
+        del root
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,20 @@
 and modeling skills and occupations in job postings.
 """
 
-from .jobstructai      import JobStructAI
-from .jobstructhtml    import JobStructHTML
-from .prompts          import Prompts
-from .skillsnode       import SkillsNode
-from .skillstaxonomyai import SkillsTaxonomyAI
+from .cache                import CachingClient, ResponseCache
+from .checkpoint           import EnrichCheckpoint
+from .compaction           import Compactor
+from .dedup                import NearDuplicates
+from .embeddings           import BedrockEmbedder, HashingEmbedder
+from .embeddingstore       import EmbeddingStore
+from .jobstructai          import JobStructAI
+from .jobstructhtml        import HTMLDocument, JobStructHTML
+from .occupationclassifier import OccupationClassifier
+from .prompts              import Prompts
+from .ratelimit            import GovernedClient, RateGovernor
+from .rules                import RuleExtractor, RuleStats
+from .skillsindex          import SkillsIndex
+from .skillsnode           import NodeAttributes, NodeList, SkillsNode, SkillsTree
+from .skillstaxonomyai     import SkillsTaxonomyAI
 
 __version__ = "0.1.1"
@@ -3,19 +3,37 @@
 # SPDX-License-Identifier: CC-BY-NC-4.0
 
 import boto3
+import collections
+import hashlib
+import itertools
 import jobstruct
+import jobstruct.batch
 import json
 import logging
+import multiprocessing
+import numpy as np
+import os
 import sys
+import tempfile
+import time
 from argparse import ArgumentParser, Namespace
 from botocore.config import Config
 from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
+from typing import Dict, Iterator, Set, Tuple
 
 
-def get_client(args: Namespace, timeout: int = 60) -> BedrockRuntimeClient:
+def get_client(
+    args: Namespace,
+    timeout: int = 60,
+    connections: int = 10,
+) -> BedrockRuntimeClient:
     """
     Establish a Bedrock client in the specified region using the
-    specified AWS profile.
+    specified AWS profile, with requests rate limited and retried by the
+    rate governor and responses served from the response cache, if those
+    are enabled. The client is thread-safe and keeps a pool of
+    up to `connections` HTTP connections, so that it can be shared by
+    concurrent workers.
     """
 
     if args.profile:
@@ -23,58 +41,471 @@ def get_client(args: Namespace, timeout: int = 60) -> BedrockRuntimeClient:
     else:
         session = boto3.Session()
 
-    return session.client(
+    config = Config(
+        read_timeout=timeout,
+        max_pool_connections=max(connections, 10),
+    )
+    if args.governor is not None:
+        # Retries are handled by the rate governor instead of botocore.
+        config = config.merge(Config(retries={"total_max_attempts": 1}))
+
+    client = session.client(
         service_name="bedrock-runtime",
         region_name=args.region,
-        config=Config(read_timeout=timeout),
+        config=config,
     )
 
+    if args.governor is not None:
+        client = jobstruct.GovernedClient(client, args.governor)
+    if args.cache is not None:
+        client = jobstruct.CachingClient(client, args.cache)
+
+    return client
+
+
+def input_key(filename: str, key: str) -> str:
+    """
+    Key that identifies an input file in JSONL output: either the input
+    path itself or the SHA-256 hash of the file contents.
+    """
+    if key == "sha256":
+        with open(filename, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    return filename
+
+
+def is_html(filename: str) -> bool:
+    """
+    Whether the input file `filename` is an HTML job posting.
+    """
+    return filename.endswith(".html") or filename.endswith(".htm")
+
+
+def read_input(filename: str, parser: str = "") -> str:
+    """
+    Read the text of the input file `filename`, extracting the text of HTML
+    job postings with `parser`.
+    """
+    with open(filename) as f:
+        text = f.read()
+    return jobstruct.JobStructAI.html_text(text, parser) if is_html(filename) else text
+
+
+def read_completed(filename: str) -> Set[str]:
+    """
+    Return the keys of the records in an existing JSONL output file that
+    completed without an error. A partially written final line, for example
+    from a crash, is truncated so that new records can be appended.
+    """
+    completed = set()
+    if not os.path.exists(filename):
+        return completed
+
+    with open(filename, "rb+") as f:
+        offset = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                f.truncate(offset)
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                continue
+            if "error" not in record:
+                completed.add(record["id"])
+
+    return completed
+
 
 def run_extract(args: Namespace) -> None:
     """
-    Extract structured information from a list of input files and
-    write to json output.
+    Extract structured information from a list of input files, or from
+    the results of a Bedrock batch inference job, and write to json output
+    or stream to JSONL output one record at a time.
     """
 
-    results = []
+    log = logging.getLogger("jobstruct.extract")
+
+    if args.resume and args.format != "jsonl":
+        sys.exit("jobstruct extract: --resume requires --format jsonl")
+    if args.resume and args.output == "-":
+        sys.exit("jobstruct extract: --resume requires an output file")
+    if bool(args.inputs) == bool(args.batch_import):
+        sys.exit("jobstruct extract: provide either input files or --batch-import")
+
+    if args.dedup and args.batch_import:
+        sys.exit("jobstruct extract: --dedup requires input files")
+    if args.pack and args.batch_import:
+        sys.exit("jobstruct extract: --pack requires input files")
+
+    def read_text(filename):
+        return read_input(filename, args.parser)
+
+    if args.boilerplate:
+        compactor = jobstruct.Compactor.from_file(args.boilerplate)
+    elif args.compact:
+        compactor = jobstruct.Compactor()
+    else:
+        compactor = None
+
+    if args.batch_export:
+        with open(args.batch_export, "w") as f:
+            try:
+                jobstruct.batch.export_batch(
+                    ((input_key(filename, args.key), read_text(filename)) for filename in args.inputs),
+                    jobstruct.Prompts(None, args.prompt_config),
+                    f,
+                    compactor=compactor,
+                )
+            except ValueError as e:
+                sys.exit("jobstruct extract: {}".format(e))
+        return
 
     if args.skills:
-        skills = jobstruct.SkillsTaxonomyAI.from_file(args.skills)
+        skills = jobstruct.SkillsTaxonomyAI.from_file(args.skills, args.skills_format)
+        log.info("skills taxonomy adds ~{} tokens to each skills prompt in '{}' format".format(
+            skills.prompt_tokens(),
+            args.skills_format,
+        ))
     else:
         skills = None
 
-    def constructor(filename):
-        if filename.endswith(".html") or filename.endswith(".htm"):
-            return jobstruct.JobStructAI.from_html_file
+    if args.occupation_model:
+        occupation = jobstruct.OccupationClassifier.from_file(args.occupation_model)
+        if args.occupation_threshold is not None:
+            occupation.threshold = args.occupation_threshold
+    else:
+        occupation = args.occupation
+
+    def from_any_file(filename, *params, **options):
+        if is_html(filename):
+            return jobstruct.JobStructAI.from_html_file(filename, *params, parser=args.parser, compactor=compactor, **options)
         else:
-            return jobstruct.JobStructAI.from_file
+            return jobstruct.JobStructAI.from_file(filename, *params, compactor=compactor, **options)
+
+    def from_batch_result(result, *args, **options):
+        if isinstance(result, Exception):
+            raise result
+        return jobstruct.JobStructAI.from_extract(result, *args, **options)
+
+    def read_batch_results():
+        # Truncated outputs are continued on the client created below.
+        with open(args.batch_import) as f:
+            yield from jobstruct.batch.import_batch(f, prompts=jobstruct.Prompts(client, args.prompt_config))
 
-    results = [
-        constructor(filename)(
-            filename,
-            get_client(args),
+    if args.batch_import:
+        items = read_batch_results()
+        constructor = from_batch_result
+    else:
+        items = ((input_key(filename, args.key), filename) for filename in args.inputs)
+        constructor = from_any_file
+
+    completed = set()
+    if args.resume:
+        completed = read_completed(args.output)
+        log.info("resuming after {} completed records".format(len(completed)))
+        items = ((key, value) for key, value in items if key not in completed)
+
+    # Map each near-duplicate input file to the file and key of the first
+    # input in its cluster, which is extracted in its place. Inputs are
+    # matched by file rather than by key, so that exact duplicates with the
+    # same sha256 key are also extracted once.
+    duplicate_of = {}
+    if args.dedup:
+        dedup = jobstruct.NearDuplicates(threshold=args.dedup_threshold)
+        with tempfile.TemporaryDirectory() as tmp:
+            signatures = dedup.signatures(map(read_text, args.inputs), os.path.join(tmp, "signatures"))
+            canonical = dedup.cluster(signatures)
+            del signatures
+
+        # Keep only the keys of canonical inputs with duplicates. A duplicate
+        # whose canonical input already completed in a previous run is
+        # extracted itself.
+        heads = set(canonical[canonical != np.arange(len(canonical))].tolist())
+        head_keys = {}
+        for i, filename in enumerate(args.inputs):
+            c = int(canonical[i])
+            if i in heads:
+                head_keys[i] = input_key(filename, args.key)
+            elif c != i and args.inputs[c] != filename and head_keys[c] not in completed:
+                duplicate_of[filename] = (args.inputs[c], head_keys[c])
+        log.info("skipping extraction of {} near-duplicate inputs".format(len(duplicate_of)))
+
+    if duplicate_of:
+        all_items, items = itertools.tee(items)
+        items = ((key, value) for key, value in items if value not in duplicate_of)
+
+    # A single client is shared by all workers.
+    client = get_client(args, connections=args.workers)
+
+    if skills is not None and args.skills_top_k:
+        skills.build_index(
+            jobstruct.BedrockEmbedder(client, args.prompt_config, args.workers),
+            args.skills_top_k,
+        )
+
+    items, values = itertools.tee(items)
+    if args.pack:
+        extracted = jobstruct.JobStructAI.extract_packed(
+            (value for _, value in values),
+            client,
+            skills,
+            occupation,
+            args.embedding or bool(args.embedding_store),
+            args.prompt_config,
+            workers=args.workers,
+            read=read_text,
+            compactor=compactor,
+        )
+    else:
+        extracted = jobstruct.JobStructAI.extract_many(
+            (value for _, value in values),
+            client,
             skills,
-            args.occupation,
-            args.embedding,
+            occupation,
+            args.embedding or bool(args.embedding_store),
             args.prompt_config,
-        ).to_dict()
-        for filename in args.inputs
-    ]
+            workers=args.workers,
+            constructor=constructor,
+        )
+    results = zip((key for key, _ in items), extracted)
+
+    # Embeddings moved out of the output, by key, until their output record
+    # is written. They are appended to the store only after the record, so
+    # that a resumed run does not append the embedding of a record again.
+    embeddings = {}
+    store = None
+
+    def hold_embeddings(results):
+        for key, result in results:
+            if not isinstance(result, Exception) and result.embedding:
+                embeddings[key] = result.embedding
+                result.embedding = None
+            yield key, result
+
+    def store_embedding(key):
+        nonlocal store
+        embedding = embeddings.pop(key, None)
+        if embedding:
+            if store is None:
+                store = jobstruct.EmbeddingStore(args.embedding_store, len(embedding))
+            store.append([key], np.array([embedding]))
+
+    if args.embedding_store:
+        results = hold_embeddings(results)
+
+    def with_duplicates(results):
+        # Give each duplicate the result of its canonical input, keeping
+        # each canonical result only until its last duplicate is written.
+        if not duplicate_of:
+            for key, result in results:
+                yield key, result, None
+            return
+        remaining = collections.Counter(filename for filename, _ in duplicate_of.values())
+        kept = {}
+        for key, value in all_items:
+            if value in duplicate_of:
+                filename, canonical = duplicate_of[value]
+                result = kept[filename]
+                remaining[filename] -= 1
+                if not remaining[filename]:
+                    del kept[filename]
+                yield key, result, canonical
+            else:
+                _, result = next(results)
+                if remaining[value]:
+                    kept[value] = result
+                yield key, result, None
+
+    rule_stats = jobstruct.RuleStats()
+    tokens_saved = 0
+
+    def count_rules(results):
+        nonlocal tokens_saved
+        for key, result in results:
+            if not isinstance(result, Exception):
+                rule_stats.add(result.rule_fields, result.extract_calls)
+                tokens_saved += result.tokens_saved
+            yield key, result
+
+    results = with_duplicates(count_rules(results))
+
+    def to_dict(result, canonical):
+        record = result.to_dict()
+        if canonical is not None:
+            record["duplicate_of"] = canonical
+        return record
+
+    if args.format == "json":
+        # Bedrock does not keep the order of batch records, so imported
+        # records are identified by their recordId, as in jsonl output.
+        output = []
+        keys = []
+        for key, result, canonical in results:
+            keys.append(key)
+            if isinstance(result, Exception):
+                log.error("skipping input '{}'".format(key))
+                output.append({"id": key, "error": repr(result)} if args.batch_import else None)
+            elif args.batch_import:
+                record = {"id": key}
+                record.update(to_dict(result, canonical))
+                output.append(record)
+            else:
+                output.append(to_dict(result, canonical))
+
+        with open(args.output, "w") if args.output != "-" else sys.stdout as f:
+            json.dump(output, f)
+        for key in keys:
+            store_embedding(key)
+
+    else:
+        mode = "a" if args.resume else "w"
+        with open(args.output, mode) if args.output != "-" else sys.stdout as f:
+            for key, result, canonical in results:
+                if isinstance(result, Exception):
+                    record = {"id": key, "error": repr(result)}
+                else:
+                    record = {"id": key}
+                    record.update(to_dict(result, canonical))
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                store_embedding(key)
+
+    if rule_stats.fields:
+        log.info(str(rule_stats))
+    if compactor is not None:
+        log.info("compaction saved ~{} input tokens in {} postings".format(tokens_saved, rule_stats.postings))
+
+
+def run_boilerplate(args: Namespace) -> None:
+    """
+    Learn a table of boilerplate sentences from a corpus of input files,
+    for compacting postings with `extract --boilerplate`.
+    """
+    compactor = jobstruct.Compactor.from_corpus(
+        (read_input(filename, args.parser) for filename in args.inputs),
+        min_fraction=args.min_fraction,
+        min_documents=args.min_documents,
+    )
+    compactor.save(args.output)
+
+
+def segment_file(task: Tuple[str, str, str]) -> Tuple[str, bool]:
+    """
+    Segment the HTML input file in a (filename, key, parser) `task`, and
+    return its JSONL output record and whether it succeeded. Runs in a
+    worker process, so the record is serialized before it is returned.
+    """
+    filename, key, parser = task
+    record = {"id": filename}
+    try:
+        record["id"] = input_key(filename, key)
+        record.update(jobstruct.JobStructHTML.from_file(filename, parser).to_dict())
+        return json.dumps(record), True
+    except Exception as e:
+        # Identify the error by the input key, or by the filename if the
+        # input could not be read.
+        return json.dumps({"id": record["id"], "error": repr(e)}), False
+
+
+def run_segment(args: Namespace) -> None:
+    """
+    Segment HTML input files with JobStructHTML on a pool of worker
+    processes, and stream the segments to JSONL output in input order.
+    """
+    log = logging.getLogger("jobstruct.segment")
+
+    def read_filenames():
+        yield from args.inputs
+        if args.files_from:
+            with open(args.files_from) if args.files_from != "-" else sys.stdin as f:
+                for line in f:
+                    if line.strip():
+                        yield line.rstrip("\n")
+
+    tasks = ((filename, args.key, args.parser) for filename in read_filenames())
 
+    n = 0
+    errors = 0
+    start = time.perf_counter()
     with open(args.output, "w") if args.output != "-" else sys.stdout as f:
-        json.dump(results, f)
+        if args.processes == 1:
+            pool = None
+            records = map(segment_file, tasks)
+        else:
+            # Tasks are sent to the workers in chunks to amortize the
+            # interprocess communication, and results come back in order.
+            pool = multiprocessing.Pool(args.processes or None)
+            records = pool.imap(segment_file, tasks, chunksize=args.chunksize)
+        try:
+            for record, ok in records:
+                f.write(record + "\n")
+                n += 1
+                errors += not ok
+        finally:
+            if pool is not None:
+                pool.terminate()
+    elapsed = time.perf_counter() - start
+
+    log.info("segmented {} documents ({} errors) in {:.1f}s: {:.1f} documents/sec".format(
+        n,
+        errors,
+        elapsed,
+        n / elapsed if elapsed > 0 else 0.0,
+    ))
+
+
+def read_records(filename: str) -> Iterator[Dict]:
+    """
+    Read the records in json or jsonl output from the extract command.
+    """
+    with open(filename) as f:
+        if filename.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+def run_train_occupation(args: Namespace) -> None:
+    """
+    Train a local occupation classifier from extracted records that
+    include embeddings and occupations.
+    """
+    classifier = jobstruct.OccupationClassifier.from_records(
+        itertools.chain.from_iterable(read_records(filename) for filename in args.inputs),
+        threshold=args.threshold,
+    )
+
+    with open(args.output, "w") if args.output != "-" else sys.stdout as f:
+        json.dump(classifier.to_dict(), f)
 
 
 def run_enrich(args: Namespace) -> None:
     """
     Enrich a skills taxonomy.
     """
+    if args.resume and not args.checkpoint:
+        sys.exit("jobstruct enrich: --resume requires --checkpoint")
+
     if args.input:
         skills = jobstruct.SkillsTaxonomyAI.from_file(args.input)
     else:
         skills = jobstruct.SkillsTaxonomyAI()
 
-    skills.enrich(get_client(args), args.prompt_config)
+    skills.enrich(
+        get_client(args, connections=args.workers),
+        args.prompt_config,
+        workers=args.workers,
+        rounds=args.rounds,
+        max_depth=args.max_depth,
+        max_calls=args.max_calls,
+        max_nodes=args.max_nodes,
+        checkpoint=args.checkpoint,
+        resume=args.resume,
+    )
 
     with open(args.output, "w") if args.output != "-" else sys.stdout as f:
         json.dump(skills.to_dict(), f, indent=2)
@@ -136,6 +567,39 @@ def main():
         default="",
         help="prompt configuration file",
     )
+    parser.add_argument(
+        "--rate-limits",
+        default="",
+        help="per-model starting rate limits file matching your account quotas (default: included rate_limits.json, which has placeholder values)",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=8,
+        help="maximum attempts per Bedrock request, retrying throttles, timeouts and server errors with backoff (default: 8)",
+    )
+    parser.add_argument(
+        "--no-rate-limit",
+        action="store_true",
+        help="disable the built-in rate governor",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="",
+        help="cache Bedrock responses in this directory and reuse them across runs",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        type=float,
+        default=0,
+        help="evict least recently used cached responses above this size in MB (default: unlimited)",
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        type=float,
+        default=0,
+        help="expire cached responses older than this many days (default: never)",
+    )
 
     # extract command
 
@@ -144,7 +608,7 @@ def main():
     extract.add_argument(
         "inputs",
         help="input HTML or text files",
-        nargs="+"
+        nargs="*"
     )
     extract.add_argument(
         "-o",
@@ -152,21 +616,214 @@ def main():
         default="-",
         help="output file (default: stdout)",
     )
+    extract.add_argument(
+        "--parser",
+        default="",
+        help="BeautifulSoup parser for HTML inputs, such as lxml, html.parser, or auto for lxml if it is installed (default: html.parser)",
+    )
     extract.add_argument(
         "--skills",
         default="",
         help="skills taxonomy file to use for extracting skills",
     )
+    extract.add_argument(
+        "--skills-format",
+        choices=jobstruct.SkillsTaxonomyAI.prompt_formats,
+        default="json",
+        help="serialization of the skills taxonomy in the skills prompt; outline is much smaller, but changes the prompt (default: json)",
+    )
+    extract.add_argument(
+        "--skills-top-k",
+        type=int,
+        default=0,
+        help="include only the K taxonomy nodes most similar to each posting in the skills prompt, retrieved by embedding (default: all nodes)",
+    )
     extract.add_argument(
         "--occupation",
         action="store_true",
         help="estimate the occupational code from the extracted information",
     )
+    extract.add_argument(
+        "--occupation-model",
+        default="",
+        help="predict the occupational code with a local classifier (see train-occupation), falling back to the occupation prompt for low-confidence postings",
+    )
+    extract.add_argument(
+        "--occupation-threshold",
+        type=float,
+        default=None,
+        help="minimum confidence for local occupation predictions (default: from the classifier)",
+    )
     extract.add_argument(
         "--embedding",
         action="store_true",
         help="estimate an embedding of the extracted information",
     )
+    extract.add_argument(
+        "--embedding-store",
+        default="",
+        help="estimate embeddings and append them to a memory-mapped embedding store in this directory, instead of the output",
+    )
+    extract.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of postings to extract concurrently (default: 1)",
+    )
+    extract.add_argument(
+        "--format",
+        choices=["json", "jsonl"],
+        default="json",
+        help="write a single json list, or stream one json record per line as each posting finishes (default: json)",
+    )
+    extract.add_argument(
+        "--key",
+        choices=["path", "sha256"],
+        default="path",
+        help="identify jsonl records by input path or by a hash of the input contents (default: path)",
+    )
+    extract.add_argument(
+        "--dedup",
+        action="store_true",
+        help="extract only the first of each cluster of near-duplicate inputs, and copy its result to the others with a 'duplicate_of' key",
+    )
+    extract.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.8,
+        help="minimum estimated Jaccard similarity of word shingles for near-duplicate inputs (default: 0.8)",
+    )
+    extract.add_argument(
+        "--batch-export",
+        default="",
+        help="instead of extracting, write the extract requests for the inputs to this Bedrock batch inference input file",
+    )
+    extract.add_argument(
+        "--batch-import",
+        default="",
+        help="instead of input files, extract from this Bedrock batch inference output file",
+    )
+    extract.add_argument(
+        "--resume",
+        action="store_true",
+        help="append to existing jsonl output, skipping inputs that already completed",
+    )
+    extract.add_argument(
+        "--pack",
+        action="store_true",
+        help="extract short postings together, up to the max_pack setting of the extract_packed prompt per call",
+    )
+    extract.add_argument(
+        "--compact",
+        action="store_true",
+        help="remove EEO statements and extra whitespace from postings before the extract prompt",
+    )
+    extract.add_argument(
+        "--boilerplate",
+        default="",
+        help="also remove the boilerplate sentences in this file (see the boilerplate command) before the extract prompt",
+    )
+
+    # boilerplate command
+
+    boilerplate = subparsers.add_parser("boilerplate")
+    boilerplate.set_defaults(run=run_boilerplate)
+    boilerplate.add_argument(
+        "inputs",
+        help="input HTML or text files",
+        nargs="+"
+    )
+    boilerplate.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="output file",
+    )
+    boilerplate.add_argument(
+        "--min-fraction",
+        type=float,
+        default=0.05,
+        help="minimum fraction of the inputs that contain a boilerplate sentence (default: 0.05)",
+    )
+    boilerplate.add_argument(
+        "--min-documents",
+        type=int,
+        default=5,
+        help="minimum number of inputs that contain a boilerplate sentence (default: 5)",
+    )
+    boilerplate.add_argument(
+        "--parser",
+        default="",
+        help="BeautifulSoup parser for HTML inputs, such as lxml, html.parser, or auto for lxml if it is installed (default: html.parser)",
+    )
+
+    # train-occupation command
+
+    train_occupation = subparsers.add_parser("train-occupation")
+    train_occupation.set_defaults(run=run_train_occupation)
+    train_occupation.add_argument(
+        "inputs",
+        help="json or jsonl output files from extract with --occupation and --embedding",
+        nargs="+"
+    )
+    train_occupation.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="output file (default: stdout)",
+    )
+    train_occupation.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="minimum confidence for local occupation predictions (default: 0.5)",
+    )
+
+    # segment command
+
+    segment = subparsers.add_parser("segment")
+    segment.set_defaults(run=run_segment)
+    segment.add_argument(
+        "inputs",
+        help="input HTML files",
+        nargs="*"
+    )
+    segment.add_argument(
+        "--files-from",
+        default="",
+        help="read additional input paths, one per line, from this file ('-' for stdin)",
+    )
+    segment.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="output JSONL file (default: stdout)",
+    )
+    segment.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=0,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    segment.add_argument(
+        "--chunksize",
+        type=int,
+        default=64,
+        help="number of inputs sent to a worker process at a time (default: 64)",
+    )
+    segment.add_argument(
+        "--parser",
+        default="",
+        help="BeautifulSoup parser, such as lxml, html.parser, or auto for lxml if it is installed (default: html.parser)",
+    )
+    segment.add_argument(
+        "--key",
+        choices=["path", "sha256"],
+        default="path",
+        help="identify records by input path or by a hash of the input contents (default: path)",
+    )
 
     # enrich command
 
@@ -183,6 +840,47 @@ def main():
         default="-",
         help="output file (default: stdout)",
     )
+    enrich.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of leaf nodes to expand concurrently (default: 1)",
+    )
+    enrich.add_argument(
+        "--rounds",
+        type=int,
+        default=1,
+        help="number of rounds of expansion, each expanding the leaf nodes added by the previous round (default: 1)",
+    )
+    enrich.add_argument(
+        "--max-depth",
+        type=int,
+        default=0,
+        help="do not expand leaf nodes at this depth or deeper (default: unlimited)",
+    )
+    enrich.add_argument(
+        "--max-calls",
+        type=int,
+        default=0,
+        help="maximum number of prompt calls (default: unlimited)",
+    )
+    enrich.add_argument(
+        "--max-nodes",
+        type=int,
+        default=0,
+        help="stop expanding when the taxonomy reaches this many nodes (default: unlimited)",
+    )
+    enrich.add_argument(
+        "--checkpoint",
+        default="",
+        help="log each leaf expansion to this file as it completes, so that an interrupted run can be resumed",
+    )
+    enrich.add_argument(
+        "--resume",
+        action="store_true",
+        help="replay the --checkpoint file and continue with the leaf nodes that were not yet expanded",
+    )
 
     # refine command
 
@@ -213,10 +911,44 @@ def main():
     else:
         logging.basicConfig(level=logging.INFO)
 
+    # open response cache
+
+    if args.cache_dir:
+        args.cache = jobstruct.ResponseCache(
+            args.cache_dir,
+            max_size=int(args.cache_max_size * 1024 * 1024),
+            max_age=args.cache_max_age * 86400,
+        )
+    else:
+        args.cache = None
+
+    # create rate governor
+
+    if args.no_rate_limit:
+        args.governor = None
+    elif args.rate_limits:
+        args.governor = jobstruct.RateGovernor.from_file(
+            args.rate_limits,
+            max_attempts=args.max_attempts,
+        )
+    else:
+        args.governor = jobstruct.RateGovernor(max_attempts=args.max_attempts)
+
     # run command
 
     args.run(args)
 
+    if args.governor is not None:
+        logging.getLogger("jobstruct").info(
+            "rate governor: {}".format(args.governor.stats())
+        )
+
+    if args.cache is not None:
+        logging.getLogger("jobstruct").info(
+            "response cache: {}".format(args.cache.stats())
+        )
+        args.cache.close()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,99 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import json
+import logging
+from typing import IO, Iterable, Iterator, List, Optional, Tuple, Union
+from .compaction import Compactor
+from .prompts import Prompts
+
+
+def export_batch(
+    records: Iterable[Tuple[str, str]],
+    prompts: Prompts,
+    f: IO,
+    name: str = "extract",
+    compactor: Optional[Compactor] = None,
+) -> str:
+    """
+    Write a Bedrock batch inference input record to `f` for each (record ID,
+    text) pair in `records`. Each JSONL record contains the `recordId` and,
+    as the `modelInput`, the exact request body that `prompts.invoke` would
+    send for prompt `name`, after compacting the text with the `compactor`,
+    if any. Return the model ID to run the batch inference job with.
+
+    A batch record is a single request for the whole text, and its output
+    is imported without the text, so prompt configurations that fill fields
+    by rules (`rules_confidence`), restrict the `fields`, or split texts into
+    chunks (`chunk_tokens`) raise a ValueError before anything is written.
+    Outputs cut off at `max_tokens` are continued by `import_batch`.
+    """
+    log = logging.getLogger("jobstruct.batch.export_batch")
+
+    unsupported = [
+        key for key in ("rules_confidence", "fields", "chunk_tokens")
+        if prompts.setting(name, key)
+    ]
+    if unsupported:
+        raise ValueError("batch export does not support the '{}' settings of prompt '{}'".format(
+            "', '".join(unsupported),
+            name,
+        ))
+
+    modelId = None
+    n = 0
+    for recordId, text in records:
+        if compactor is not None:
+            text = compactor.compact(text)
+        modelId, body = prompts.request(name, text)
+        f.write(json.dumps({
+            "recordId": recordId,
+            "modelInput": json.loads(body),
+        }) + "\n")
+        n += 1
+
+    if modelId is None:
+        modelId = prompts.prompt_configs[name]["modelId"]
+    log.info("exported {} '{}' records for model '{}'".format(n, name, modelId))
+
+    return modelId
+
+
+def import_batch(
+    f: IO,
+    name: str = "extract",
+    prompts: Optional[Prompts] = None,
+) -> Iterator[Tuple[str, Union[str, List, Exception]]]:
+    """
+    Read the Bedrock batch inference output records in `f`, which contain
+    the `modelOutput` response body or an `error` for each `recordId`, and
+    yield a (record ID, result) pair for each, where the result is parsed
+    from the response body as by `prompts.invoke` for prompt `name`.
+
+    Outputs that stopped at `max_tokens` are continued on demand from the
+    record's `modelInput` with `prompts`, up to its `max_continuations`
+    setting. Records that failed in the batch job, that cannot be parsed,
+    or that were truncated and cannot be continued yield an exception as
+    the result.
+    """
+    for line in f:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        recordId = record.get("recordId")
+        if "modelOutput" in record:
+            try:
+                data = record["modelOutput"]
+                if not Prompts.truncated(name, data):
+                    yield recordId, Prompts.response(name, data)
+                elif prompts is not None and prompts.setting(name, "max_continuations") and "modelInput" in record:
+                    yield recordId, prompts.resume(name, record["modelInput"], data)
+                else:
+                    yield recordId, RuntimeError("batch output was truncated at max_tokens")
+            except Exception as e:
+                yield recordId, e
+        else:
+            yield recordId, RuntimeError(
+                "batch record failed: {}".format(record.get("error"))
+            )
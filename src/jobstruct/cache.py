@@ -0,0 +1,202 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
+from typing import Dict, Optional
+
+class ResponseCache:
+    """
+    A persistent, content-addressed cache of Bedrock responses stored in a
+    SQLite database. Responses are keyed on a hash of the model ID and the
+    exact serialized request body, so identical requests are only paid for
+    once across runs. The cache is safe to share between threads.
+
+    Entries older than `max_age` seconds are expired, and the least
+    recently used entries are evicted once the total size of the cached
+    responses exceeds `max_size` bytes. A value of 0 disables the limit.
+    """
+
+    filename = "responses.sqlite"
+
+    def __init__(
+        self,
+        directory: str,
+        max_size: int = 0,
+        max_age: float = 0,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, ResponseCache.filename)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS accessed ON responses (accessed)")
+        self._db.commit()
+        self.size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        self.evict()
+
+    @staticmethod
+    def key(modelId: str, body: str) -> str:
+        """
+        Content address of a request for `modelId` with the serialized
+        request `body`.
+        """
+        return hashlib.sha256(
+            "{}\n{}".format(modelId, body).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, modelId: str, body: str) -> Optional[bytes]:
+        """
+        Return the cached response for the request, or None on a miss.
+        """
+        key = ResponseCache.key(modelId, body)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None or (self.max_age and row[1] < now - self.max_age):
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                (now, key)
+            )
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, modelId: str, body: str, response: bytes) -> None:
+        """
+        Store the `response` for the request and evict entries as needed to
+        stay within the size limit.
+        """
+        key = ResponseCache.key(modelId, body)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is not None:
+                self.size -= row[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response), now, now)
+            )
+            self._db.commit()
+            self.size += len(response)
+        if self.max_size and self.size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove expired entries, then the least recently used entries until
+        the cache is within its size limit.
+        """
+        log = logging.getLogger("jobstruct.ResponseCache.evict")
+        with self._lock:
+            if self.max_age:
+                cursor = self._db.execute(
+                    "DELETE FROM responses WHERE created < ?",
+                    (time.time() - self.max_age,)
+                )
+                self.evictions += cursor.rowcount
+            if self.max_size:
+                self.size = self._db.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()[0]
+                if self.size > self.max_size:
+                    # Evict down to 90% of the limit, so that eviction is
+                    # not triggered again by the next insert.
+                    excess = self.size - int(0.9 * self.max_size)
+                    keys = []
+                    for key, size in self._db.execute(
+                        "SELECT key, size FROM responses ORDER BY accessed"
+                    ):
+                        if excess <= 0:
+                            break
+                        keys.append((key,))
+                        excess -= size
+                    self._db.executemany("DELETE FROM responses WHERE key = ?", keys)
+                    self.evictions += len(keys)
+            self._db.commit()
+            self.size = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+        log.debug("cache size after eviction: {} bytes".format(self.size))
+
+    def stats(self) -> Dict:
+        """
+        Return the hit/miss counters and current size of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": self.size,
+        }
+
+    def close(self) -> None:
+        """
+        Close the underlying database.
+        """
+        with self._lock:
+            self._db.close()
+
+
+class CachingClient:
+    """
+    Wraps a Bedrock runtime `client` so that `invoke_model` responses are
+    served from, and saved to, a ResponseCache. Only deterministic requests
+    (with a temperature of 0, or no temperature, as for embeddings) are
+    cached. All other client methods pass through to the wrapped client.
+    """
+
+    def __init__(self, client: BedrockRuntimeClient, cache: ResponseCache):
+        self.client = client
+        self.cache = cache
+
+    def invoke_model(self, body: str, modelId: str, **kwargs) -> Dict:
+        if json.loads(body).get("temperature", 0.0) != 0.0:
+            return self.client.invoke_model(body=body, modelId=modelId, **kwargs)
+
+        data = self.cache.get(modelId, body)
+        if data is None:
+            response = self.client.invoke_model(body=body, modelId=modelId, **kwargs)
+            data = response["body"].read()
+            self.cache.put(modelId, body, data)
+            response = dict(response)
+        else:
+            response = {"contentType": kwargs.get("accept", "application/json")}
+        response["body"] = io.BytesIO(data)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
@@ -0,0 +1,103 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import json
+import logging
+import os
+from typing import Dict, List
+
+class EnrichCheckpoint:
+    """
+    An append-only JSONL log of the progress of `SkillsTaxonomyAI.enrich`
+    in `filename`, from which an interrupted enrichment can be resumed.
+    Nodes are identified by their location, the position of each node from
+    the root to the node among its siblings. The log contains three kinds
+    of records:
+    * {"round", "frontier"}: the locations of the leaf nodes to expand in a
+      round
+    * {"round", "path", "children"}: the children added to the leaf node at
+      location `path` by its expansion (as tree dicts with attributes), or
+      null if the expansion failed
+    * {"snapshot", "round", "calls", "frontier"}: the whole tree, the number
+      of prompt calls so far, and the locations of the leaf nodes that
+      remain to be expanded in the current round
+
+    After every `compact_every` records, the log is compacted by atomically
+    replacing it with a single snapshot record.
+    """
+
+    def __init__(self, filename: str, compact_every: int = 1000):
+        self.filename = filename
+        self.compact_every = compact_every
+        self.records = 0
+        self._file = None
+
+    def read(self) -> List[Dict]:
+        """
+        Read the records in the log. A partially written final record, for
+        example from a crash, is truncated.
+        """
+        records = []
+        if not os.path.exists(self.filename):
+            return records
+
+        with open(self.filename, "rb+") as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    logging.getLogger("jobstruct.EnrichCheckpoint.read").warning(
+                        "discarding partially written record at offset {}".format(offset)
+                    )
+                    f.truncate(offset)
+                    break
+                offset += len(line)
+                records.append(json.loads(line))
+
+        self.records = len(records)
+        return records
+
+    def reset(self) -> None:
+        """
+        Start a new, empty log.
+        """
+        self.close()
+        open(self.filename, "w").close()
+        self.records = 0
+
+    def append(self, record: Dict) -> None:
+        """
+        Append a `record` to the log and flush it to the file.
+        """
+        if self._file is None:
+            self._file = open(self.filename, "a")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self.records += 1
+
+    def due(self) -> bool:
+        """
+        Whether the log has grown enough records to be compacted.
+        """
+        return self.records >= self.compact_every
+
+    def compact(self, snapshot: Dict) -> None:
+        """
+        Replace the log with a single `snapshot` record.
+        """
+        self.close()
+        temp = self.filename + ".tmp"
+        with open(temp, "w") as f:
+            f.write(json.dumps(snapshot) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.filename)
+        self.records = 1
+
+    def close(self) -> None:
+        """
+        Close the log file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,173 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import re
+from typing import Any, Callable, Dict, List, Optional
+from .jobstructhtml import JobStructHTML
+from .prompts import Prompts
+
+paragraph_break = re.compile(r"\n\s*\n")
+sentence_break = re.compile(r"(?<=[.!?;])\s+")
+
+def split_text(
+    text: str,
+    max_tokens: int,
+    estimate: Callable[[str], int] = Prompts.estimate_tokens,
+) -> List[str]:
+    """
+    Split a job posting `text` into chunks of at most `max_tokens` tokens,
+    as counted by `estimate`. Chunks end at paragraph breaks (or line
+    breaks, for text without blank lines), preferably before a segment
+    heading such as "Qualifications:" when one falls in the second half of
+    a chunk. Paragraphs that are too long on their own are split between
+    sentences, then between words. A text within the budget is a single
+    chunk.
+    """
+    if max_tokens <= 0 or estimate(text) <= max_tokens:
+        return [text]
+
+    if paragraph_break.search(text):
+        separator, paragraphs = "\n\n", paragraph_break.split(text)
+    else:
+        separator, paragraphs = "\n", text.split("\n")
+    units = []
+    for paragraph in paragraphs:
+        if paragraph.strip():
+            units.extend(_split_unit(paragraph.strip(), max_tokens, estimate))
+
+    chunks = []
+    current, size, heading = [], 0, -1
+    for unit in units:
+        tokens = estimate(unit + separator)
+        while current and size + tokens > max_tokens:
+            # Cut before the last heading if that leaves a full enough chunk.
+            cut = len(current)
+            if heading > 0 and estimate(separator.join(current[:heading])) >= max_tokens // 2:
+                cut = heading
+            chunks.append(separator.join(current[:cut]))
+            current = current[cut:]
+            size = sum(estimate(u + separator) for u in current)
+            heading = 0 if current else -1
+        if _is_heading(unit):
+            heading = len(current)
+        current.append(unit)
+        size += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+def _is_heading(unit: str) -> bool:
+    """
+    Whether a paragraph or line `unit` starts with a segment heading, by
+    the same rule as `HTMLDocument`: a line of at most 5 words that contains
+    a segment keyword.
+    """
+    line = unit.split("\n", 1)[0]
+    return len(line.split()) <= 5 and JobStructHTML._classify_segment(line.lower()) != "other"
+
+def _split_unit(unit: str, max_tokens: int, estimate: Callable[[str], int]) -> List[str]:
+    """
+    Split a paragraph `unit` that exceeds `max_tokens` between sentences,
+    and sentences that exceed it between words.
+    """
+    if estimate(unit) <= max_tokens:
+        return [unit]
+    pieces = []
+    for sentence in sentence_break.split(unit):
+        if estimate(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        piece = []
+        for word in sentence.split():
+            if piece and estimate(" ".join(piece + [word])) > max_tokens:
+                pieces.append(" ".join(piece))
+                piece = []
+            piece.append(word)
+        if piece:
+            pieces.append(" ".join(piece))
+
+    # Pack consecutive pieces back together within the budget.
+    units = [pieces[0]]
+    for piece in pieces[1:]:
+        if estimate(units[-1] + " " + piece) <= max_tokens:
+            units[-1] += " " + piece
+        else:
+            units.append(piece)
+    return units
+
+def merge_results(results: List[Any]) -> Dict:
+    """
+    Merge the `extract` prompt results for the chunks of a posting, field
+    by field:
+    * job_title, education: the first value found
+    * lists (details, majors, qualifications, benefits): the union, in
+      order of appearance, without duplicates that differ only in case or
+      whitespace
+    * required experience: the minimum; preferred experience: the maximum,
+      where 0 means that the chunk did not mention experience
+    * salary, wage: the range from the minimum to the maximum value found
+    * booleans: true if any chunk found true
+    """
+    results = [result for result in results if isinstance(result, dict)]
+    if len(results) == 1:
+        return results[0]
+
+    merged = {}
+    _merge_first(merged, results, "job_title")
+    _merge_lists(merged, results, "details")
+    for group, experience in (("required", min), ("preferred", max)):
+        parts = [result[group] for result in results if isinstance(result.get(group), dict)]
+        if parts:
+            merged[group] = {}
+            _merge_first(merged[group], parts, "education")
+            _merge_lists(merged[group], parts, "major")
+            values = _numbers(parts, "experience", int)
+            if values:
+                merged[group]["experience"] = experience([value for value in values if value] or values)
+            _merge_lists(merged[group], parts, "qualifications")
+    _merge_lists(merged, results, "benefits")
+    for key in ("salary", "wage"):
+        values = _numbers(results, key, float)
+        if values:
+            merged[key] = sorted(set((min(values), max(values))))
+    for key in ("entry_level", "college_degree", "full_time", "remote"):
+        values = [result[key] for result in results if isinstance(result.get(key), bool)]
+        if values:
+            merged[key] = any(values)
+    return merged
+
+def _merge_first(merged: Dict, results: List[Dict], key: str) -> None:
+    value = next((result[key] for result in results if result.get(key)), None)
+    if value is not None:
+        merged[key] = value
+
+def _merge_lists(merged: Dict, results: List[Dict], key: str) -> None:
+    values, seen = [], set()
+    for result in results:
+        items = result.get(key)
+        for item in items if isinstance(items, list) else []:
+            normalized = " ".join(str(item).casefold().split())
+            if normalized not in seen:
+                seen.add(normalized)
+                values.append(item)
+    if values:
+        merged[key] = values
+
+def _numbers(results: List[Dict], key: str, type_func: Callable) -> List:
+    values = []
+    for result in results:
+        value = result.get(key)
+        for item in value if isinstance(value, list) else [value]:
+            number = _number(item, type_func)
+            if number is not None:
+                values.append(number)
+    return values
+
+def _number(value: Any, type_func: Callable) -> Optional[Any]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return type_func(value)
+    except (TypeError, ValueError):
+        return None
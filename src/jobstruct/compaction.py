@@ -0,0 +1,174 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import collections
+import hashlib
+import json
+import logging
+import re
+from typing import Iterable, List, Optional
+from .jobstructhtml import JobStructHTML
+
+class Compactor:
+    """
+    Reduces the input tokens of the `extract` prompt by removing text that
+    does not matter for extraction from a job posting:
+    * the lines of the Equal Employment Opportunity (`eeo`) segment found
+      by JobStructHTML, and lines or short paragraphs that contain "equal
+      opportunity employer"
+    * boilerplate sentences, such as legal disclaimers and navigation text,
+      whose hashes are in a table learned from a corpus with `from_corpus`
+    * repeated whitespace and blank lines, so that paragraphs are separated
+      by a single blank line
+
+    Sentences shorter than `min_words` words, such as segment headings, are
+    never treated as boilerplate, and neither are the sentences under the
+    headings of `kept_segments`. Postings of a single employer often share
+    their qualifications and duties word for word, and these still matter
+    for extraction.
+    """
+
+    paragraph_break = re.compile(r"\n\s*\n")
+    sentence_break = re.compile(r"(?<=[.!?])\s+")
+    eeo_phrase = "equal opportunity employer"
+    eeo_words = 120
+    min_words = 6
+    kept_segments = frozenset(("qualifications", "requirements", "responsibilities"))
+    heading_words = 5
+
+    def __init__(self, boilerplate: Iterable[int] = (), eeo: bool = True):
+        self.boilerplate = set(boilerplate)
+        self.eeo = eeo
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalize `text` for matching by casefolding and collapsing
+        whitespace.
+        """
+        return " ".join(text.casefold().split())
+
+    @staticmethod
+    def hash(sentence: str) -> int:
+        """
+        Return a 64-bit hash of the normalized `sentence`.
+        """
+        digest = hashlib.blake2b(Compactor.normalize(sentence).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    @staticmethod
+    def heading(line: str) -> Optional[str]:
+        """
+        Return the segment type of `line` (see `JobStructHTML.segment_keywords`)
+        if it looks like a segment heading: at most `heading_words` words that
+        contain a segment keyword, end with a colon, or are capitalized.
+        Otherwise, return None.
+        """
+        line = line.strip()
+        if not line or len(line.split()) > Compactor.heading_words:
+            return None
+        segment = JobStructHTML._classify_segment(line.lower())
+        if segment != "other" or line.endswith(":") or line.isupper():
+            return segment
+        return None
+
+    @staticmethod
+    def sentences(text: str) -> List[str]:
+        """
+        Split `text` into sentences, within lines, leaving out the lines
+        under the headings of `kept_segments`.
+        """
+        sentences = []
+        segment = "other"
+        for line in text.split("\n"):
+            segment = Compactor.heading(line) or segment
+            if segment not in Compactor.kept_segments:
+                sentences.extend(s for s in Compactor.sentence_break.split(line.strip()) if s)
+        return sentences
+
+    @classmethod
+    def from_corpus(
+        cls,
+        texts: Iterable[str],
+        min_fraction: float = 0.05,
+        min_documents: int = 5,
+        eeo: bool = True,
+    ) -> "Compactor":
+        """
+        Learn the boilerplate table from a corpus of job posting `texts`: a
+        sentence outside the `kept_segments` is boilerplate if it occurs in
+        at least `min_fraction` of the postings, and in at least
+        `min_documents` of them.
+        """
+        counts = collections.Counter()
+        n = 0
+        for text in texts:
+            n += 1
+            counts.update(set(
+                Compactor.hash(sentence)
+                for sentence in Compactor.sentences(text)
+                if len(sentence.split()) >= Compactor.min_words
+            ))
+        threshold = max(min_documents, min_fraction * n)
+        boilerplate = set(h for h, count in counts.items() if count >= threshold)
+        logging.getLogger("jobstruct.Compactor.from_corpus").info(
+            "learned {} boilerplate sentences from {} postings".format(len(boilerplate), n)
+        )
+        return cls(boilerplate, eeo)
+
+    @classmethod
+    def from_file(cls, filename: str) -> "Compactor":
+        """
+        Creates a Compactor object from the JSON in `filename`.
+        """
+        with open(filename) as f:
+            data = json.load(f)
+        return cls(data["boilerplate"], data.get("eeo", True))
+
+    def save(self, filename: str) -> None:
+        """
+        Save the boilerplate table and settings to `filename` as JSON.
+        """
+        with open(filename, "w") as f:
+            json.dump({"boilerplate": sorted(self.boilerplate), "eeo": self.eeo}, f)
+
+    def compact(self, text: str, eeo: Iterable[str] = ()) -> str:
+        """
+        Return the compacted job posting `text`, without the lines of its
+        `eeo` segment (if known), paragraphs of at most `eeo_words` words
+        that contain "equal opportunity employer", and boilerplate
+        sentences outside the `kept_segments`, and with normalized
+        whitespace.
+        """
+        eeo = set(Compactor.normalize(line) for line in eeo) if self.eeo else set()
+        paragraphs = []
+        segment = "other"
+        for paragraph in Compactor.paragraph_break.split(text):
+            lines = [" ".join(line.split()) for line in paragraph.split("\n")]
+            words = " ".join(lines).lower().split()
+            if self.eeo and len(words) <= Compactor.eeo_words and Compactor.eeo_phrase in " ".join(words):
+                continue
+            kept = []
+            for line in lines:
+                if not line:
+                    continue
+                segment = Compactor.heading(line) or segment
+                if self.eeo and (
+                    Compactor.normalize(line) in eeo
+                    or Compactor.eeo_phrase in line.lower()
+                ):
+                    continue
+                if self.boilerplate and segment not in Compactor.kept_segments:
+                    line = " ".join(
+                        sentence
+                        for sentence in Compactor.sentence_break.split(line)
+                        if len(sentence.split()) < Compactor.min_words
+                        or Compactor.hash(sentence) not in self.boilerplate
+                    )
+                    if not line:
+                        continue
+                kept.append(line)
+            if kept:
+                paragraphs.append("\n".join(kept))
+        return "\n\n".join(paragraphs)
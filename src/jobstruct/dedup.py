@@ -0,0 +1,170 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import logging
+import numpy as np
+import re
+import zlib
+from typing import Iterable, Optional
+
+class NearDuplicates:
+    """
+    Near-duplicate detection for job postings with MinHash signatures and
+    locality-sensitive hashing (LSH). Each posting is reduced to a signature
+    of `num_perm` MinHash values over the word `shingle_size`-grams of its
+    text. Signatures are split into `bands`; postings that agree on every
+    value in at least one band are candidate duplicates, and candidates
+    whose estimated Jaccard similarity is at least `threshold` are merged
+    into a cluster.
+
+    Clustering processes one band at a time with sorting and vectorized
+    comparisons, so memory is dominated by the signatures themselves, which
+    can be kept in a memory-mapped file for very large corpora.
+    """
+
+    word = re.compile(r"\w+")
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        threshold: float = 0.8,
+        seed: int = 0,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash functions ((a * x + b) mod 2^64) >> 32 of
+        # 32-bit shingle hashes x, with odd multipliers a.
+        self.a = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        Return the 32-bit hashes of the distinct word shingles in the
+        lowercased `text`. Texts shorter than a shingle are a single shingle.
+        """
+        words = NearDuplicates.word.findall(text.lower())
+        hashes = np.fromiter(
+            (zlib.crc32(word.encode("utf-8")) for word in words),
+            dtype=np.uint64,
+            count=len(words),
+        )
+        if len(hashes) < self.shingle_size:
+            hashes = np.pad(hashes, (0, self.shingle_size - len(hashes)))
+
+        # Combine the word hashes of each shingle as a polynomial, with
+        # arithmetic modulo 2^64, and mix the low bits into the high bits.
+        n = len(hashes) - self.shingle_size + 1
+        shingles = np.zeros(n, dtype=np.uint64)
+        for i in range(self.shingle_size):
+            shingles = shingles * np.uint64(1000003) + hashes[i:i + n]
+        return np.unique((shingles * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32))
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Return the MinHash signature of `text`.
+        """
+        x = self.shingles(text)
+        return ((self.a * x + self.b) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def signatures(
+        self,
+        texts: Iterable[str],
+        filename: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Return the signatures of `texts` as the rows of a matrix. If a
+        `filename` is provided, the signatures are streamed to that file
+        and returned as a read-only memory map.
+        """
+        if filename is None:
+            rows = [self.signature(text) for text in texts]
+            if not rows:
+                return np.zeros((0, self.num_perm), dtype=np.uint32)
+            return np.stack(rows)
+
+        n = 0
+        with open(filename, "wb") as f:
+            for text in texts:
+                f.write(self.signature(text).tobytes())
+                n += 1
+        if n == 0:
+            return np.zeros((0, self.num_perm), dtype=np.uint32)
+        return np.memmap(filename, dtype=np.uint32, mode="r", shape=(n, self.num_perm))
+
+    def cluster(self, signatures: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        """
+        Cluster near-duplicate rows of `signatures`, and return for each row
+        the index of its cluster's canonical row, which is the first row of
+        the cluster. Rows that are not near-duplicates of any other row are
+        their own canonical row.
+        """
+        log = logging.getLogger("jobstruct.NearDuplicates.cluster")
+
+        n = len(signatures)
+        parent = np.arange(n)
+
+        def find(i):
+            root = i
+            while parent[root] != root:
+                root = parent[root]
+            while parent[i] != root:
+                parent[i], i = root, parent[i]
+            return root
+
+        rows = self.num_perm // self.bands
+        for band in range(self.bands):
+            # Hash each row's band values to a single 64-bit key.
+            keys = np.zeros(n, dtype=np.uint64)
+            for start in range(0, n, chunk):
+                values = np.asarray(
+                    signatures[start:start + chunk, band * rows:(band + 1) * rows],
+                    dtype=np.uint64,
+                )
+                key = np.zeros(len(values), dtype=np.uint64)
+                for j in range(rows):
+                    key = key * np.uint64(1000003) ^ values[:, j]
+                keys[start:start + chunk] = key
+
+            # Within each run of equal keys, compare every row to the
+            # run's first row (the earliest row, since the sort is stable).
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            leaders = order[np.repeat(starts, np.diff(np.r_[starts, n]))]
+            candidates = np.flatnonzero(leaders != order)
+            members, heads = order[candidates], leaders[candidates]
+            for start in range(0, len(candidates), chunk):
+                # Read the members in row order for locality in a memory map.
+                batch = np.argsort(members[start:start + chunk]) + start
+                similarity = (
+                    np.asarray(signatures[members[batch]])
+                    == np.asarray(signatures[heads[batch]])
+                ).mean(axis=1)
+                similar = batch[similarity >= self.threshold]
+                for i, j in zip(members[similar], heads[similar]):
+                    ri, rj = find(i), find(j)
+                    if ri != rj:
+                        parent[max(ri, rj)] = min(ri, rj)
+
+        # Every parent precedes its child, so pointer jumping converges on
+        # the first row of each cluster.
+        canonical = parent
+        while True:
+            jumped = canonical[canonical]
+            if np.array_equal(jumped, canonical):
+                break
+            canonical = jumped
+        log.info("found {} clusters of near-duplicates among {} postings ({} duplicates)".format(
+            int(np.sum(np.bincount(canonical, minlength=n) > 1)),
+            n,
+            int(np.sum(canonical != np.arange(n))),
+        ))
+        return canonical
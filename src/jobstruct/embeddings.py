@@ -0,0 +1,86 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import hashlib
+import numpy as np
+import re
+from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
+from typing import List
+from .parallel import ordered_map
+from .prompts import Prompts
+
+class HashingEmbedder:
+    """
+    A deterministic, offline text embedder that hashes words and word
+    bigrams into a fixed number of `dimensions` with random signs (the
+    "hashing trick"). Vectors are L2-normalized, so their dot product is
+    the cosine similarity.
+    """
+
+    word = re.compile(r"\w+")
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def features(self, text: str) -> List[str]:
+        """
+        Return the lowercased words and word bigrams in `text`.
+        """
+        words = HashingEmbedder.word.findall(text.lower())
+        return words + [" ".join(pair) for pair in zip(words, words[1:])]
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed each of the `texts` as a row of a float32 matrix.
+        """
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for feature in self.features(text):
+                h = int.from_bytes(
+                    hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(),
+                    "little",
+                )
+                vectors[i, h % self.dimensions] += 1.0 if (h >> 32) & 1 else -1.0
+        return normalize(vectors)
+
+
+class BedrockEmbedder:
+    """
+    A text embedder that invokes the `embedding` prompt on a Bedrock
+    `client` for each text, running up to `workers` requests concurrently.
+    Its vectors are in the same space as the posting embeddings from the
+    `embedding` prompt, so those can be used as retrieval queries.
+    """
+
+    prompt = "embedding"
+
+    def __init__(
+        self,
+        client: BedrockRuntimeClient,
+        config_file: str = "",
+        workers: int = 1,
+    ):
+        self.prompts = Prompts(client, config_file)
+        self.workers = workers
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed each of the `texts` as a row of a float32 matrix.
+        """
+        return normalize(np.array(
+            list(ordered_map(
+                lambda text: self.prompts.invoke("embedding", text),
+                texts,
+                self.workers,
+            )),
+            dtype=np.float32,
+        ))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize the rows of `vectors`, leaving zero rows unchanged.
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
@@ -0,0 +1,253 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import json
+import logging
+import numpy as np
+import os
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+class EmbeddingStore:
+    """
+    An append-only store of embedding vectors in a `directory`, for corpora
+    too large to hold as lists of floats. The vectors are stored as a raw
+    float32 matrix that is memory-mapped for search, with a sidecar text
+    file of IDs (one per line, in row order) and a small JSON metadata file.
+
+    Search ranks vectors by inner product, which is the cosine similarity
+    for normalized embeddings such as those from the `embedding` prompt.
+    """
+
+    def __init__(self, directory: str, dimensions: Optional[int] = None):
+        """
+        Open the store in `directory`, creating it with vectors of size
+        `dimensions` if it does not exist. Rows that were only partially
+        written, for example by a crash, are discarded.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        self.ivf_path = os.path.join(directory, "ivf.npz")
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dimensions = json.load(f)["dimensions"]
+            if dimensions is not None and dimensions != self.dimensions:
+                raise ValueError("store has {} dimensions, not {}".format(self.dimensions, dimensions))
+        elif dimensions is None:
+            raise ValueError("dimensions are required to create a new store")
+        else:
+            self.dimensions = dimensions
+            with open(self.meta_path, "w") as f:
+                json.dump({"dimensions": dimensions, "dtype": "float32"}, f)
+            open(self.vectors_path, "ab").close()
+            open(self.ids_path, "ab").close()
+
+        self._lock = threading.Lock()
+        self._ids = self._read_ids()
+        self._size = min(
+            len(self._ids),
+            os.path.getsize(self.vectors_path) // (4 * self.dimensions),
+        )
+        self._repair()
+        self._memmap = None
+        self._ivf = None
+
+    def _read_ids(self) -> List[str]:
+        """
+        Read the complete lines of the ID file.
+        """
+        with open(self.ids_path, "rb") as f:
+            data = f.read()
+        return data[:data.rfind(b"\n") + 1].decode("utf-8").splitlines()
+
+    def _repair(self) -> None:
+        """
+        Truncate the vector and ID files to the number of complete rows.
+        """
+        if len(self._ids) != self._size or os.path.getsize(self.vectors_path) != 4 * self.dimensions * self._size:
+            logging.getLogger("jobstruct.EmbeddingStore").warning(
+                "discarding partially written rows after row {}".format(self._size)
+            )
+            del self._ids[self._size:]
+            with open(self.vectors_path, "rb+") as f:
+                f.truncate(4 * self.dimensions * self._size)
+            with open(self.ids_path, "w") as f:
+                f.writelines(i + "\n" for i in self._ids)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def ids(self) -> List[str]:
+        """
+        The IDs of the stored vectors, in row order.
+        """
+        return self._ids
+
+    def append(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        """
+        Append a batch of `vectors` (rows) with their `ids`.
+        """
+        vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+        if vectors.shape != (len(ids), self.dimensions):
+            raise ValueError("expected {} vectors of {} dimensions, got {}".format(
+                len(ids),
+                self.dimensions,
+                vectors.shape,
+            ))
+        for i in ids:
+            if "\n" in i:
+                raise ValueError("ids cannot contain newlines")
+        with self._lock:
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.ids_path, "a") as f:
+                f.writelines(i + "\n" for i in ids)
+            self._ids.extend(ids)
+            self._size += len(ids)
+            self._memmap = None
+
+    def vectors(self) -> np.ndarray:
+        """
+        Return a read-only memory map of the stored vectors.
+        """
+        with self._lock:
+            if self._memmap is None:
+                if self._size == 0:
+                    return np.zeros((0, self.dimensions), dtype=np.float32)
+                self._memmap = np.memmap(
+                    self.vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(self._size, self.dimensions),
+                )
+            return self._memmap
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        chunk: int = 65536,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact k-nearest-neighbor search for a batch of `queries` (rows),
+        scanning the memory-mapped vectors `chunk` rows at a time. Return
+        the row indices and scores of the `k` best matches for each query,
+        best first; use `ids` to look up the IDs of the rows.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        vectors = self.vectors()
+        k = min(k, len(vectors))
+        if k == 0:
+            return (
+                np.zeros((len(queries), 0), dtype=np.int64),
+                np.zeros((len(queries), 0), dtype=np.float32),
+            )
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            scores = queries @ np.asarray(vectors[start:start + chunk]).T
+            rows = np.broadcast_to(
+                np.arange(start, start + scores.shape[1]),
+                scores.shape,
+            )
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+        return EmbeddingStore._sort(best_rows, best_scores)
+
+    @staticmethod
+    def _sort(rows: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sort each query's matches by descending score.
+        """
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def build_ivf(
+        self,
+        nlist: int = 0,
+        iterations: int = 10,
+        sample: int = 100000,
+        seed: int = 0,
+        chunk: int = 65536,
+    ) -> None:
+        """
+        Build an inverted file (IVF) index for approximate search: cluster
+        a `sample` of the vectors into `nlist` clusters (default: about the
+        square root of the store size) with spherical k-means, then assign
+        every vector to its nearest cluster. The index is saved alongside
+        the store and covers the vectors present when it was built.
+        """
+        vectors = self.vectors()
+        n = len(vectors)
+        nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+
+        data = np.asarray(vectors[np.sort(rng.choice(n, min(sample, n), replace=False))])
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = (data @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            counts = np.bincount(assignment, minlength=nlist)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assignment = np.concatenate([
+            (np.asarray(vectors[start:start + chunk]) @ centroids.T).argmax(axis=1)
+            for start in range(0, n, chunk)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        np.savez(self.ivf_path, centroids=centroids, order=order, offsets=offsets)
+        self._ivf = (centroids, order, offsets)
+
+    def search_approximate(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        nprobe: int = 8,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate k-nearest-neighbor search for a batch of `queries`
+        (rows) with the IVF index, scanning only the vectors in the
+        `nprobe` clusters nearest to each query. Return the row indices and
+        scores as in `search`, padded with -1 rows if fewer than `k`
+        vectors were scanned.
+        """
+        if self._ivf is None:
+            if not os.path.exists(self.ivf_path):
+                raise ValueError("IVF index has not been built")
+            with np.load(self.ivf_path) as ivf:
+                self._ivf = (ivf["centroids"], ivf["order"], ivf["offsets"])
+        centroids, order, offsets = self._ivf
+
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        vectors = self.vectors()
+        nprobe = min(nprobe, len(centroids))
+        probes = np.argpartition(-(queries @ centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.sort(np.concatenate([
+                order[offsets[c]:offsets[c + 1]] for c in probes[i]
+            ]))
+            if len(candidates) == 0:
+                continue
+            candidate_scores = np.asarray(vectors[candidates]) @ query
+            m = min(k, len(candidates))
+            top = np.argpartition(-candidate_scores, m - 1)[:m]
+            rows[i, :m] = candidates[top]
+            scores[i, :m] = candidate_scores[top]
+        return EmbeddingStore._sort(rows, scores)
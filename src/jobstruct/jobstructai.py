@@ -2,13 +2,20 @@
 # Copyright National Association of State Workforce Agencies. All Rights Reserved.
 # SPDX-License-Identifier: CC-BY-NC-SA-4.0
 
-import json
+import asyncio
+import itertools
 import logging
-from bs4 import BeautifulSoup
+import numpy as np
 from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
-from typing import Any, Callable, List, Optional
-from .prompts import Prompts
-from .jobstructhtml import JobStructHTML
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from .chunking import merge_results, split_text
+from .compaction import Compactor
+from .prompts import AsyncBedrockRuntimeClient, Prompts
+from .jobstructhtml import HTMLDocument
+from .occupationclassifier import OccupationClassifier
+from .packing import pack_texts, result_budget, unpack_results
+from .parallel import ordered_map
+from .rules import RuleExtractor
 from .skillstaxonomyai import SkillsTaxonomyAI
 
 class JobStructAI:
@@ -44,16 +51,27 @@ class JobStructAI:
         skills: List[str]
         occupation: List[str]
         embedding: List[float]
+
+    The fields that were filled by deterministic rules instead of the
+    `extract` prompt (see `RuleExtractor`) are listed in `rule_fields`, the
+    number of `extract` prompt calls is in `extract_calls`, and the number
+    of input tokens removed by a Compactor is in `tokens_saved`.
     """
 
+    # The number of postings whose occupations `extract_many` predicts
+    # with one call of a local OccupationClassifier.
+    predict_batch = 64
+
     def __init__(
         self,
         text: str,
         client: BedrockRuntimeClient,
         skills: Optional[SkillsTaxonomyAI] = None,
-        occupation: bool = False,
+        occupation: Union[bool, OccupationClassifier] = False,
         embedding: bool = False,
         config_file: str = "",
+        compactor: Optional[Compactor] = None,
+        prompts: Optional[Prompts] = None,
     ):
         """
         Extracts structured fields from the job posting `text` using
@@ -63,20 +81,237 @@ class JobStructAI:
         Runs additional prompts to provide attributes for `skills`,
         `occupation`, and `embedding` if those parameters are provided.
 
+        If `occupation` is a trained OccupationClassifier, the occupation is
+        predicted locally from the posting's embedding, and the `occupation`
+        prompt only runs if the prediction's confidence is below the
+        classifier's threshold.
+
         Optionally, provide the path to a JSON `config_file` that overrides
         prompt configurations. See the file `prompt_configs.json` in the
         package for the default configurations.
+
+        Optionally, provide a `compactor` to remove boilerplate from `text`
+        before the `extract` prompt, and the estimated number of input
+        tokens that it saved is provided in `tokens_saved`.
+
+        Optionally, provide `prompts` that were already prepared for the
+        `client` and `config_file`, to share them across many postings.
         """
 
-        prompts = Prompts(client, config_file)
+        prompts = prompts or Prompts(client, config_file)
+        text, tokens_saved = JobStructAI._compact(compactor, text)
+
+        # Extract
+        self._structure(self._extract(prompts, text))
+        self.tokens_saved = tokens_saved
+        self._estimate(prompts, skills, occupation, embedding)
+
+    @classmethod
+    def from_extract(
+        cls,
+        response: str,
+        client: BedrockRuntimeClient,
+        skills: Optional[SkillsTaxonomyAI] = None,
+        occupation: Union[bool, OccupationClassifier] = False,
+        embedding: bool = False,
+        config_file: str = "",
+        prompts: Optional[Prompts] = None,
+    ) -> "JobStructAI":
+        """
+        Creates a JobStructAI object from the `response` text of an `extract`
+        prompt that was invoked elsewhere, for example in a Bedrock batch
+        inference job, then runs the `skills`, `occupation`, and `embedding`
+        prompts on the `client` as in the constructor.
+        """
+        self = cls.__new__(cls)
+        self._structure(Prompts.safe_json(response, {}))
+        self.rule_fields = []
+        self.extract_calls = 1
+        self.tokens_saved = 0
+        self._estimate(prompts or Prompts(client, config_file), skills, occupation, embedding)
+        return self
+
+    @classmethod
+    async def acreate(
+        cls,
+        text: str,
+        client: AsyncBedrockRuntimeClient,
+        skills: Optional[SkillsTaxonomyAI] = None,
+        occupation: Union[bool, OccupationClassifier] = False,
+        embedding: bool = False,
+        config_file: str = "",
+        semaphore: Optional[asyncio.Semaphore] = None,
+        compactor: Optional[Compactor] = None,
+        prompts: Optional[Prompts] = None,
+    ) -> "JobStructAI":
+        """
+        Asynchronous version of the constructor, which awaits the prompts
+        on an async-capable Bedrock `client` instead of blocking. The
+        `skills`, `occupation`, and `embedding` prompts run concurrently
+        after the initial extraction.
+
+        Optionally, provide a `semaphore` shared across many postings to
+        limit the number of requests in flight at once. Shared `prompts`
+        are used as they were prepared, with their own semaphore.
+        """
+        prompts = prompts or Prompts(client, config_file, semaphore)
+        text, tokens_saved = JobStructAI._compact(compactor, text)
 
         # Extract
-        if text:
-            result = Prompts.safe_json(prompts.invoke("extract", text), {})
+        self = cls.__new__(cls)
+        self._structure(await self._aextract(prompts, text))
+        self.tokens_saved = tokens_saved
+
+        text = self._summary()
+        if text.strip():
+            requests = {}
+            if embedding or isinstance(occupation, OccupationClassifier):
+                requests["embedding"] = asyncio.ensure_future(
+                    prompts.ainvoke("embedding", text)
+                )
+            if skills is not None:
+                # The skills retrieval index reuses the posting's embedding.
+                vector = None
+                if "embedding" in requests and skills.embedder is not None:
+                    vector = await requests["embedding"]
+                requests["skills"] = asyncio.ensure_future(
+                    prompts.ainvoke("skills", text, skills.prompt_text(query=text, vector=vector))
+                )
+            if isinstance(occupation, OccupationClassifier):
+                if not self._classify_occupation(occupation, await requests["embedding"]):
+                    requests["occupation"] = asyncio.ensure_future(
+                        prompts.ainvoke("occupation", text)
+                    )
+            elif occupation:
+                requests["occupation"] = asyncio.ensure_future(
+                    prompts.ainvoke("occupation", text)
+                )
+            responses = dict(zip(requests, await asyncio.gather(*requests.values())))
+            if "skills" in responses:
+                self._set_skills(responses["skills"])
+            if "occupation" in responses:
+                self._set_occupation(responses["occupation"])
+            if embedding:
+                self._set_embedding(responses["embedding"])
+
+        return self
+
+    @staticmethod
+    def _compact(
+        compactor: Optional[Compactor],
+        text: str,
+        eeo: Iterable[str] = (),
+    ) -> Tuple[str, int]:
+        """
+        Compact `text` (with the lines of its `eeo` segment, if known) with
+        the `compactor`, if any. Return the text and the estimated number
+        of tokens saved.
+        """
+        if compactor is None or not text:
+            return text, 0
+        compacted = compactor.compact(text, eeo)
+        return compacted, Prompts.estimate_tokens(text) - Prompts.estimate_tokens(compacted)
+
+    def _plan(self, prompts: Prompts, text: str) -> Tuple[List[str], Tuple[str, ...], Dict]:
+        """
+        Plan the `extract` prompt calls for `text`. Return the chunks of
+        `text` to extract, the fields to omit from the prompt's schema, and
+        the fields filled by rules. There are no chunks if rules filled all
+        the requested fields.
+
+        If the prompt's `rules_confidence` setting is nonzero, the fields
+        that a RuleExtractor finds with enough confidence are filled by rules
+        and omitted from the prompt, as are any fields that are not in the
+        `fields` setting. Texts longer than the `chunk_tokens` setting are
+        split into chunks, so that the output fits in `max_tokens`.
+        """
+        fields = prompts.setting("extract", "fields", Prompts.extract_fields)
+        confidence = prompts.setting("extract", "rules_confidence")
+        filled = {}
+        if text and confidence:
+            filled = {
+                field: value
+                for field, value in RuleExtractor(confidence).fill(text).items()
+                if field in fields
+            }
+        omit = tuple(
+            field for field in Prompts.extract_fields
+            if field not in fields or field in filled
+        )
+        if not text or len(omit) == len(Prompts.extract_fields):
+            chunks = []
         else:
-            result = {}
+            chunks = split_text(text, prompts.setting("extract", "chunk_tokens"))
 
-        # Data structure
+        self.rule_fields = list(filled)
+        self.extract_calls = len(chunks)
+        return chunks, omit, filled
+
+    @staticmethod
+    def _merge(results: List[Any], omit: Tuple[str, ...], filled: Dict) -> Dict:
+        """
+        Merge the parsed `extract` prompt `results` for the chunks of a
+        posting, without the `omit` fields, and add the fields `filled` by
+        rules.
+        """
+        result = merge_results(results)
+        result = {field: value for field, value in result.items() if field not in omit}
+        result.update(filled)
+        return result
+
+    def _extract(self, prompts: Prompts, text: str) -> Dict:
+        """
+        Run the `extract` prompt calls planned by `_plan` on `text`, with
+        the chunks extracted in parallel, and return the merged result.
+        """
+        return JobStructAI._extract_chunks(prompts, *self._plan(prompts, text))
+
+    @staticmethod
+    def _extract_chunks(
+        prompts: Prompts,
+        chunks: List[str],
+        omit: Tuple[str, ...],
+        filled: Dict,
+    ) -> Dict:
+        """
+        Extract the `chunks` of a posting in parallel, without the `omit`
+        fields, and return the merged result with the fields `filled` by
+        rules.
+        """
+        if len(chunks) > 1:
+            logging.getLogger("jobstruct.JobStructAI._extract").debug(
+                "extracting {} chunks".format(len(chunks))
+            )
+        responses = list(ordered_map(
+            lambda chunk: prompts.invoke("extract", chunk, omit=omit),
+            chunks,
+            len(chunks),
+        ))
+        return JobStructAI._merge(
+            [Prompts.safe_json(response, {}) for response in responses],
+            omit,
+            filled,
+        )
+
+    async def _aextract(self, prompts: Prompts, text: str) -> Dict:
+        """
+        Asynchronous version of `_extract`.
+        """
+        chunks, omit, filled = self._plan(prompts, text)
+        responses = await asyncio.gather(
+            *(prompts.ainvoke("extract", chunk, omit=omit) for chunk in chunks)
+        )
+        return JobStructAI._merge(
+            [Prompts.safe_json(response, {}) for response in responses],
+            omit,
+            filled,
+        )
+
+    def _structure(self, result: Dict) -> None:
+        """
+        Validate the fields of the extracted `result` and provide them
+        as attributes.
+        """
         self.job_title      = JobStructAI.validate_field(result.get("job_title"), str)
         self.details        = JobStructAI.validate_list(result.get("details", []), str)
         self.required = {
@@ -102,40 +337,109 @@ class JobStructAI:
         self.occupation     = []
         self.embedding      = None
 
+    def _estimate(
+        self,
+        prompts: Prompts,
+        skills: Optional[SkillsTaxonomyAI],
+        occupation: Union[bool, OccupationClassifier],
+        embedding: bool,
+    ) -> None:
+        """
+        Run the additional prompts for `skills`, `occupation`, and `embedding`.
+        """
         # Use extracted details/qualifications as input for skills, occupation,
         # and embedding.
-        text = "\n\n".join([
+        text = self._summary()
+        if text.strip():
+            vector = None
+            if embedding or isinstance(occupation, OccupationClassifier):
+                vector = prompts.invoke("embedding", text)
+            if skills is not None:
+                # The skills retrieval index reuses the posting's embedding.
+                self._set_skills(
+                    prompts.invoke("skills", text, skills.prompt_text(query=text, vector=vector))
+                )
+            if isinstance(occupation, OccupationClassifier):
+                if not self._classify_occupation(occupation, vector):
+                    self._set_occupation(prompts.invoke("occupation", text))
+            elif occupation:
+                self._set_occupation(prompts.invoke("occupation", text))
+            if embedding:
+                self._set_embedding(vector)
+
+    def _summary(self) -> str:
+        """
+        Concatenate the extracted job title, details, and qualifications
+        into a cleaned job description.
+        """
+        return "\n\n".join([
             self.job_title,
             "\n".join(self.details),
             "\n".join(self.required["qualifications"]),
             "\n".join(self.preferred["qualifications"]),
         ])
-        if text.strip():
-            if skills is not None:
-                self.skills = list(sorted(set(JobStructAI.validate_list(
-                    Prompts.safe_json(
-                        prompts.invoke(
-                            "skills",
-                            text,
-                            json.dumps(skills.to_dict())
-                        ),
-                        []
-                    ),
-                    str
-                ))))
-            if occupation:
-                self.occupation = list(sorted(set(JobStructAI.validate_list(
-                    Prompts.safe_json(
-                        prompts.invoke("occupation", text),
-                        {}
-                    ).get("occupation", []),
-                    str
-                ))))
-            if embedding:
-                self.embedding = JobStructAI.validate_list(
-                    prompts.invoke("embedding", text),
-                    float
-                )
+
+    def _set_skills(self, response: str) -> None:
+        """
+        Parse the `skills` prompt response.
+        """
+        self.skills = list(sorted(set(JobStructAI.validate_list(
+            Prompts.safe_json(response, []),
+            str
+        ))))
+
+    def _set_occupation(self, response: str) -> None:
+        """
+        Parse the `occupation` prompt response.
+        """
+        self.occupation = list(sorted(set(JobStructAI.validate_list(
+            Prompts.safe_json(response, {}).get("occupation", []),
+            str
+        ))))
+
+    def _classify_occupation(
+        self,
+        classifier: OccupationClassifier,
+        vector: List,
+    ) -> bool:
+        """
+        Predict the occupation from the embedding `vector` with a local
+        `classifier`. Return False if the prediction is not confident
+        enough, so that the `occupation` prompt should be run instead.
+        """
+        return not JobStructAI._predict_occupations(classifier, [self], [vector])
+
+    @staticmethod
+    def _predict_occupations(
+        classifier: OccupationClassifier,
+        objects: List["JobStructAI"],
+        vectors: List[Optional[List]],
+    ) -> List["JobStructAI"]:
+        """
+        Predict the occupations of the `objects` from their embedding
+        `vectors` with one call of a local `classifier`. Return the objects
+        whose prediction is not confident enough, or that have no
+        embedding, so that the `occupation` prompt should be run instead.
+        """
+        log = logging.getLogger("jobstruct.JobStructAI._classify_occupation")
+
+        vectors = [JobStructAI.validate_list(vector or [], float) for vector in vectors]
+        indices = [i for i, vector in enumerate(vectors) if vector]
+        confident = set()
+        if indices:
+            labels, confidence = classifier.predict(np.array([vectors[i] for i in indices]))
+            for i, label, score in zip(indices, labels, confidence.tolist()):
+                log.debug("predicted occupation '{}' with confidence {:.3f}".format(label, score))
+                if score >= classifier.threshold:
+                    objects[i].occupation = [label]
+                    confident.add(i)
+        return [self for i, self in enumerate(objects) if i not in confident]
+
+    def _set_embedding(self, response: List) -> None:
+        """
+        Parse the `embedding` prompt response.
+        """
+        self.embedding = JobStructAI.validate_list(response, float)
 
     @staticmethod
     def validate_field(value: Any, type_func: Callable) -> Any:
@@ -170,9 +474,11 @@ class JobStructAI:
         filename: str,
         client: BedrockRuntimeClient,
         skills: Optional[SkillsTaxonomyAI] = None,
-        occupation: bool = False,
+        occupation: Union[bool, OccupationClassifier] = False,
         embedding: bool = False,
         config_file: str = "",
+        compactor: Optional[Compactor] = None,
+        prompts: Optional[Prompts] = None,
     ) -> "JobStructAI":
         """
         Creates a JobStructAI object from the text in `filename`.
@@ -186,6 +492,8 @@ class JobStructAI:
             occupation,
             embedding,
             config_file,
+            compactor,
+            prompts,
         )
 
     @classmethod
@@ -194,31 +502,99 @@ class JobStructAI:
         html: str,
         client: BedrockRuntimeClient,
         skills: Optional[SkillsTaxonomyAI] = None,
-        occupation: bool = False,
+        occupation: Union[bool, OccupationClassifier] = False,
         embedding: bool = False,
         config_file: str = "",
+        parser: str = "",
+        compactor: Optional[Compactor] = None,
+        prompts: Optional[Prompts] = None,
     ) -> "JobStructAI":
         """
-        Creates a JobStructAI object from an `html` string.
+        Creates a JobStructAI object from an `html` string, parsed with the
+        BeautifulSoup `parser` (default: `JobStructHTML.default_parser`).
         """
-        soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
-        # Extract all text contained in the relevant HTML tags
-        text = "\n".join(
-            element.get_text(separator="\n").strip()
-            for element in soup.body.find_all(JobStructHTML.tags)
-            if all(
-                element.find(tag) is None
-                for tag in JobStructHTML.tags
-            )
+        return cls.from_document(
+            HTMLDocument.from_string(html, parser),
+            client,
+            skills,
+            occupation,
+            embedding,
+            config_file,
+            compactor,
+            prompts,
         )
-        return cls(
+
+    @classmethod
+    async def afrom_html(
+        cls,
+        html: str,
+        client: AsyncBedrockRuntimeClient,
+        skills: Optional[SkillsTaxonomyAI] = None,
+        occupation: Union[bool, OccupationClassifier] = False,
+        embedding: bool = False,
+        config_file: str = "",
+        semaphore: Optional[asyncio.Semaphore] = None,
+        parser: str = "",
+        compactor: Optional[Compactor] = None,
+        prompts: Optional[Prompts] = None,
+    ) -> "JobStructAI":
+        """
+        Asynchronously creates a JobStructAI object from an `html` string,
+        parsed with the BeautifulSoup `parser`.
+        """
+        document = HTMLDocument.from_string(html, parser)
+        text, tokens_saved = JobStructAI._compact(compactor, document.text, document.segments["eeo"])
+        self = await cls.acreate(
+            text,
+            client,
+            skills,
+            occupation,
+            embedding,
+            config_file,
+            semaphore,
+            prompts=prompts,
+        )
+        self.tokens_saved = tokens_saved
+        return self
+
+    @classmethod
+    def from_document(
+        cls,
+        document: HTMLDocument,
+        client: BedrockRuntimeClient,
+        skills: Optional[SkillsTaxonomyAI] = None,
+        occupation: Union[bool, OccupationClassifier] = False,
+        embedding: bool = False,
+        config_file: str = "",
+        compactor: Optional[Compactor] = None,
+        prompts: Optional[Prompts] = None,
+    ) -> "JobStructAI":
+        """
+        Creates a JobStructAI object from the text of an already parsed
+        HTMLDocument, which can also be segmented with
+        `JobStructHTML.from_document` without parsing it again. A
+        `compactor` also removes the lines of the document's `eeo` segment.
+        """
+        text, tokens_saved = JobStructAI._compact(compactor, document.text, document.segments["eeo"])
+        self = cls(
             text,
             client,
             skills,
             occupation,
             embedding,
             config_file,
+            prompts=prompts,
         )
+        self.tokens_saved = tokens_saved
+        return self
+
+    @staticmethod
+    def html_text(html: str, parser: str = "") -> str:
+        """
+        Extract all text contained in the relevant HTML tags of an `html`
+        string, parsed with the BeautifulSoup `parser`.
+        """
+        return HTMLDocument.from_string(html, parser).text
 
     @classmethod
     def from_html_file(
@@ -226,12 +602,16 @@ class JobStructAI:
         filename: str,
         client: BedrockRuntimeClient,
         skills: Optional[SkillsTaxonomyAI] = None,
-        occupation: bool = False,
+        occupation: Union[bool, OccupationClassifier] = False,
         embedding: bool = False,
         config_file: str = "",
+        parser: str = "",
+        compactor: Optional[Compactor] = None,
+        prompts: Optional[Prompts] = None,
     ) -> "JobStructAI":
         """
-        Creates a JobStructAI object from the HTML in `filename`.
+        Creates a JobStructAI object from the HTML in `filename`, parsed
+        with the BeautifulSoup `parser`.
         """
         with open(filename) as f:
             html: str = f.read()
@@ -242,8 +622,321 @@ class JobStructAI:
             occupation,
             embedding,
             config_file,
+            parser,
+            compactor,
+            prompts,
         )
 
+    @classmethod
+    def extract_many(
+        cls,
+        inputs: Iterable,
+        client: BedrockRuntimeClient,
+        skills: Optional[SkillsTaxonomyAI] = None,
+        occupation: Union[bool, OccupationClassifier] = False,
+        embedding: bool = False,
+        config_file: str = "",
+        workers: int = 1,
+        constructor: Optional[Callable] = None,
+        compactor: Optional[Compactor] = None,
+    ) -> Iterator[Union["JobStructAI", Exception]]:
+        """
+        Creates a JobStructAI object for each of the `inputs` on a pool of
+        `workers` threads that share the Bedrock `client`, and yields the
+        objects in input order.
+
+        By default, each input is a job posting text string. Provide a
+        `constructor` with the same signature as `from_file` (for example,
+        `JobStructAI.from_html_file`) to extract from other kinds of inputs.
+        The prompt configurations are loaded once and passed to the
+        constructor as the `prompts` keyword argument, as is the
+        `compactor`, if provided.
+
+        If `occupation` is a trained OccupationClassifier, the occupations
+        of up to `predict_batch` consecutive postings are predicted together
+        from their embeddings, and only the postings without a confident
+        prediction run the `occupation` prompt.
+
+        If extraction fails for an input, the exception is logged and yielded
+        in place of the JobStructAI object, so that a single bad posting does
+        not abort the batch.
+        """
+        log = logging.getLogger("jobstruct.JobStructAI.extract_many")
+
+        if constructor is None:
+            constructor = cls
+        prompts = Prompts(client, config_file)
+        options = {"prompts": prompts}
+        if compactor is not None:
+            options["compactor"] = compactor
+        classifier = occupation if isinstance(occupation, OccupationClassifier) else None
+
+        def extract(item):
+            i, value = item
+            try:
+                return constructor(
+                    value,
+                    client,
+                    skills,
+                    occupation if classifier is None else False,
+                    embedding or classifier is not None,
+                    config_file,
+                    **options,
+                )
+            except Exception as e:
+                log.error("extraction failed for input {}: {!r}".format(i, e))
+                return e
+
+        results = ordered_map(extract, enumerate(inputs), workers)
+        if classifier is None:
+            return results
+        return JobStructAI._classify_many(results, prompts, classifier, embedding, workers)
+
+    @staticmethod
+    def _classify_many(
+        results: Iterator[Union["JobStructAI", Exception]],
+        prompts: Prompts,
+        classifier: OccupationClassifier,
+        embedding: bool,
+        workers: int,
+    ) -> Iterator[Union["JobStructAI", Exception]]:
+        """
+        Predict the occupations of the extracted `results`, which have
+        their embeddings, in batches of `predict_batch` postings with one
+        call of the local `classifier` each. Run the `occupation` prompt on
+        a pool of `workers` threads for the postings without a confident
+        prediction, and drop the embeddings unless `embedding` is set.
+        """
+        log = logging.getLogger("jobstruct.JobStructAI.extract_many")
+
+        def prompt(self):
+            try:
+                self._set_occupation(prompts.invoke("occupation", self._summary()))
+            except Exception as e:
+                return e
+
+        n = 0
+        while True:
+            batch = list(itertools.islice(results, JobStructAI.predict_batch))
+            if not batch:
+                return
+            objects = [
+                result for result in batch
+                if not isinstance(result, Exception) and result._summary().strip()
+            ]
+            unconfident = JobStructAI._predict_occupations(
+                classifier,
+                objects,
+                [self.embedding for self in objects],
+            )
+            errors = dict(zip(map(id, unconfident), ordered_map(prompt, unconfident, workers)))
+            for i, result in enumerate(batch, n):
+                error = errors.get(id(result))
+                if error is not None:
+                    log.error("extraction failed for input {}: {!r}".format(i, error))
+                    result = error
+                elif not embedding and not isinstance(result, Exception):
+                    result.embedding = None
+                yield result
+            n += len(batch)
+
+    @classmethod
+    def extract_packed(
+        cls,
+        inputs: Iterable,
+        client: BedrockRuntimeClient,
+        skills: Optional[SkillsTaxonomyAI] = None,
+        occupation: Union[bool, OccupationClassifier] = False,
+        embedding: bool = False,
+        config_file: str = "",
+        workers: int = 1,
+        read: Optional[Callable[[Any], str]] = None,
+        compactor: Optional[Compactor] = None,
+    ) -> Iterator[Union["JobStructAI", Exception]]:
+        """
+        Creates a JobStructAI object for each of the `inputs` like
+        `extract_many`, but extracts consecutive short postings together in
+        one call of the `extract_packed` prompt, so that its instructions
+        and schema are sent once per call instead of once per posting.
+
+        A pack holds up to the `max_pack` setting of the `extract_packed`
+        prompt configuration, as long as the estimated outputs of its
+        postings fit in the configuration's `max_tokens`. Postings that are
+        split into chunks or filled entirely by rules are extracted on their
+        own, as are postings whose result is missing or malformed in the
+        packed output. The packs are extracted on a pool of `workers`
+        threads, and the objects are yielded in input order.
+
+        By default, each input is a job posting text string. Provide a
+        `read` function to read each input into a text, for example from a
+        filename. If reading or extraction fails for an input, the exception
+        is logged and yielded in place of the JobStructAI object.
+        """
+        log = logging.getLogger("jobstruct.JobStructAI.extract_packed")
+
+        prompts = Prompts(client, config_file)
+        max_pack = prompts.setting("extract_packed", "max_pack", 1)
+        budget = prompts.setting("extract_packed", "max_tokens")
+
+        def plan(i, value):
+            try:
+                text = read(value) if read is not None else value
+                self = cls.__new__(cls)
+                text, self.tokens_saved = JobStructAI._compact(compactor, text)
+                return (i, self) + self._plan(prompts, text)
+            except Exception as e:
+                log.error("extraction failed for input {}: {!r}".format(i, e))
+                return i, e, [], (), {}
+
+        def packs():
+            # Each item is (input index, JobStructAI object, chunks, omit,
+            # filled), and the items of a pack share the fields to omit.
+            pack, tokens = [], 0
+            for i, value in enumerate(inputs):
+                item = plan(i, value)
+                chunks, omit = item[2], item[3]
+                size = result_budget(chunks[0]) if len(chunks) == 1 else budget + 1
+                if pack and (len(pack) >= max_pack or tokens + size > budget or omit != pack[0][3]):
+                    yield pack
+                    pack, tokens = [], 0
+                if size > budget or max_pack <= 1:
+                    yield [item]
+                    continue
+                pack.append(item)
+                tokens += size
+            if pack:
+                yield pack
+
+        def extract(pack):
+            results = [None] * len(pack)
+            calls = 0
+            if len(pack) > 1:
+                calls += 1
+                omit = pack[0][3]
+                try:
+                    response = prompts.invoke(
+                        "extract_packed",
+                        pack_texts([chunks[0] for _, _, chunks, _, _ in pack]),
+                        omit=omit,
+                    )
+                    results = unpack_results(
+                        Prompts.safe_json(response, []),
+                        len(pack),
+                        [field for field in Prompts.extract_fields if field not in omit],
+                    )
+                except Exception as e:
+                    log.warning("packed extraction failed for inputs {}-{}: {!r}".format(pack[0][0], pack[-1][0], e))
+                missing = sum(result is None for result in results)
+                if missing:
+                    log.debug("extracting {} of {} packed inputs on their own".format(missing, len(pack)))
+
+            objects = []
+            for (i, self, chunks, omit, filled), result in zip(pack, results):
+                if isinstance(self, Exception):
+                    objects.append(self)
+                    continue
+                try:
+                    if result is None:
+                        calls += len(chunks)
+                        result = JobStructAI._extract_chunks(prompts, chunks, omit, filled)
+                    else:
+                        result = JobStructAI._merge([result], omit, filled)
+                    self._structure(result)
+                    self._estimate(prompts, skills, occupation, embedding)
+                    objects.append(self)
+                except Exception as e:
+                    log.error("extraction failed for input {}: {!r}".format(i, e))
+                    objects.append(e)
+            return objects, calls
+
+        n = 0
+        calls = 0
+        for objects, pack_calls in ordered_map(extract, packs(), workers):
+            n += len(objects)
+            calls += pack_calls
+            yield from objects
+        log.info("extracted {} inputs in {} extract calls".format(n, calls))
+
+    @classmethod
+    async def aextract_many(
+        cls,
+        texts: Iterable[str],
+        client: AsyncBedrockRuntimeClient,
+        skills: Optional[SkillsTaxonomyAI] = None,
+        occupation: Union[bool, OccupationClassifier] = False,
+        embedding: bool = False,
+        config_file: str = "",
+        concurrency: int = 16,
+        compactor: Optional[Compactor] = None,
+    ) -> List[Union["JobStructAI", Exception]]:
+        """
+        Asynchronously creates a JobStructAI object for each of the job
+        posting `texts` on the running event loop, with at most `concurrency`
+        requests to the async-capable Bedrock `client` in flight at once.
+
+        If `occupation` is a trained OccupationClassifier, the occupations
+        of all postings are predicted together from their embeddings, and
+        only the postings without a confident prediction run the
+        `occupation` prompt.
+
+        Returns the objects in input order. If extraction fails for an input,
+        the exception is logged and returned in place of the JobStructAI
+        object.
+        """
+        log = logging.getLogger("jobstruct.JobStructAI.aextract_many")
+
+        semaphore = asyncio.Semaphore(concurrency)
+        prompts = Prompts(client, config_file, semaphore)
+        classifier = occupation if isinstance(occupation, OccupationClassifier) else None
+
+        results = await asyncio.gather(
+            *(
+                cls.acreate(
+                    text,
+                    client,
+                    skills,
+                    occupation if classifier is None else False,
+                    embedding or classifier is not None,
+                    config_file,
+                    semaphore,
+                    compactor,
+                    prompts,
+                )
+                for text in texts
+            ),
+            return_exceptions=True,
+        )
+        if classifier is not None:
+            objects = [
+                result for result in results
+                if not isinstance(result, Exception) and result._summary().strip()
+            ]
+            unconfident = JobStructAI._predict_occupations(
+                classifier,
+                objects,
+                [self.embedding for self in objects],
+            )
+            responses = await asyncio.gather(
+                *(prompts.ainvoke("occupation", self._summary()) for self in unconfident),
+                return_exceptions=True,
+            )
+            errors = {}
+            for self, response in zip(unconfident, responses):
+                if isinstance(response, Exception):
+                    errors[id(self)] = response
+                else:
+                    self._set_occupation(response)
+            for i, result in enumerate(results):
+                if not isinstance(result, Exception):
+                    if not embedding:
+                        result.embedding = None
+                    results[i] = errors.get(id(result), result)
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                log.error("extraction failed for input {}: {!r}".format(i, result))
+
+        return results
+
     def to_dict(self):
         """
         Convert the JobStructAI object to a dictionary containing the
@@ -2,7 +2,10 @@
 # Copyright National Association of State Workforce Agencies. All Rights Reserved.
 # SPDX-License-Identifier: CC-BY-NC-SA-4.0
 
-from bs4 import BeautifulSoup
+import importlib.util
+import logging
+from bs4 import BeautifulSoup, CData, FeatureNotFound, NavigableString, Tag
+from typing import Dict, List
 
 class JobStructHTML:
     """
@@ -20,6 +23,15 @@ class JobStructHTML:
 
     tags = ["p", "div", "h1", "h2", "h3", "h4", "h5", "h6"]
 
+    # BeautifulSoup tree builder used when no parser is specified. Other
+    # parsers, such as the faster lxml, can segment malformed HTML
+    # differently, so they are opt-in, for example with "auto", which uses
+    # lxml when it is installed.
+    default_parser = "html.parser"
+
+    # The string types included by `get_text` for the tags above.
+    string_types = (NavigableString, CData)
+
     segment_keywords = {
         "description": frozenset((
             "description",
@@ -70,22 +82,43 @@ class JobStructHTML:
         self._add_attributes()
 
     @classmethod
-    def from_file(cls, filename: str) -> "JobStructHTML":
+    def from_file(cls, filename: str, parser: str = "") -> "JobStructHTML":
         """
-        Creates a JobStructHTML object from the HTML in `filename`.
+        Creates a JobStructHTML object from the HTML in `filename`, parsed
+        with the BeautifulSoup `parser` (default: `default_parser`).
         """
         with open(filename) as f:
-            soup: BeautifulSoup = BeautifulSoup(f.read(), "html.parser")
+            soup: BeautifulSoup = JobStructHTML.parse(f.read(), parser)
         return cls(soup)
 
     @classmethod
-    def from_string(cls, html: str) -> "JobStructHTML":
+    def from_string(cls, html: str, parser: str = "") -> "JobStructHTML":
         """
-        Creates a JobStructHTML object from an `html` string.
+        Creates a JobStructHTML object from an `html` string, parsed with
+        the BeautifulSoup `parser` (default: `default_parser`).
         """
-        soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
+        soup: BeautifulSoup = JobStructHTML.parse(html, parser)
         return cls(soup)
 
+    @staticmethod
+    def parse(html: str, parser: str = "") -> BeautifulSoup:
+        """
+        Parse an `html` string with the BeautifulSoup `parser`, such as
+        "lxml" or "html.parser" (default: `default_parser`). The "auto"
+        parser is lxml if it is installed, or else html.parser. A parser
+        that is not installed falls back to html.parser with a warning.
+        """
+        parser = parser or JobStructHTML.default_parser
+        if parser == "auto":
+            parser = "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+        try:
+            return BeautifulSoup(html, parser)
+        except FeatureNotFound:
+            logging.getLogger("jobstruct.JobStructHTML.parse").warning(
+                "parser '{}' is not installed, using html.parser".format(parser)
+            )
+            return BeautifulSoup(html, "html.parser")
+
     @classmethod
     def from_soup(cls, soup: BeautifulSoup) -> "JobStructHTML":
         """
@@ -94,6 +127,17 @@ class JobStructHTML:
         """
         return cls(soup)
 
+    @classmethod
+    def from_document(cls, document: "HTMLDocument") -> "JobStructHTML":
+        """
+        Creates a JobStructHTML object from the segments of an already
+        parsed HTMLDocument, without parsing or traversing the HTML again.
+        """
+        j = cls()
+        j.soup = document.soup
+        j._copy_segments(document)
+        return j
+
     def to_dict(self):
         """
         Convert the JobStructHTML object to a dictionary containing the
@@ -117,23 +161,19 @@ class JobStructHTML:
 
     def _segment(self):
         """
-        Loop over HTML elements to find headings for each segment type and
-        append the elements following the heading to the segment lists.
+        Segment the parsed HTML in `soup`.
         """
-        segment = "other"
-        for element in self.soup.body.find_all(JobStructHTML.tags):
-            text = element.get_text(separator="\n").strip()
-            if text:
-                if len(text.split()) <= 5:
-                    segment = self._classify_segment(text.lower())
-                elif self._is_terminal(element):
-                    for line in text.split("\n"):
-                        if "equal opportunity employer" in line:
-                            self.segments["eeo"].append(line)
-                        else:
-                            self.segments[segment].append(line)
+        self._copy_segments(HTMLDocument(self.soup))
+
+    def _copy_segments(self, document: "HTMLDocument"):
+        """
+        Append the segments of an HTMLDocument to the segment lists.
+        """
+        for segment, values in document.segments.items():
+            self.segments[segment].extend(values)
 
-    def _classify_segment(self, text: str):
+    @staticmethod
+    def _classify_segment(text: str):
         """
         Classify `text` into one of the segment types using keywords.
         Defaults to "other" if no keywords were found.
@@ -143,14 +183,6 @@ class JobStructHTML:
                 return segment
         return "other"
 
-    def _is_terminal(self, element):
-        """
-        """
-        return all(
-            element.find(tag) is None
-            for tag in JobStructHTML.tags
-        )
-
     def _add_attributes(self):
         """
         Add attributes for each segment type to the returned object.
@@ -171,3 +203,112 @@ class JobStructHTML:
                 else:
                     output.append(f"{segment}: []")
         return "\n".join(output)
+
+
+class HTMLDocument:
+    """
+    A job posting that has been parsed and traversed once, holding both the
+    text blocks used by JobStructAI and the segments used by JobStructHTML,
+    so that bulk jobs that need both parse each posting only once. The
+    attributes are:
+    * soup: the BeautifulSoup-parsed HTML
+    * blocks: the text of each terminal element (one that contains no other
+      `JobStructHTML.tags` elements), in document order
+    * segments: the segment lists, as in `JobStructHTML.segments`
+    """
+
+    def __init__(self, soup: BeautifulSoup):
+        """
+        Traverses and segments the HTML job posting `soup` that has been
+        parsed by BeautifulSoup.
+        """
+        self.soup: BeautifulSoup = soup
+        self.blocks: List[str] = []
+        self.segments: Dict[str, List[str]] = {
+            segment: list()
+            for segment in JobStructHTML.segment_keywords.keys()
+        }
+        self.segments["other"] = list()
+        self._segment()
+
+    @classmethod
+    def from_file(cls, filename: str, parser: str = "") -> "HTMLDocument":
+        """
+        Creates an HTMLDocument object from the HTML in `filename`, parsed
+        with the BeautifulSoup `parser`.
+        """
+        with open(filename) as f:
+            return cls(JobStructHTML.parse(f.read(), parser))
+
+    @classmethod
+    def from_string(cls, html: str, parser: str = "") -> "HTMLDocument":
+        """
+        Creates an HTMLDocument object from an `html` string, parsed with
+        the BeautifulSoup `parser`.
+        """
+        return cls(JobStructHTML.parse(html, parser))
+
+    @property
+    def text(self) -> str:
+        """
+        All text contained in the terminal elements, one block per line.
+        """
+        return "\n".join(self.blocks)
+
+    def _segment(self):
+        """
+        Loop over HTML elements to find headings for each segment type and
+        append the elements following the heading to the segment lists.
+        """
+        segment = "other"
+        for words, strings in self._traverse():
+            text = "\n".join(strings).strip() if strings is not None else None
+            if text is not None:
+                self.blocks.append(text)
+            if words:
+                if len(words) <= 5:
+                    segment = JobStructHTML._classify_segment(" ".join(words).lower())
+                elif text is not None:
+                    for line in text.split("\n"):
+                        if "equal opportunity employer" in line:
+                            self.segments["eeo"].append(line)
+                        else:
+                            self.segments[segment].append(line)
+
+    def _traverse(self):
+        """
+        Return a [words, strings] pair for each of the `JobStructHTML.tags`
+        elements in the body, in document order, from a single depth-first
+        traversal. `words` holds the first 6 words of the element's text,
+        which is enough to tell headings (at most 5 words) from content, and
+        `strings` holds the strings of the element's text if it is terminal,
+        or None otherwise.
+        """
+        tags = frozenset(JobStructHTML.tags)
+        blocks = []
+        open_blocks = []
+        body = self.soup.body
+        stack = [(body, False)]
+        while stack:
+            node, closing = stack.pop()
+            if closing:
+                # Pass the element's words up to its enclosing element.
+                words = blocks[open_blocks.pop()][0]
+                if open_blocks:
+                    parent_words = blocks[open_blocks[-1]][0]
+                    parent_words.extend(words[:6 - len(parent_words)])
+            elif isinstance(node, Tag):
+                if node.name in tags and node is not body:
+                    if open_blocks:
+                        blocks[open_blocks[-1]][1] = None
+                    open_blocks.append(len(blocks))
+                    blocks.append([[], []])
+                    stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.contents))
+            elif type(node) in JobStructHTML.string_types and open_blocks:
+                words, strings = blocks[open_blocks[-1]]
+                if strings is not None:
+                    strings.append(node)
+                if len(words) < 6:
+                    words.extend(node.split()[:6 - len(words)])
+        return blocks
@@ -0,0 +1,174 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import json
+import re
+from typing import Any, Tuple
+
+_decoder = json.JSONDecoder(strict=False)
+_space = re.compile(r"\s*")
+_unescaped_quote = re.compile(r'(?<!\\)((?:\\\\)*)"')
+_truncated_escape = re.compile(r"(?<!\\)((?:\\\\)*)\\(u[0-9a-fA-F]{0,3})?$")
+_bare = re.compile(r"[^\s,:\[\]\{\}\"']+")
+# Deepest nesting of objects and arrays accepted by `repair_json`, well
+# below the recursion limit, so that the value can be serialized again.
+max_depth = 256
+_literals = {
+    "true": True, "True": True,
+    "false": False, "False": False,
+    "null": None, "None": None,
+}
+
+def locate_json(text: str) -> Tuple[int, int]:
+    """
+    Return the `start` and `end` offsets of the outermost JSON object or
+    array in a model output `text`, from the first opening bracket to the
+    last closing bracket, or (-1, -1) if there is no opening bracket.
+    Scans the text once from each end.
+    """
+    start = next_start(text, 0)
+    if start < 0:
+        return -1, -1
+    end = max(text.rfind("}"), text.rfind("]")) + 1
+    return start, max(end, start)
+
+def next_start(text: str, i: int) -> int:
+    """
+    Return the offset of the first opening bracket at or after offset `i`
+    of `text`, or -1 if there is none.
+    """
+    starts = [j for j in (text.find("{", i), text.find("[", i)) if j >= 0]
+    return min(starts) if starts else -1
+
+def decode_json(text: str, start: int) -> Tuple[Any, int]:
+    """
+    Strictly parse the JSON value at offset `start` of `text`, ignoring any
+    text after it, and return it and the offset after it. Raises
+    json.JSONDecodeError, with the offset of the error, if it is not valid
+    JSON.
+    """
+    return _decoder.raw_decode(text, start)
+
+def repair_json(text: str, start: int = 0) -> Any:
+    """
+    Leniently parse the JSON object or array that starts at offset `start`
+    of `text`, in a single pass, and return it. Parsing stops when the
+    outermost object or array is closed, so trailing text is ignored. The
+    parser tolerates the mistakes that models make most often:
+    * single-quoted strings and keys, and unquoted keys (other unquoted
+      words are skipped)
+    * quotes inside strings that are not escaped
+    * missing or trailing commas
+    * Python literals True, False and None
+    * output that was truncated, for example by `max_tokens`: the open
+      strings, arrays and objects are closed, and a key without a value
+      is dropped
+
+    Raises ValueError if there is no object or array at `start`, or if it
+    is nested deeper than `max_depth`.
+    """
+    n = len(text)
+    i = _space.match(text, start).end()
+    if i >= n or text[i] not in "{[":
+        raise ValueError("no JSON object or array at offset {}".format(start))
+
+    # Each frame is [container, key], where key is the key read for the
+    # next value of an object (or None).
+    stack = []
+    while i < n:
+        c = text[i]
+        if c in " \t\r\n,:":
+            i += 1
+            continue
+        if c == "{" or c == "[":
+            if len(stack) == max_depth:
+                raise ValueError("JSON nested deeper than {} at offset {}".format(max_depth, i))
+            stack.append([{} if c == "{" else [], None])
+            i += 1
+            continue
+        if c == "}" or c == "]":
+            i += 1
+            if not stack:
+                continue
+            value = stack.pop()[0]
+            if not stack:
+                return value
+        elif c == '"' or c == "'":
+            value, i = _string(text, i)
+        else:
+            match = _bare.match(text, i)
+            if match is None:
+                i += 1
+                continue
+            value, i = _scalar(match.group()), match.end()
+            if isinstance(value, str) and not (isinstance(stack[-1][0], dict) and stack[-1][1] is None):
+                # Bare words are only accepted as keys, not as values.
+                continue
+
+        container, key = stack[-1]
+        if isinstance(container, list):
+            container.append(value)
+        elif key is None:
+            stack[-1][1] = value if isinstance(value, str) else json.dumps(value)
+        else:
+            container[key] = value
+            stack[-1][1] = None
+
+    # The text was truncated, so close the open objects and arrays.
+    value = stack.pop()[0]
+    while stack:
+        container, key = stack[-1]
+        if isinstance(container, list):
+            container.append(value)
+        elif key is not None:
+            container[key] = value
+        value = stack.pop()[0]
+    return value
+
+def _string(text: str, i: int) -> Tuple[str, int]:
+    """
+    Read the string that starts with the quote at offset `i` of `text`, and
+    return it and the offset after it. A quote only closes the string if it
+    is followed by a delimiter, a line break or the end of the text, so
+    that unescaped quotes and apostrophes inside strings are kept. A string
+    that is not closed extends to the end of the text.
+    """
+    quote = text[i]
+    n = len(text)
+    j = i + 1
+    while True:
+        j = text.find(quote, j)
+        if j < 0:
+            raw, end = text[i + 1:], n
+            break
+        backslashes = 0
+        while text[j - 1 - backslashes] == "\\":
+            backslashes += 1
+        if backslashes % 2 == 0:
+            after = _space.match(text, j + 1).end()
+            if after >= n or text[after] in ",:]}" or "\n" in text[j + 1:after]:
+                raw, end = text[i + 1:j], j + 1
+                break
+        j += 1
+
+    body = raw.replace("\\'", "'") if quote == "'" else raw
+    body = _unescaped_quote.sub(r'\1\\"', body)
+    if end == n:
+        # Drop an escape sequence that was cut off by truncation.
+        body = _truncated_escape.sub(r"\1", body)
+    try:
+        return _decoder.decode('"' + body + '"'), end
+    except ValueError:
+        return raw, end
+
+def _scalar(word: str) -> Any:
+    """
+    Convert a bare `word` to a literal, a number, or else a string.
+    """
+    if word in _literals:
+        return _literals[word]
+    try:
+        return json.loads(word)
+    except ValueError:
+        return word
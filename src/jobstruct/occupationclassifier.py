@@ -0,0 +1,129 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import json
+import logging
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+from .embeddings import normalize
+
+class OccupationClassifier:
+    """
+    A local nearest-centroid classifier that predicts the SOC major
+    occupation group of a job posting from its embedding, trained on the
+    `occupation` labels of previously extracted JobStructAI outputs.
+
+    Each occupation code has a normalized centroid of the embeddings of
+    the postings labelled with it. A posting's confidence in each code is
+    the softmax of its cosine similarities to the centroids, scaled by
+    1 / `temperature`. Predictions with a confidence below `threshold`
+    should fall back to the `occupation` prompt.
+    """
+
+    def __init__(
+        self,
+        labels: List[str],
+        centroids: np.ndarray,
+        threshold: float = 0.5,
+        temperature: float = 0.05,
+    ):
+        self.labels = list(labels)
+        self.centroids = normalize(np.asarray(centroids, dtype=np.float32))
+        self.threshold = threshold
+        self.temperature = temperature
+
+    @classmethod
+    def fit(
+        cls,
+        embeddings: np.ndarray,
+        occupations: List[List[str]],
+        threshold: float = 0.5,
+        temperature: float = 0.05,
+    ) -> "OccupationClassifier":
+        """
+        Train a classifier from a matrix of posting `embeddings` and the
+        list of `occupations` codes for each posting. A posting with two
+        codes contributes to both centroids.
+        """
+        embeddings = normalize(np.asarray(embeddings, dtype=np.float32))
+        labels = sorted(set(code for codes in occupations for code in codes))
+        index = {label: i for i, label in enumerate(labels)}
+
+        # Sum the embeddings for each label with one matrix multiply
+        # against a sparse indicator matrix of postings x labels.
+        indicator = np.zeros((len(occupations), len(labels)), dtype=np.float32)
+        for i, codes in enumerate(occupations):
+            for code in codes:
+                indicator[i, index[code]] = 1.0
+
+        return cls(labels, indicator.T @ embeddings, threshold, temperature)
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Dict],
+        threshold: float = 0.5,
+        temperature: float = 0.05,
+    ) -> "OccupationClassifier":
+        """
+        Train a classifier from JobStructAI `records` (as produced by
+        `to_dict`) that have both an `embedding` and an `occupation`.
+        """
+        embeddings = []
+        occupations = []
+        for record in records:
+            if record and record.get("embedding") and record.get("occupation"):
+                embeddings.append(record["embedding"])
+                occupations.append(record["occupation"])
+        if not embeddings:
+            raise ValueError("no records with both an embedding and an occupation")
+        logging.getLogger("jobstruct.OccupationClassifier.from_records").info(
+            "training on {} labelled records".format(len(embeddings))
+        )
+        return cls.fit(np.array(embeddings), occupations, threshold, temperature)
+
+    @classmethod
+    def from_file(cls, filename: str) -> "OccupationClassifier":
+        """
+        Creates an OccupationClassifier object from the JSON in `filename`.
+        """
+        with open(filename) as f:
+            model = json.load(f)
+        return cls(
+            model["labels"],
+            np.array(model["centroids"], dtype=np.float32),
+            model["threshold"],
+            model["temperature"],
+        )
+
+    def to_dict(self) -> Dict:
+        """
+        Convert the OccupationClassifier object to a dictionary.
+        """
+        return {
+            "labels": self.labels,
+            "centroids": self.centroids.tolist(),
+            "threshold": self.threshold,
+            "temperature": self.temperature,
+        }
+
+    def predict_proba(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Return the confidence in each label (columns) for each of the
+        `embeddings` (rows).
+        """
+        embeddings = normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        scores = (embeddings @ self.centroids.T) / self.temperature
+        scores -= scores.max(axis=1, keepdims=True)
+        proba = np.exp(scores)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, embeddings: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        """
+        Return the most likely label and its confidence for each of the
+        `embeddings`.
+        """
+        proba = self.predict_proba(embeddings)
+        best = proba.argmax(axis=1)
+        return [self.labels[i] for i in best], proba[np.arange(len(best)), best]
@@ -0,0 +1,54 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+from typing import Any, Dict, Iterable, List, Optional
+from .prompts import Prompts
+
+# Estimated output tokens of the keys and punctuation of one result, in
+# addition to the extracted text.
+result_tokens = 128
+
+def result_budget(text: str) -> int:
+    """
+    Estimate the output tokens of the `extract` result for a posting `text`.
+    Most extracted fields are copied from the posting, so its input tokens
+    are a conservative estimate of the extracted text.
+    """
+    return Prompts.estimate_tokens(text) + result_tokens
+
+def pack_texts(texts: List[str]) -> str:
+    """
+    Join job posting `texts` into the input of the `extract_packed` prompt,
+    each in a <text id="..."></text> block with ids numbered from 1.
+    """
+    return "\n".join(
+        '<text id="{}">\n{}\n</text>'.format(i, text.replace("</text>", "</ text>"))
+        for i, text in enumerate(texts, 1)
+    )
+
+def unpack_results(response: Any, n: int, fields: Iterable[str]) -> List[Optional[Dict]]:
+    """
+    Demultiplex the parsed output `response` of the `extract_packed` prompt
+    for `n` packed postings into the result for each posting, matched by
+    its `id`. The result of a posting is None if its item is missing, is
+    not an object, or lacks any of the requested `fields` (for example,
+    because the output was truncated), so that it can be extracted on its
+    own. If ids are repeated, the first item is used.
+    """
+    fields = list(fields)
+    results = [None] * n
+    if isinstance(response, dict):
+        response = [response]
+    if not isinstance(response, list):
+        return results
+    for item in response:
+        if not isinstance(item, dict):
+            continue
+        try:
+            i = int(str(item.get("id")).strip()) - 1
+        except ValueError:
+            continue
+        if 0 <= i < n and results[i] is None and all(field in item for field in fields):
+            results[i] = {key: value for key, value in item.items() if key != "id"}
+    return results
@@ -0,0 +1,35 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+def ordered_map(
+    func: Callable,
+    iterable: Iterable,
+    workers: int = 1,
+    window: Optional[int] = None,
+) -> Iterator:
+    """
+    Apply `func` to each item in `iterable` on a pool of `workers` threads
+    and yield the results in input order. At most `window` items (default:
+    twice the number of workers) are in flight at once, so that arbitrarily
+    long iterables are processed in bounded memory. With a single worker,
+    items are processed serially in the calling thread.
+    """
+    if workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    window = max(window or 2 * workers, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
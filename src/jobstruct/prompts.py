@@ -2,13 +2,33 @@
 # Copyright National Association of State Workforce Agencies. All Rights Reserved.
 # SPDX-License-Identifier: CC-BY-NC-SA-4.0
 
+import asyncio
+import inspect
 import json
 import logging
 import re
 from importlib import resources
 from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
 from textwrap import dedent
-from typing import Any, Dict, List, Union
+from typing import Any, Callable, Dict, Generator, List, Optional, Protocol, Tuple, Union
+from .jsonrepair import decode_json, locate_json, next_start, repair_json
+
+class AsyncBedrockRuntimeClient(Protocol):
+    """
+    Protocol for an async-capable Bedrock runtime client, such as the
+    `bedrock-runtime` client from aiobotocore. The `body` of the returned
+    response may have either a synchronous or an awaitable `read` method.
+    """
+
+    async def invoke_model(
+        self,
+        *,
+        body: str,
+        modelId: str,
+        accept: str,
+        contentType: str,
+    ) -> Dict:
+        ...
 
 class Prompts:
     """
@@ -55,6 +75,19 @@ class Prompts:
             }}```
          </schema>""")
 
+    # The `extract` prompt for several job postings at once, each in a
+    # <text id="..."></text> block, with the results in a JSON array.
+    extract_packed = extract.replace(
+        "read the job posting inside the <text></text> tags",
+        "read each of the job postings inside the <text id=\"...\"></text> tags",
+    ).replace(
+        "<text>\n{text}\n</text>",
+        "{text}",
+    ).replace(
+        "Return the information in JSON format using the schema below.",
+        "Return a JSON array with one object for each job posting, in the same order, with the id of the posting in an 'id' key and its information in JSON format using the schema below.",
+    )
+
     skills = dedent("""
         You are a helpful assistant.
         Your task is to read the job requirements in the <text></text> tags and map each given qualification to relevant skills
@@ -120,14 +153,58 @@ class Prompts:
         </note>
         Review your output for correctness and check if all instructions have been followed. Skip the explanation and the preamble and return your verified response only.""")
 
+    # Keys in the prompt configurations that configure this package rather
+    # than the model, and are left out of the request body:
+    # * chunk_tokens: split inputs longer than this many tokens into chunks
+    #   that are prompted separately, and merge the results (0 to disable)
+    # * max_continuations: when the output stops at `max_tokens`, continue
+    #   it up to this many times by prefilling the partial output
+    # * rules_confidence: fill `RuleExtractor.fields` with deterministic
+    #   rules when they are at least this confident, and leave them out of
+    #   the prompt (0 to disable)
+    # * fields: the fields of `extract_fields` to extract (default: all);
+    #   the prompt is skipped if rules fill all of them
+    # * max_pack: the most postings to extract together in one call of the
+    #   `extract_packed` prompt
+    settings = ("chunk_tokens", "max_continuations", "rules_confidence", "fields", "max_pack")
+
+    # The most starts of JSON output that `safe_json` tries.
+    max_json_starts = 8
+
+    schema_field = re.compile(r"(\s*)'(\w+)':")
+
+    # The top-level fields in the `extract` prompt's schema.
+    extract_fields = (
+        "job_title",
+        "details",
+        "required",
+        "preferred",
+        "benefits",
+        "salary",
+        "wage",
+        "entry_level",
+        "college_degree",
+        "full_time",
+        "remote",
+    )
+
     def __init__(
         self,
-        client: BedrockRuntimeClient,
+        client: Union[BedrockRuntimeClient, AsyncBedrockRuntimeClient],
         config_file: str = "",
+        semaphore: Optional[asyncio.Semaphore] = None,
     ):
         """
+        Prepare prompts for invocation on a Bedrock `client`, using the
+        prompt configurations in `config_file` (default: the package's
+        `prompt_configs.json`).
+
+        For asynchronous invocation with `ainvoke`, the `client` must be
+        async-capable, and an optional `semaphore` limits the number of
+        requests in flight at once.
         """
         self.client = client
+        self.semaphore = semaphore
         if config_file:
             with open(config_file) as f:
                 self.prompt_configs = json.load(f)
@@ -135,33 +212,92 @@ class Prompts:
             with resources.open_text("jobstruct.data", "prompt_configs.json") as f:
                 self.prompt_configs = json.load(f)
 
+    def setting(self, name: str, key: str, default: Any = 0) -> Any:
+        """
+        Return the value of the setting `key` (see `settings`) for prompt
+        `name`, or `default` if it is not configured.
+        """
+        return self.prompt_configs.get(name, {}).get(key, default)
+
     @staticmethod
-    def safe_json(text: str, default: Any) -> Union[Dict, List]:
+    def estimate_tokens(text: str) -> int:
+        """
+        Rough estimate of the number of model tokens in `text`, at about
+        four characters per token of English text.
+        """
+        return (len(text) + 3) // 4
+
+    @staticmethod
+    def safe_json(text: str, default: Any = None) -> Union[Dict, List]:
         """
         Safely parse JSON output from `text` after stripping extraneous text.
-        Return the `default` value if parsing fails.
+        If strict parsing fails before the end of the output, for example at
+        a bracket in the prose before it, parsing restarts at the next
+        opening bracket after the failure, for up to `max_json_starts`
+        starts. If none parses strictly, for example because the output uses
+        single quotes or was truncated, recover what can be parsed from the
+        same starts with `repair_json`. A value whose type differs from that
+        of a `default` other than None is rejected. Return the `default`
+        value if parsing fails, including for output nested too deeply to
+        parse.
         """
         log = logging.getLogger("jobstruct.Prompts.safe_json")
 
-        text = re.sub(r"(^[^\{\[]*)|([^\]\}]*$)", "", text)
-        log.debug("stripped text: {}".format(text))
+        def accepted(value):
+            return default is None or isinstance(value, type(default))
 
-        try:
-            return json.loads(text)
-        except json.decoder.JSONDecodeError:
-            log.debug("json.loads failed")
+        start, end = locate_json(text)
+        if start < 0:
+            log.debug("no JSON found")
             return default
+        log.debug("stripped text: {}".format(text[start:end]))
 
-    def invoke(
+        try:
+            value = json.loads(text[start:end])
+            if accepted(value):
+                return value
+        except (json.decoder.JSONDecodeError, RecursionError):
+            pass
+
+        starts = []
+        i = start
+        while i >= 0 and len(starts) < Prompts.max_json_starts:
+            starts.append(i)
+            try:
+                value, i = decode_json(text, i)
+                if accepted(value):
+                    return value
+            except json.decoder.JSONDecodeError as e:
+                i = max(e.pos, i + 1)
+            except RecursionError:
+                i += 1
+            i = next_start(text, i)
+
+        log.debug("strict parsing failed, repairing")
+        for i in starts:
+            try:
+                value = repair_json(text, i)
+                if accepted(value):
+                    return value
+            except ValueError:
+                pass
+        log.debug("repair failed")
+        return default
+
+    def request(
         self,
         name: str,
         text: str,
         skills: str = "",
-    ) -> Union[Dict, List]:
+        prefill: str = "",
+        omit: Tuple[str, ...] = (),
+    ) -> Tuple[str, str]:
         """
+        Build the Bedrock request for prompt `name` with the input `text`
+        (and `skills`). Return the model ID and the serialized request body.
+        If a `prefill` is provided, the model continues the response from it.
+        The top-level schema fields in `omit` are left out of the prompt.
         """
-        log = logging.getLogger("jobstruct.Prompts.invoke")
-
         if not hasattr(Prompts, name):
             raise ValueError("{name} is an unrecognized prompt")
         if name not in self.prompt_configs:
@@ -169,6 +305,8 @@ class Prompts:
 
         prompt_config = self.prompt_configs[name].copy()
         modelId = prompt_config.pop("modelId")
+        for key in Prompts.settings:
+            prompt_config.pop(key, None)
         if name == "embedding":
             prompt_config["inputText"] = text
         else:
@@ -178,7 +316,7 @@ class Prompts:
                     "content": [
                         {
                             "type": "text",
-                            "text": getattr(Prompts, name).format(
+                            "text": Prompts.omit_fields(getattr(Prompts, name), omit).format(
                                 text=text,
                                 skills=skills,
                             )
@@ -186,30 +324,211 @@ class Prompts:
                     ]
                 }
             ]
-        body = json.dumps(prompt_config)
-        log.debug("'{}' body: {}".format(name, body))
+            if prefill:
+                prompt_config["messages"].append({
+                    "role": "assistant",
+                    "content": [{"type": "text", "text": prefill}],
+                })
+        return modelId, json.dumps(prompt_config)
+
+    @staticmethod
+    def omit_fields(prompt: str, fields: Tuple[str, ...]) -> str:
+        """
+        Remove the lines (or nested blocks) of the top-level `fields` from
+        the schema of a `prompt` template.
+        """
+        if not fields:
+            return prompt
+        lines = []
+        block = None
+        for line in prompt.split("\n"):
+            if block is not None:
+                if line.startswith(block + "}}"):
+                    block = None
+                continue
+            match = Prompts.schema_field.match(line)
+            if match and match.group(2) in fields:
+                if line.rstrip().endswith("{{"):
+                    block = match.group(1)
+                continue
+            lines.append(line)
+        return "\n".join(lines)
+
+    @staticmethod
+    def response(name: str, body: Dict) -> Union[str, List]:
+        """
+        Return the result for prompt `name` from a deserialized Bedrock
+        response `body`: the embedding vector for the `embedding` prompt,
+        otherwise the generated text.
+        """
+        if name == "embedding":
+            return body.get("embedding")
+        else:
+            return body.get("content")[0].get("text")
+
+    def invoke(
+        self,
+        name: str,
+        text: str,
+        skills: str = "",
+        omit: Tuple[str, ...] = (),
+    ) -> Union[str, List]:
+        """
+        Invoke prompt `name` with the input `text` (and `skills`) and return
+        the result. If the output stops at `max_tokens`, it is continued up
+        to `max_continuations` times (see `settings`) and the parts are
+        joined.
+        """
+        steps = self._continue(
+            name,
+            lambda prefill: self.request(name, text, skills, prefill, omit),
+            "jobstruct.Prompts.invoke",
+        )
+        request = next(steps)
+        try:
+            while True:
+                request = steps.send(self._invoke_model(*request))
+        except StopIteration as stop:
+            return stop.value
 
+    def _invoke_model(self, modelId: str, body: str) -> Dict:
+        """
+        Invoke the model and return the deserialized response body.
+        """
         response = self.client.invoke_model(
             body=body,
             modelId=modelId,
             accept="application/json",
             contentType="application/json"
         )
-        log.debug("response: {}".format(response))
+        logging.getLogger("jobstruct.Prompts.invoke").debug(
+            "response: {}".format(response)
+        )
+        return json.loads(response.get("body").read())
 
-        if name == "embedding":
-            result = (
-                json
-                .loads(response.get("body").read())
-                .get("embedding")
-            )
-        else:
-            result = (
-                json
-                .loads(response.get("body").read())
-                .get("content")[0]
-                .get("text")
-            )
+    def _continue(
+        self,
+        name: str,
+        request: Callable[[str], Tuple[str, str]],
+        logger: str,
+        data: Optional[Dict] = None,
+    ) -> Generator[Tuple[str, str], Dict, Union[str, List]]:
+        """
+        Generate the requests of `invoke` and `ainvoke` for prompt `name`,
+        as (model ID, body) pairs built by `request` from a prefill, each of
+        which is sent its deserialized response body, and return the
+        result. If the output stops at `max_tokens`, it is continued from a
+        prefill of the output so far. If the response `data` of the first
+        request is provided, only the continuations are generated.
+
+        Bedrock rejects a prefill that ends with whitespace, so trailing
+        whitespace is stripped from the prefill and added back before the
+        continuation, unless the continuation starts with whitespace of
+        its own.
+        """
+        log = logging.getLogger(logger)
+
+        if data is None:
+            modelId, body = request("")
+            log.debug("'{}' body: {}".format(name, body))
+            data = yield modelId, body
+        result = Prompts.response(name, data)
+
+        for _ in range(self.setting(name, "max_continuations")):
+            if not Prompts.truncated(name, data):
+                break
+            prefill = result.rstrip()
+            log.debug("continuing '{}' after {} characters".format(name, len(result)))
+            data = yield request(prefill)
+            continuation = Prompts.response(name, data)
+            if continuation[:1].isspace():
+                result = prefill + continuation
+            else:
+                result += continuation
         log.debug("result: {}".format(result))
 
         return result
+
+    def resume(self, name: str, body: Dict, data: Dict) -> Union[str, List]:
+        """
+        Return the result of a request `body` for prompt `name` that was
+        invoked elsewhere, for example in a Bedrock batch inference job,
+        from its deserialized response body `data`. If the output stopped at
+        `max_tokens`, it is continued on the client as in `invoke`.
+        """
+        modelId = self.prompt_configs[name]["modelId"]
+
+        def request(prefill):
+            continued = dict(body)
+            continued["messages"] = body["messages"] + [{
+                "role": "assistant",
+                "content": [{"type": "text", "text": prefill}],
+            }]
+            return modelId, json.dumps(continued)
+
+        steps = self._continue(name, request, "jobstruct.Prompts.resume", data)
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(self._invoke_model(*request))
+        except StopIteration as stop:
+            return stop.value
+
+    @staticmethod
+    def truncated(name: str, body: Dict) -> bool:
+        """
+        Whether the generated text in a deserialized Bedrock response `body`
+        for prompt `name` was cut off at `max_tokens`.
+        """
+        return name != "embedding" and body.get("stop_reason") == "max_tokens"
+
+    async def ainvoke(
+        self,
+        name: str,
+        text: str,
+        skills: str = "",
+        omit: Tuple[str, ...] = (),
+    ) -> Union[str, List]:
+        """
+        Asynchronously invoke prompt `name` with the input `text` (and
+        `skills`) on an async-capable client and return the result.
+        """
+        steps = self._continue(
+            name,
+            lambda prefill: self.request(name, text, skills, prefill, omit),
+            "jobstruct.Prompts.ainvoke",
+        )
+        request = next(steps)
+        try:
+            while True:
+                request = steps.send(await self._ainvoke_limited(*request))
+        except StopIteration as stop:
+            return stop.value
+
+    async def _ainvoke_limited(self, modelId: str, body: str) -> Dict:
+        """
+        Await the model invocation, within the semaphore if there is one,
+        and return the deserialized response body.
+        """
+        if self.semaphore is None:
+            return json.loads(await self._ainvoke_model(modelId, body))
+        async with self.semaphore:
+            return json.loads(await self._ainvoke_model(modelId, body))
+
+    async def _ainvoke_model(self, modelId: str, body: str) -> bytes:
+        """
+        Await the model invocation and the response body.
+        """
+        response = await self.client.invoke_model(
+            body=body,
+            modelId=modelId,
+            accept="application/json",
+            contentType="application/json"
+        )
+        logging.getLogger("jobstruct.Prompts.ainvoke").debug(
+            "response: {}".format(response)
+        )
+        data = response.get("body").read()
+        if inspect.isawaitable(data):
+            data = await data
+        return data
@@ -0,0 +1,382 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import json
+import logging
+import random
+import threading
+import time
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+from importlib import resources
+from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
+from typing import Callable, Dict, Optional
+from .prompts import Prompts
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills at `rate` tokens per minute up
+    to a `capacity` (default: one minute's worth of tokens). Requests that
+    are larger than the available tokens are granted in arrival order by
+    letting the bucket go into debt and waiting for it to refill.
+
+    The refill rate adapts like the AIMDLimiter: it is halved on a throttle,
+    at most once per `cooldown` seconds and not below `minimum` (default:
+    1/16 of `rate`), and while the bucket is limiting requests, successful
+    requests raise it by `increase` times the initial rate per minute's
+    worth of tokens, up to `maximum` (default: unbounded).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        minimum: Optional[float] = None,
+        maximum: Optional[float] = None,
+        increase: float = 0.1,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate / 60.0
+        self.capacity = capacity if capacity is not None else rate
+        self.minimum = (minimum if minimum is not None else rate / 16) / 60.0
+        self.maximum = maximum / 60.0 if maximum is not None else float("inf")
+        self.increase = increase * rate / 60.0
+        self.cooldown = cooldown
+        self.decreased = None
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` tokens from the bucket and return the number of
+        seconds to wait before they are available.
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """
+        Return `amount` tokens to the bucket (or take them, if negative),
+        for example after the actual usage of a request is known.
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def throttled(self) -> None:
+        """
+        Halve the refill rate after a throttled request.
+        """
+        with self._lock:
+            now = self.clock()
+            if self.decreased is None or now - self.decreased >= self.cooldown:
+                self.rate = max(self.minimum, self.rate / 2)
+                self.decreased = now
+
+    def succeeded(self, amount: float) -> None:
+        """
+        Raise the refill rate after a successful request of `amount`
+        tokens, if the bucket cannot grant another such request without
+        waiting.
+        """
+        with self._lock:
+            if self.tokens < amount:
+                self.rate = min(
+                    self.maximum,
+                    self.rate + self.increase * amount / (self.rate * 60.0),
+                )
+
+
+class AIMDLimiter:
+    """
+    A concurrency limit that adapts with additive increase, multiplicative
+    decrease (AIMD): the limit grows by about one for every `limit`
+    successful requests and is halved on a throttle, at most once per
+    `cooldown` seconds so that a burst of throttles counts as one signal.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.clock = clock
+        self.active = 0
+        self.decreased = None
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Block until there is room for another request under the limit.
+        """
+        with self._condition:
+            while self.active >= int(self.limit):
+                self._condition.wait()
+            self.active += 1
+
+    def release(self, throttled: bool = False) -> None:
+        """
+        Release a request slot and adjust the limit according to whether
+        the request was `throttled`.
+        """
+        with self._condition:
+            self.active -= 1
+            if throttled:
+                now = self.clock()
+                if self.decreased is None or now - self.decreased >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.decreased = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RateGovernor:
+    """
+    Governs the request rate to each Bedrock model, keyed by model ID. Each
+    model has token buckets for requests per minute and tokens per minute,
+    and an AIMD concurrency limit. Failed requests that are retryable
+    (throttles, timeouts and server errors) are retried with jittered
+    exponential backoff, up to `max_attempts` attempts in total.
+
+    The per-model `limits` default to the package's `rate_limits.json`,
+    where the "default" entry applies to any model not listed. Its values
+    are placeholders, not actual Bedrock quotas, and should be replaced with
+    the quotas of the account and region. They are the starting rates of
+    the buckets, which back off on throttles and probe upward, up to the
+    optional "max_requests_per_minute" and "max_tokens_per_minute", while
+    requests succeed.
+    """
+
+    retryable_codes = frozenset((
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "ServiceUnavailableException",
+        "InternalServerException",
+        "ModelTimeoutException",
+        "ModelNotReadyException",
+    ))
+
+    throttling_codes = frozenset((
+        "ThrottlingException",
+        "TooManyRequestsException",
+    ))
+
+    def __init__(
+        self,
+        limits: Optional[Dict] = None,
+        max_attempts: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        jitter: Callable[[], float] = random.random,
+    ):
+        if limits is None:
+            with resources.open_text("jobstruct.data", "rate_limits.json") as f:
+                limits = json.load(f)
+        self.limits = limits
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter = jitter
+        self.models = {}
+        self.retries = 0
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, filename: str, **kwargs) -> "RateGovernor":
+        """
+        Creates a RateGovernor with the per-model limits in `filename`.
+        """
+        with open(filename) as f:
+            return cls(json.load(f), **kwargs)
+
+    def model(self, modelId: str) -> Dict:
+        """
+        Return the rate limiting state for `modelId`, creating it from the
+        configured limits on first use.
+        """
+        with self._lock:
+            if modelId not in self.models:
+                limits = self.limits.get(modelId, self.limits["default"])
+                self.models[modelId] = {
+                    "requests": TokenBucket(
+                        limits["requests_per_minute"],
+                        maximum=limits.get("max_requests_per_minute"),
+                        clock=self.clock,
+                    ),
+                    "tokens": TokenBucket(
+                        limits["tokens_per_minute"],
+                        maximum=limits.get("max_tokens_per_minute"),
+                        clock=self.clock,
+                    ),
+                    "concurrency": AIMDLimiter(
+                        limits.get("initial_concurrency", 4),
+                        maximum=limits.get("max_concurrency", 64),
+                        clock=self.clock,
+                    ),
+                }
+            return self.models[modelId]
+
+    def retryable(self, error: Exception) -> bool:
+        """
+        Whether a request that failed with `error` should be retried.
+        """
+        if isinstance(error, ClientError):
+            code = error.response.get("Error", {}).get("Code")
+            status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+            return code in RateGovernor.retryable_codes or status == 429 or status >= 500
+        return isinstance(error, (
+            ConnectionClosedError,
+            ConnectTimeoutError,
+            EndpointConnectionError,
+            ReadTimeoutError,
+        ))
+
+    def throttled(self, error: Exception) -> bool:
+        """
+        Whether a request failed with `error` because it was throttled.
+        """
+        if isinstance(error, ClientError):
+            code = error.response.get("Error", {}).get("Code")
+            status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+            return code in RateGovernor.throttling_codes or status == 429
+        return False
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Jittered exponential delay in seconds before retry `attempt`.
+        """
+        return self.jitter() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def call(self, modelId: str, body: str, func: Callable):
+        """
+        Call `func` for a request with the serialized `body` to `modelId`
+        under the model's rate limits, retrying retryable failures.
+        """
+        log = logging.getLogger("jobstruct.RateGovernor.call")
+
+        state = self.model(modelId)
+        tokens = Prompts.estimate_tokens(body) + json.loads(body).get("max_tokens", 0)
+
+        for attempt in range(self.max_attempts):
+            wait = max(
+                state["requests"].reserve(1),
+                state["tokens"].reserve(tokens),
+            )
+            if wait > 0:
+                self.sleep(wait)
+            state["concurrency"].acquire()
+            try:
+                result = func()
+            except Exception as e:
+                throttled = self.throttled(e)
+                state["concurrency"].release(throttled)
+                if throttled:
+                    # A throttle does not say which quota was exceeded.
+                    state["requests"].throttled()
+                    state["tokens"].throttled()
+                    with self._lock:
+                        self.throttles += 1
+                if not self.retryable(e):
+                    raise
+                # Refund the token reservation of a retryable failure, which
+                # Bedrock does not count, so that each retry reserves anew
+                # without charging for the failed attempt.
+                state["tokens"].adjust(tokens)
+                if attempt + 1 == self.max_attempts:
+                    raise
+                delay = self.backoff(attempt)
+                log.info("retrying '{}' in {:.1f}s after attempt {} failed: {!r}".format(
+                    modelId,
+                    delay,
+                    attempt + 1,
+                    e,
+                ))
+                with self._lock:
+                    self.retries += 1
+                self.sleep(delay)
+            else:
+                state["concurrency"].release()
+                # Settle the token reservation against the actual usage,
+                # when Bedrock reports it.
+                headers = result.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+                used = tokens
+                if "x-amzn-bedrock-input-token-count" in headers:
+                    used = int(headers["x-amzn-bedrock-input-token-count"]) + int(
+                        headers.get("x-amzn-bedrock-output-token-count", 0)
+                    )
+                    state["tokens"].adjust(tokens - used)
+                state["requests"].succeeded(1)
+                state["tokens"].succeeded(used)
+                return result
+
+    def stats(self) -> Dict:
+        """
+        Return the retry and throttle counters, and the current concurrency
+        limit and per-minute rates for each model.
+        """
+        return {
+            "retries": self.retries,
+            "throttles": self.throttles,
+            "concurrency": {
+                modelId: int(state["concurrency"].limit)
+                for modelId, state in self.models.items()
+            },
+            "requests_per_minute": {
+                modelId: round(state["requests"].rate * 60.0)
+                for modelId, state in self.models.items()
+            },
+            "tokens_per_minute": {
+                modelId: round(state["tokens"].rate * 60.0)
+                for modelId, state in self.models.items()
+            },
+        }
+
+
+class GovernedClient:
+    """
+    Wraps a Bedrock runtime `client` so that `invoke_model` requests are
+    rate limited and retried by a RateGovernor. All other client methods
+    pass through to the wrapped client.
+    """
+
+    def __init__(self, client: BedrockRuntimeClient, governor: RateGovernor):
+        self.client = client
+        self.governor = governor
+
+    def invoke_model(self, body: str, modelId: str, **kwargs) -> Dict:
+        return self.governor.call(
+            modelId,
+            body,
+            lambda: self.client.invoke_model(body=body, modelId=modelId, **kwargs),
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
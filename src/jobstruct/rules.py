@@ -0,0 +1,219 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import bisect
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+class RuleExtractor:
+    """
+    A deterministic extractor for the fields of the `extract` prompt that
+    can often be read directly from a job posting's text:
+    * salary, wage: dollar amounts and ranges in a sentence with a pay label
+      ("salary", "pay", ...), classified by the pay period that follows them
+      ("/year", "per hour", ...) or else by magnitude; amounts of bonuses,
+      stipends and other extras are ignored
+    * full_time: "full-time" or "part-time"
+    * remote: "remote", "work from home", or "on-site", including negated
+      phrases such as "remote work is not available"
+    * job_title: a labeled line such as "Job Title: ..." whose value is
+      shaped like a title
+
+    Each value comes with a confidence between 0 and 1, and only values
+    with at least `confidence` are used to fill fields. Conflicting matches
+    lower the confidence.
+    """
+
+    fields = ("job_title", "salary", "wage", "full_time", "remote")
+
+    amount = r"(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)\s?([kK]\b)?"
+    money = re.compile(r"\$\s?" + amount + r"(?:\s?(?:-|–|—|to)\s?\$?\s?" + amount + r")?")
+    hourly = re.compile(r"^\s?(?:/\s?(?:hour|hr)\b|per\s+hour|an\s+hour|hourly|each\s+hour)", re.I)
+    yearly = re.compile(r"^\s?(?:/\s?(?:year|yr|annum)\b|per\s+(?:year|annum)|a\s+year|annually|yearly|annual)", re.I)
+    full_time = re.compile(r"\bfull[\s-]?time\b", re.I)
+    part_time = re.compile(r"\bpart[\s-]?time\b", re.I)
+    remote = re.compile(r"\b(?:fully\s+remote|100%\s+remote|remote\s+(?:position|role|work|job|eligible|first|friendly)|work(?:ing)?\s+from\s+home|telework|telecommut\w*)\b", re.I)
+    remote_word = re.compile(r"\bremote(?:ly)?\b", re.I)
+    not_remote = re.compile(r"\b(?:not\s+(?:a\s+|fully\s+)?remote|no\s+remote|non[\s-]remote|on[\s-]?site\s+only|in[\s-]office\s+only|100%\s+on[\s-]?site|must\s+work\s+on[\s-]?site|remote\b[^.\n]{0,40}?\b(?:not|unavailable|n't)\b)", re.I)
+    title = re.compile(r"^\s*(job\s+title|position\s+title|position|title|role)\s*[:\-–]\s*(.{2,100}?)\s*$", re.I | re.M)
+    title_connectives = frozenset(("of", "and", "for", "in", "&", "-", "–", "/", "to", "at", "with"))
+    not_titles = re.compile(r"^(?:full|part)[\s-]?time|^(?:contract|temporary|permanent|internship|remote|hybrid|on[\s-]?site)\b", re.I)
+    pay_label = re.compile(r"\b(?:salary|salaries|pay|paid|compensation|wages?|rate|earn\w*|base)\b", re.I)
+    pay_extra = re.compile(r"\b(?:bonus\w*|stipends?|sign[\s-]?on|signing|relocation|reimburse\w*|allowance|401\s?\(?k\)?|referral|commission|tuition|equity)\b", re.I)
+    sentence_break = re.compile(r"(?<=[.!?])\s+")
+
+    def __init__(self, confidence: float = 0.8):
+        self.confidence = confidence
+
+    def extract(self, text: str) -> Dict[str, Tuple[Any, float]]:
+        """
+        Return the value and confidence of each field found in `text`.
+        """
+        found = {}
+        found.update(self._pay(text))
+
+        full_time = RuleExtractor.full_time.search(text) is not None
+        part_time = RuleExtractor.part_time.search(text) is not None
+        if full_time != part_time:
+            found["full_time"] = (full_time, 0.9)
+
+        if RuleExtractor.not_remote.search(text):
+            found["remote"] = (False, 0.85)
+        elif RuleExtractor.remote.search(text):
+            found["remote"] = (True, 0.9)
+        elif RuleExtractor.remote_word.search(text):
+            # For example, "remote sensing" or "remote monitoring".
+            found["remote"] = (True, 0.5)
+
+        match = RuleExtractor.title.search(text)
+        if match:
+            value = match.group(2)
+            if RuleExtractor._is_title(value):
+                found["job_title"] = (value, 0.9)
+            elif " title" in match.group(1).lower() and not RuleExtractor.not_titles.match(value):
+                found["job_title"] = (value, 0.5)
+        return found
+
+    @staticmethod
+    def _is_title(value: str) -> bool:
+        """
+        Whether a labeled `value` is shaped like a job title: at most 8
+        words, capitalized except for connectives, not a sentence, and not
+        an employment type such as "Full-time".
+        """
+        words = value.split()
+        return (
+            len(words) <= 8
+            and not value.endswith((".", "!", "?", ","))
+            and not RuleExtractor.not_titles.match(value)
+            and all(
+                word.lower() in RuleExtractor.title_connectives or not word[0].isalpha() or word[0].isupper()
+                for word in words
+            )
+        )
+
+    def fill(self, text: str) -> Dict[str, Any]:
+        """
+        Return the values of the fields found in `text` with at least the
+        extractor's `confidence`.
+        """
+        return {
+            field: value
+            for field, (value, confidence) in self.extract(text).items()
+            if confidence >= self.confidence
+        }
+
+    def _pay(self, text: str) -> Dict[str, Tuple[List[float], float]]:
+        """
+        Find the salary and wage amounts in `text`. Amounts are ignored if
+        they are next to a bonus or other extra, or if they have neither a
+        pay period nor a pay label in their sentence. Ranges take precedence over single amounts,
+        and the single amounts of one sentence form a range ("from $X/year
+        ... up to $Y/year"). If the candidates of a field disagree, the
+        first is used with a low confidence.
+        """
+        breaks = [match.end() for match in RuleExtractor.sentence_break.finditer(text)]
+        bounds = [0] + breaks + [len(text)]
+        matches = list(RuleExtractor.money.finditer(text))
+        candidates = {"salary": [], "wage": []}
+        for m, match in enumerate(matches):
+            sentence = bisect.bisect_right(breaks, match.start())
+            start, end = bounds[sentence], bounds[sentence + 1]
+            # The text between this amount and its neighbors in the sentence.
+            before = text[max(start, matches[m - 1].end() if m else 0):match.start()]
+            after = text[match.end():min(end, matches[m + 1].start() if m + 1 < len(matches) else end)]
+            if RuleExtractor.pay_extra.search(before) or RuleExtractor.pay_extra.search(after):
+                continue
+            values = [
+                float(number.replace(",", "")) * (1000 if k else 1)
+                for number, k in (match.group(1, 2), match.group(3, 4))
+                if number
+            ]
+            # "$120-150k" applies the k to both ends of the range.
+            if match.group(4) and not match.group(2) and values[0] < values[1] / 100:
+                values[0] *= 1000
+            period = text[match.end():match.end() + 24]
+            if RuleExtractor.hourly.match(period):
+                field, score = "wage", 0.9
+            elif RuleExtractor.yearly.match(period):
+                field, score = "salary", 0.9
+            elif not RuleExtractor.pay_label.search(text, start, end):
+                continue
+            elif min(values) >= 10000:
+                field, score = "salary", 0.7
+            elif max(values) <= 200:
+                field, score = "wage", 0.6
+            else:
+                continue
+            candidates[field].append((len(values) > 1, sentence, values, score))
+
+        found = {}
+        for field, items in candidates.items():
+            if not items:
+                continue
+            ranges = [item for item in items if item[0]]
+            if ranges:
+                groups = [(item[2], item[3]) for item in ranges]
+            else:
+                # Group the single amounts by sentence.
+                by_sentence = {}
+                for _, sentence, values, score in items:
+                    values_, score_ = by_sentence.get(sentence, ([], 1.0))
+                    by_sentence[sentence] = (values_ + values, min(score_, score))
+                groups = list(by_sentence.values())
+            values, score = groups[0]
+            values = sorted(set((min(values), max(values))))
+            if any(sorted(set((min(v), max(v)))) != values for v, _ in groups[1:]):
+                score = min(score, 0.6)
+            found[field] = (values, score)
+        return found
+
+
+class RuleStats:
+    """
+    Thread-safe counts, across a corpus, of the `extract` fields that were
+    filled by a RuleExtractor and of the `extract` prompt calls that were
+    avoided (all requested fields filled by rules) or reduced (some fields
+    left out of the prompt's schema).
+    """
+
+    def __init__(self):
+        self.postings = 0
+        self.fields = 0
+        self.avoided = 0
+        self.reduced = 0
+        self._lock = threading.Lock()
+
+    def add(self, rule_fields: List[str], extract_calls: int) -> None:
+        """
+        Count a posting for which rules filled `rule_fields`, and that
+        needed `extract_calls` prompt calls.
+        """
+        with self._lock:
+            self.postings += 1
+            self.fields += len(rule_fields)
+            if extract_calls == 0 and rule_fields:
+                self.avoided += 1
+            elif rule_fields:
+                self.reduced += 1
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Return the fractions of rule-based fields filled and of calls
+        avoided and reduced.
+        """
+        postings = max(self.postings, 1)
+        return {
+            "postings": self.postings,
+            "fields_filled": self.fields / (postings * len(RuleExtractor.fields)),
+            "calls_avoided": self.avoided / postings,
+            "calls_reduced": self.reduced / postings,
+        }
+
+    def __str__(self) -> str:
+        return (
+            "rules filled {fields_filled:.1%} of rule-based fields in {postings} postings, "
+            "avoiding {calls_avoided:.1%} of extract calls and reducing {calls_reduced:.1%}"
+        ).format(**self.summary())
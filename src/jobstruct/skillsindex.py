@@ -0,0 +1,83 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+from typing import Callable, Dict, Iterable, List, Optional
+from .skillsnode import SkillsTree
+
+class SkillsIndex:
+    """
+    An index of the nodes of a SkillsTree that are in the subtree at its
+    `root` node, by exact name and by normalized (casefolded, whitespace
+    collapsed) name. The tree notifies the index when subtrees are linked
+    into or unlinked from the indexed subtree, so the index stays current
+    as nodes are added or removed. The optional `changed` callback is
+    called after each such change.
+    """
+
+    def __init__(self, tree: SkillsTree, root: int = 0, changed: Optional[Callable[[], None]] = None):
+        self.tree = tree
+        self.root = root
+        self.changed = None
+        self.by_name: Dict[str, List[int]] = {}
+        self.by_key: Dict[str, List[int]] = {}
+        self.added(tree.preorder(root).tolist())
+        self.changed = changed
+        tree.observers.append(self)
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        """
+        Normalize a skill `name` for case-insensitive matching.
+        """
+        return " ".join(name.casefold().split())
+
+    def added(self, nodes: Iterable[int]) -> None:
+        """
+        Index `nodes` that were added to the subtree.
+        """
+        names = self.tree.names
+        for i in nodes:
+            self.by_name.setdefault(names[i], []).append(i)
+            self.by_key.setdefault(SkillsIndex.normalize(names[i]), []).append(i)
+        if self.changed is not None:
+            self.changed()
+
+    def removed(self, nodes: Iterable[int]) -> None:
+        """
+        Remove `nodes` that were removed from the subtree from the index.
+        """
+        names = self.tree.names
+        for i in nodes:
+            for index, key in ((self.by_name, names[i]), (self.by_key, SkillsIndex.normalize(names[i]))):
+                index[key].remove(i)
+                if not index[key]:
+                    del index[key]
+        if self.changed is not None:
+            self.changed()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    def find(self, name: str, normalized: bool = False) -> List[int]:
+        """
+        Return the node numbers with `name`, or with the same normalized
+        name if `normalized` is set.
+        """
+        if normalized:
+            return list(self.by_key.get(SkillsIndex.normalize(name), []))
+        return list(self.by_name.get(name, []))
+
+    def path(self, i: int) -> List[int]:
+        """
+        Return the node numbers from the root to node `i`.
+        """
+        parent = self.tree.parent
+        path = []
+        while i >= 0:
+            path.append(i)
+            i = parent[i]
+        return path[::-1]
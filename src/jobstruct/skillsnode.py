@@ -2,19 +2,491 @@
 # Copyright National Association of State Workforce Agencies. All Rights Reserved.
 # SPDX-License-Identifier: CC-BY-NC-SA-4.0
 
-from typing import Dict, List
+import numpy as np
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Union
+
+class AttributeColumn:
+    """
+    The values of one attribute for every node of a SkillsTree, as a value
+    number per node (0 for nodes without the attribute) into a table of
+    distinct values. Hashable values are interned, so that a flag such as
+    "terminal" costs one byte per node. The value numbers are a bytearray
+    until the column has more than 255 distinct values, and 32-bit
+    integers after that.
+    """
+
+    __slots__ = ("ids", "values", "lookup")
+
+    def __init__(self, n: int):
+        self.ids: Union[bytearray, array] = bytearray(n)
+        self.values: List[Any] = []
+        self.lookup: Dict[Any, int] = {}
+
+    def set(self, i: int, value: Any) -> None:
+        # Distinguish equal values of different types, such as True and 1.
+        try:
+            key = (type(value), value)
+            number = self.lookup.get(key)
+        except TypeError:
+            key = number = None
+        if number is None:
+            self.values.append(value)
+            number = len(self.values)
+            if key is not None:
+                self.lookup[key] = number
+            if number > 255 and isinstance(self.ids, bytearray):
+                self.ids = array("i", self.ids)
+        self.ids[i] = number
+
+
+class SkillsTree:
+    """
+    Compact storage for a tree of skills nodes in parallel arrays, indexed
+    by node number:
+    * parent, first_child, last_child and next_sibling: 32-bit node
+      numbers, or -1
+    * names: the node names, interned so that repeated names are stored
+      once
+    * columns: an AttributeColumn for each attribute name, in order of
+      first use, so that attributes take a byte or a 32-bit number per node
+      instead of a dict
+
+    Node 0 is the root. All traversals are iterative, so arbitrarily deep
+    trees do not hit the recursion limit. The preorder of the tree is
+    cached until the tree changes. SkillsNode objects are views of
+    individual nodes in a SkillsTree.
+    """
+
+    def __init__(self):
+        self.parent = array("i")
+        self.first_child = array("i")
+        self.last_child = array("i")
+        self.next_sibling = array("i")
+        self.names: List[str] = []
+        self.columns: Dict[str, AttributeColumn] = {}
+        self.observers: List[Any] = []
+        self._preorder_cache = {}
+        self._rank_cache = {}
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def add(self, name: str, attributes: Dict = {}, parent: int = -1) -> int:
+        """
+        Add a node with `name` and `attributes` as the last child of the
+        `parent` node, and return its node number.
+        """
+        i = len(self.parent)
+        self.names.append(sys.intern(name))
+        self.parent.append(-1)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+        for column in self.columns.values():
+            column.ids.append(0)
+        for key, value in attributes.items():
+            self.set_attribute(i, key, value)
+        if parent >= 0:
+            self.link(parent, i)
+        return i
+
+    def link(self, parent: int, child: int) -> None:
+        """
+        Append the `child` node, which has no parent, to the children of
+        the `parent` node.
+        """
+        self._preorder_cache.clear()
+        self._rank_cache.clear()
+        self.parent[child] = parent
+        last = self.last_child[parent]
+        if last < 0:
+            self.first_child[parent] = child
+        else:
+            self.next_sibling[last] = child
+        self.last_child[parent] = child
+        self._notify("added", child)
+
+    def unlink(self, child: int) -> None:
+        """
+        Detach the `child` node (and its subtree) from its parent.
+        """
+        parent = self.parent[child]
+        if parent < 0:
+            return
+        self._notify("removed", child)
+        self._preorder_cache.clear()
+        self._rank_cache.clear()
+        previous = -1
+        sibling = self.first_child[parent]
+        while sibling != child:
+            previous, sibling = sibling, self.next_sibling[sibling]
+        if previous < 0:
+            self.first_child[parent] = self.next_sibling[child]
+        else:
+            self.next_sibling[previous] = self.next_sibling[child]
+        if self.last_child[parent] == child:
+            self.last_child[parent] = previous
+        self.next_sibling[child] = -1
+        self.parent[child] = -1
+
+    def _notify(self, event: str, child: int) -> None:
+        """
+        Notify the observers whose subtree contains the `child` node that
+        its subtree was "added" or is about to be "removed".
+        """
+        if not self.observers:
+            return
+        top = child
+        ancestors = set()
+        while top >= 0:
+            ancestors.add(top)
+            top = self.parent[top]
+        nodes = None
+        for observer in self.observers:
+            if observer.root in ancestors and observer.root != child:
+                if nodes is None:
+                    nodes = self.preorder(child).tolist()
+                getattr(observer, event)(nodes)
+
+    def name(self, i: int) -> str:
+        return self.names[i]
+
+    def attribute_dict(self, i: int) -> Dict:
+        """
+        Return a new dict of the attributes of node `i`.
+        """
+        attributes = {}
+        for key, column in self.columns.items():
+            number = column.ids[i]
+            if number:
+                attributes[key] = column.values[number - 1]
+        return attributes
+
+    def attributes(self, i: int) -> "NodeAttributes":
+        """
+        Return the attributes of node `i` as a NodeAttributes dict, which
+        writes changes through to the tree.
+        """
+        return NodeAttributes(self, i)
+
+    def set_attribute(self, i: int, key: str, value: Any) -> None:
+        """
+        Set the attribute `key` of node `i` to `value`.
+        """
+        if key not in self.columns:
+            self.columns[key] = AttributeColumn(len(self.parent))
+        self.columns[key].set(i, value)
+
+    def delete_attribute(self, i: int, key: str) -> None:
+        """
+        Remove the attribute `key` of node `i`, if it has one.
+        """
+        if key in self.columns:
+            self.columns[key].ids[i] = 0
+
+    def children(self, i: int) -> Iterator[int]:
+        """
+        Yield the children of node `i`, in order.
+        """
+        child = self.first_child[i]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def preorder(self, root: int = 0) -> np.ndarray:
+        """
+        Return the node numbers of the subtree at `root` in depth-first
+        (preorder) order.
+        """
+        return self._preorder(root)[0]
+
+    def depths(self, root: int = 0) -> np.ndarray:
+        """
+        Return the depth below `root` of each node in `preorder(root)`.
+        """
+        return self._preorder(root)[1]
+
+    def _preorder(self, root: int):
+        """
+        Walk the subtree at `root` in preorder by following first child and
+        next sibling links, without a stack.
+        """
+        if root in self._preorder_cache:
+            return self._preorder_cache[root]
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        parent = self.parent
+        order = array("i")
+        depths = array("i")
+        i, depth = root, 0
+        while True:
+            order.append(i)
+            depths.append(depth)
+            if first_child[i] >= 0:
+                i = first_child[i]
+                depth += 1
+                continue
+            while i != root and next_sibling[i] < 0:
+                i = parent[i]
+                depth -= 1
+            if i == root:
+                break
+            i = next_sibling[i]
+        result = (np.array(order, dtype=np.int32), np.array(depths, dtype=np.int32))
+        for values in result:
+            values.flags.writeable = False
+        self._preorder_cache[root] = result
+        return result
+
+    def ranks(self, root: int = 0) -> np.ndarray:
+        """
+        Return the position of each node in `preorder(root)`, or -1 for
+        nodes outside the subtree at `root`.
+        """
+        if root not in self._rank_cache:
+            order = self.preorder(root)
+            ranks = np.full(len(self.parent), -1, dtype=np.int32)
+            ranks[order] = np.arange(len(order), dtype=np.int32)
+            ranks.flags.writeable = False
+            self._rank_cache[root] = ranks
+        return self._rank_cache[root]
+
+    def leaves(self, root: int = 0) -> np.ndarray:
+        """
+        Return the node numbers of the leaves of the subtree at `root`, in
+        depth-first order.
+        """
+        order = self.preorder(root)
+        return order[np.array(self.first_child, dtype=np.int32)[order] < 0]
+
+    def copy(self, root: int = 0, keep: Optional[Set[int]] = None, into: Optional["SkillsTree"] = None, parent: int = -1) -> int:
+        """
+        Copy the subtree at `root` into the tree `into` (default: a new
+        tree) as a child of its node `parent`, keeping only the nodes in
+        `keep`, if provided, whose ancestors are also kept. Return the
+        node number of the copied root.
+        """
+        if into is None:
+            into = SkillsTree()
+        copies = {-1: parent}
+        for i in self.preorder(root).tolist():
+            if i != root and keep is not None and i not in keep:
+                continue
+            source_parent = self.parent[i] if i != root else -1
+            if source_parent not in copies:
+                continue
+            copies[i] = into.add(self.name(i), self.attribute_dict(i), copies[source_parent])
+        return copies[root]
+
+    def copy_paths(self, root: int, nodes: Iterable[int], into: Optional["SkillsTree"] = None) -> int:
+        """
+        Copy the `nodes` in the subtree at `root` and their ancestors up to
+        `root` into the tree `into` (default: a new tree), in the same
+        order as `copy`, and return the node number of the copied root.
+        Unlike `copy`, this takes time in the number of copied nodes rather
+        than the size of the subtree, once `ranks(root)` is cached.
+        """
+        if into is None:
+            into = SkillsTree()
+        ranks = self.ranks(root)
+        parent = self.parent
+        keep = {root}
+        for i in nodes:
+            if ranks[i] < 0:
+                continue
+            while i not in keep:
+                keep.add(i)
+                i = parent[i]
+        copies = {-1: -1}
+        for i in sorted(keep, key=ranks.__getitem__):
+            source_parent = parent[i] if i != root else -1
+            copies[i] = into.add(self.name(i), self.attribute_dict(i), copies[source_parent])
+        return copies[root]
+
+
+class NodeAttributes(dict):
+    """
+    The attributes of a node, returned by `SkillsNode.attributes`. It is a
+    dict of the node's attributes when it was returned, and changes made
+    through it are written to the columns of the tree.
+    """
+
+    def __init__(self, tree: SkillsTree, index: int):
+        super().__init__(tree.attribute_dict(index))
+        self.tree = tree
+        self.index = index
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.tree.set_attribute(self.index, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self.tree.delete_attribute(self.index, key)
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other: Dict) -> "NodeAttributes":
+        self.update(other)
+        return self
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    _missing = object()
+
+    def pop(self, key: str, default: Any = _missing) -> Any:
+        if key not in self:
+            if default is NodeAttributes._missing:
+                raise KeyError(key)
+            return default
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.tree.delete_attribute(self.index, key)
+        return key, value
+
+    def clear(self) -> None:
+        for key in list(self):
+            del self[key]
+
+
+class NodeList(Sequence):
+    """
+    A sequence of the nodes of a SkillsTree with the node numbers in
+    `indices`, returned by `SkillsNode.leaves` and `SkillsNode.nodes`.
+    SkillsNode views are only created for the nodes that are accessed.
+    """
+
+    def __init__(self, tree: SkillsTree, indices: np.ndarray):
+        self.tree = tree
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return NodeList(self.tree, self.indices[i])
+        return SkillsNode._view(self.tree, int(self.indices[i]))
+
+    def __iter__(self) -> Iterator["SkillsNode"]:
+        view = SkillsNode._view
+        tree = self.tree
+        for i in self.indices.tolist():
+            yield view(tree, i)
+
+    def __eq__(self, other: object) -> bool:
+        return list(self) == list(other) if isinstance(other, (list, NodeList)) else NotImplemented
+
+    def __repr__(self) -> str:
+        return "NodeList({!r})".format(list(self))
+
+
+class ChildList(list):
+    """
+    The list of children of a SkillsNode, returned by `children`. It is a
+    new list on each access, so appending, extending and removing children
+    are passed to `add_child` and `remove` to modify the tree, and other
+    changes raise TypeError.
+    """
+
+    def __init__(self, node: "SkillsNode", children: Iterable["SkillsNode"]):
+        super().__init__(children)
+        self.node = node
+
+    def append(self, child: "SkillsNode") -> None:
+        super().append(self.node.add_child(child))
+
+    def extend(self, children: Iterable["SkillsNode"]) -> None:
+        for child in children:
+            self.append(child)
+
+    def __iadd__(self, children: Iterable["SkillsNode"]) -> "ChildList":
+        self.extend(children)
+        return self
+
+    def remove(self, child: "SkillsNode") -> None:
+        super().remove(child)
+        child.remove()
+
+    def _unsupported(self, *args, **kwargs):
+        raise TypeError("use SkillsNode.add_child and SkillsNode.remove to change the children of a node")
+
+    insert = pop = clear = sort = reverse = _unsupported
+    __setitem__ = __delitem__ = __imul__ = _unsupported
+
 
 class SkillsNode:
     """
-    Class representing a node in the skills taxonomy.
+    Class representing a node in the skills taxonomy, as a view of a node
+    in a compact SkillsTree. Two SkillsNode objects are equal if they view
+    the same node.
     """
 
+    __slots__ = ("tree", "index")
+
     def __init__(self, name: str, attributes: Dict = {}):
-        self.name = name
-        self.attributes = attributes
-        self.root = True
-        self.parent = None
-        self.children = []
+        self.tree = SkillsTree()
+        self.index = self.tree.add(name, attributes)
+
+    @classmethod
+    def _view(cls, tree: SkillsTree, index: int) -> "SkillsNode":
+        node = object.__new__(cls)
+        node.tree = tree
+        node.index = index
+        return node
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, SkillsNode)
+            and self.tree is other.tree
+            and self.index == other.index
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self) -> str:
+        return "SkillsNode({!r})".format(self.name)
+
+    @property
+    def name(self) -> str:
+        return self.tree.name(self.index)
+
+    @property
+    def attributes(self) -> NodeAttributes:
+        return self.tree.attributes(self.index)
+
+    @attributes.setter
+    def attributes(self, attributes: Dict) -> None:
+        for key in self.tree.columns:
+            self.tree.delete_attribute(self.index, key)
+        for key, value in attributes.items():
+            self.tree.set_attribute(self.index, key, value)
+
+    @property
+    def root(self) -> bool:
+        return self.tree.parent[self.index] < 0
+
+    @property
+    def parent(self) -> Optional["SkillsNode"]:
+        parent = self.tree.parent[self.index]
+        return SkillsNode._view(self.tree, parent) if parent >= 0 else None
+
+    @property
+    def children(self) -> List["SkillsNode"]:
+        return ChildList(self, (SkillsNode._view(self.tree, i) for i in self.tree.children(self.index)))
 
     @classmethod
     def from_dict(cls, node: Dict) -> "SkillsNode":
@@ -22,77 +494,109 @@ class SkillsNode:
         Convert a `node` dictionary of name/attributes into a SkillsNode,
         validating that the name and code attributes are present.
         """
+        SkillsNode._validate(node)
+        return cls(node["name"], node.get("attributes", {}))
+
+    @staticmethod
+    def _validate(node: Dict) -> None:
         assert "name" in node, "invalid node: missing name"
         if "attributes" in node:
             assert isinstance(node["attributes"], dict), "invalid node: attributes is not a dict"
-        return cls(node["name"], node.get("attributes", {}))
 
     @classmethod
     def from_tree_dict(cls, tree: Dict) -> "SkillsNode":
         """
-        Convert a flattened `tree` into a linked list of nodes.
+        Convert a flattened `tree` into a tree of nodes.
         Return the root SkillsNode.
         """
-        root = SkillsNode.from_dict(tree)
+        SkillsNode._validate(tree)
+        root = cls(tree["name"], tree.get("attributes", {}))
+        nodes = root.tree
 
-        def traverse(node: "SkillsNode", subtree: Dict) -> None:
+        stack = [(root.index, tree)]
+        while stack:
+            parent, subtree = stack.pop()
             if "children" in subtree:
+                children = subtree["children"]
                 # Fix singleton children
-                if isinstance(subtree["children"], dict):
-                    subtree = subtree.copy()
-                    subtree["children"] = [subtree["children"]]
-                assert isinstance(subtree["children"], list), "invalid node: children is not a list"
-                for child_tree in subtree["children"]:
-                    child_node = node.add_child(SkillsNode.from_dict(child_tree))
-                    traverse(child_node, child_tree)
-
-        traverse(root, tree)
+                if isinstance(children, dict):
+                    children = [children]
+                assert isinstance(children, list), "invalid node: children is not a list"
+                added = []
+                for child_tree in children:
+                    SkillsNode._validate(child_tree)
+                    added.append((
+                        nodes.add(child_tree["name"], child_tree.get("attributes", {}), parent),
+                        child_tree,
+                    ))
+                stack.extend(reversed(added))
 
         return root
 
     def add_child(self, child: "SkillsNode") -> "SkillsNode":
         """
         Add a child SkillsNode to this SkillsNode, then return the child
-        (for chaining).
+        (for chaining). A child from another tree is copied, with its
+        subtree, into this node's tree, and the `child` object is updated
+        to view the copy.
         """
-        self.children.append(child)
-
-        child.parent = self
-        child.root = False
-
+        if child.tree is self.tree:
+            node = self.index
+            while node >= 0:
+                if node == child.index:
+                    raise ValueError("cannot add an ancestor of a node as its child")
+                node = self.tree.parent[node]
+            self.tree.unlink(child.index)
+            self.tree.link(self.index, child.index)
+        else:
+            child.index = child.tree.copy(child.index, into=self.tree, parent=self.index)
+            child.tree = self.tree
         return child
 
-    def leaves(self) -> List["SkillsNode"]:
+    def remove(self) -> None:
         """
-        Return a list of leaf nodes.
+        Remove the node and its subtree from its parent.
         """
-        result = []
+        self.tree.unlink(self.index)
 
-        def traverse(node: "SkillsNode") -> None:
-            if not node.children:
-                result.append(node)
-            else:
-                for child in node.children:
-                    traverse(child)
+    def copy(self, keep: Optional[Set["SkillsNode"]] = None) -> "SkillsNode":
+        """
+        Copy the node and its subtree into a new tree, keeping only the
+        nodes in `keep`, if provided, whose ancestors are also kept.
+        """
+        if keep is not None:
+            keep = set(node.index for node in keep if node.tree is self.tree)
+        tree = SkillsTree()
+        return SkillsNode._view(tree, self.tree.copy(self.index, keep, into=tree))
 
-        traverse(self)
+    def subtree(self, nodes: Iterable["SkillsNode"]) -> "SkillsNode":
+        """
+        Copy the node into a new tree with only the `nodes` below it and
+        their ancestors.
+        """
+        tree = SkillsTree()
+        indices = [node.index for node in nodes if node.tree is self.tree]
+        return SkillsNode._view(tree, self.tree.copy_paths(self.index, indices, into=tree))
 
-        return result
+    def leaves(self) -> NodeList:
+        """
+        Return a sequence of leaf nodes.
+        """
+        return NodeList(self.tree, self.tree.leaves(self.index))
+
+    def nodes(self) -> NodeList:
+        """
+        Return a sequence of the node and all it's descendants, in
+        depth-first order.
+        """
+        return NodeList(self.tree, self.tree.preorder(self.index))
 
     def names(self) -> List[str]:
         """
         Return a list of names for the node and all it's children.
         """
-        result = []
-
-        def traverse(node: "SkillsNode") -> None:
-            result.append(node.name)
-            for child in node.children:
-                traverse(child)
-
-        traverse(self)
-
-        return result
+        names = self.tree.names
+        return [names[i] for i in self.tree.preorder(self.index).tolist()]
 
     def to_dict(self, attributes: bool = False) -> Dict:
         """
@@ -102,7 +606,7 @@ class SkillsNode:
             "name": self.name,
         }
         if attributes:
-            result["attributes"] = self.attributes
+            result["attributes"] = self.tree.attribute_dict(self.index)
         return result
 
     def to_tree_dict(self, attributes: bool = False) -> Dict:
@@ -110,26 +614,33 @@ class SkillsNode:
         Flatten the node and it's children into a dict.
         Optionally include node attributes.
         """
-        def traverse(node: "SkillsNode") -> Dict:
-            result = {
-                "name": node.name,
-                "children": [traverse(child) for child in node.children],
+        tree = self.tree
+        names = tree.names
+        parents = tree.parent
+        columns = [(key, column.ids, column.values) for key, column in tree.columns.items()]
+        results = {}
+        for i in tree.preorder(self.index).tolist():
+            result = results[i] = {
+                "name": names[i],
+                "children": [],
             }
             if attributes:
-                result["attributes"] = node.attributes
-            return result
- 
-        return traverse(self)
+                result["attributes"] = {
+                    key: values[ids[i] - 1]
+                    for key, ids, values in columns
+                    if ids[i]
+                }
+            if i != self.index:
+                results[parents[i]]["children"].append(result)
+        return results[self.index]
 
     def to_tree_string(self) -> str:
         """
         Flatten the node and it's children into a string representation
         of node names in the tree.
         """
-        result = []
-        def traverse(node: "SkillsNode", level: int) -> None:
-            result.append("|{} {}".format("-" * level, node.name))
-            for child in node.children:
-                traverse(child, level + 1)
-        traverse(self, 0)
-        return "\n".join(result)
+        order, depths = self.tree._preorder(self.index)
+        return "\n".join(
+            "|{} {}".format("-" * depth, self.tree.name(i))
+            for i, depth in zip(order.tolist(), depths.tolist())
+        )
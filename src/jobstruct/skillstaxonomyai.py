@@ -2,13 +2,20 @@
 # Copyright National Association of State Workforce Agencies. All Rights Reserved.
 # SPDX-License-Identifier: CC-BY-NC-SA-4.0
 
+import itertools
 import json
 import logging
+import numpy as np
+import threading
 from importlib import resources
 from mypy_boto3_bedrock_runtime.client import BedrockRuntimeClient
-from typing import Dict, Optional
+from typing import Callable, Dict, KeysView, List, Optional, Tuple
+from .checkpoint import EnrichCheckpoint
+from .embeddings import normalize
+from .parallel import ordered_map
 from .prompts import Prompts
-from .skillsnode import SkillsNode
+from .skillsindex import SkillsIndex
+from .skillsnode import NodeList, SkillsNode
 
 class SkillsTaxonomyAI:
     """
@@ -17,102 +24,491 @@ class SkillsTaxonomyAI:
     additional skills granularity.
     """
 
+    prompt_formats = ("json", "tree", "names", "outline")
+
     def __init__(
         self,
         tree: Optional[Dict] = None,
+        prompt_format: str = "json",
     ):
         """
         Expands every leaf node in the starting `taxonomy` to create an
         enriched taxonomy. If no starting taxonomy is provided, use an
         O*NET taxonomy that is included in the package data.
+
+        The `prompt_format` sets how the taxonomy is serialized for the
+        `skills` prompt (see `prompt_text`). The default "json" is the
+        original serialization; the much smaller "outline" is opt-in, since
+        it changes the prompt and therefore the extracted skills.
         """
+        if prompt_format not in SkillsTaxonomyAI.prompt_formats:
+            raise ValueError("{} is an unrecognized prompt format".format(prompt_format))
         if tree is None:
             with resources.open_text("jobstruct.data", "onet_taxonomy_renamed.json") as f:
                 tree = json.load(f)
         self.root = SkillsNode.from_tree_dict(tree)
-        self.names = set(self.root.names())
+        self.prompt_format = prompt_format
+        self.embedder = None
+        self.top_k = 0
+        self.nodes = []
+        self.vectors = None
+        self._prompt_text = {}
+        self._index_lock = threading.Lock()
 
     @classmethod
-    def from_file(cls, filename: str) -> "SkillsTaxonomyAI":
+    def from_file(cls, filename: str, prompt_format: str = "json") -> "SkillsTaxonomyAI":
         """
         Creates a SkillsTaxonomyAI object from the tree JSON in `filename`.
         """
         with open(filename) as f:
-            return cls(json.load(f))
+            return cls(json.load(f), prompt_format)
+
+    @property
+    def root(self) -> SkillsNode:
+        """
+        The root node of the taxonomy tree.
+        """
+        return self._root
+
+    @root.setter
+    def root(self, root: SkillsNode) -> None:
+        self._root = root
+        self.index = SkillsIndex(root.tree, root.index, self.invalidate)
+        self.invalidate()
+
+    @property
+    def names(self) -> KeysView[str]:
+        """
+        The names of the nodes in the taxonomy, kept up to date as nodes
+        are added or removed.
+        """
+        return self.index.by_name.keys()
+
+    def find(self, name: str, normalized: bool = False) -> List[SkillsNode]:
+        """
+        Return the nodes with `name`, or with the same name after
+        casefolding and collapsing whitespace if `normalized` is set.
+        """
+        return [SkillsNode._view(self.root.tree, i) for i in self.index.find(name, normalized)]
+
+    def path(self, node: SkillsNode) -> List[str]:
+        """
+        Return the names of the nodes from the root to `node`.
+        """
+        return [self.root.tree.name(i) for i in self.index.path(node.index)]
+
+    def validate(self, skills: List[str]) -> List[Optional[str]]:
+        """
+        Match each of the `skills` names to a node in the taxonomy, exactly
+        or else after normalizing, and return the taxonomy name of the
+        matched node, or None for skills that are not in the taxonomy.
+        """
+        validated = []
+        for skill in skills:
+            if skill in self.index:
+                validated.append(skill)
+            else:
+                nodes = self.index.find(skill, normalized=True)
+                validated.append(self.root.tree.name(nodes[0]) if nodes else None)
+        return validated
+
+    def prompt_text(
+        self,
+        prompt_format: str = "",
+        query: str = "",
+        vector: Optional[List[float]] = None,
+    ) -> str:
+        """
+        Serialize the taxonomy for the `skills` prompt in `prompt_format`
+        (default: the format set at initialization), one of:
+
+        * json: the full tree dict with node attributes, as in `to_dict`
+        * tree: compact JSON of the tree dict with names only
+        * names: a JSON list of the node names
+        * outline: one node name per line, prefixed by its depth
+
+        The serialization is memoized, since it is the same for every job
+        posting, and is invalidated when nodes are added to or removed from
+        the tree. Call `invalidate` after changing node attributes in place.
+
+        If a retrieval index has been built with `build_index`, and the
+        `query` text of a job posting is provided, serialize only the
+        candidate nodes retrieved for the query and their ancestors. The
+        posting's `vector` from the `embedding` prompt, if available, is
+        passed to `candidates`.
+        """
+        prompt_format = prompt_format or self.prompt_format
+        if query and self.embedder is not None:
+            return SkillsTaxonomyAI._serialize(
+                self._restrict(self.candidates(query, vector=vector)),
+                prompt_format,
+            )
+        if prompt_format not in self._prompt_text:
+            self._prompt_text[prompt_format] = SkillsTaxonomyAI._serialize(
+                self.root,
+                prompt_format,
+            )
+        return self._prompt_text[prompt_format]
+
+    @staticmethod
+    def _serialize(root: SkillsNode, prompt_format: str) -> str:
+        """
+        Serialize the tree at `root` in `prompt_format`.
+        """
+        if prompt_format == "json":
+            return json.dumps(root.to_tree_dict(attributes=True))
+        elif prompt_format == "tree":
+            return json.dumps(root.to_tree_dict(), separators=(",", ":"))
+        elif prompt_format == "names":
+            return json.dumps(root.names())
+        elif prompt_format == "outline":
+            return root.to_tree_string()
+        else:
+            raise ValueError("{} is an unrecognized prompt format".format(prompt_format))
+
+    def prompt_tokens(self, prompt_format: str = "", query: str = "") -> int:
+        """
+        Estimate the number of input tokens that the taxonomy adds to
+        each `skills` prompt in `prompt_format` (for the `query` text).
+        """
+        return Prompts.estimate_tokens(self.prompt_text(prompt_format, query))
+
+    def invalidate(self) -> None:
+        """
+        Clear the memoized prompt serializations and retrieval index after
+        changing the tree.
+        """
+        self._prompt_text = {}
+        self.nodes = []
+        self.vectors = None
+
+    def build_index(self, embedder: Callable, top_k: int = 50) -> None:
+        """
+        Enable candidate retrieval for the `skills` prompt. Precompute a
+        vector for each node below the root with `embedder`, a callable
+        that embeds a list of texts as the rows of a normalized matrix (see
+        `jobstruct.embeddings`). Each posting's `skills` prompt then
+        includes only the `top_k` nodes most similar to the posting.
+        """
+        self.embedder = embedder
+        self.top_k = top_k
+        # The root is always included as an ancestor of the candidates.
+        self.nodes = self.root.nodes()[1:]
+        # Cache the preorder positions used by `_restrict` for every posting.
+        self.root.tree.ranks(self.root.index)
+        self.vectors = np.asarray(
+            embedder([node.name for node in self.nodes]),
+            dtype=np.float32,
+        )
+
+    def candidates(
+        self,
+        query: str,
+        k: int = 0,
+        vector: Optional[List[float]] = None,
+    ) -> List[SkillsNode]:
+        """
+        Return the `k` nodes (default: `top_k`) with the highest cosine
+        similarity to the `query` text, most similar first.
+
+        If the index was built with an embedder of the `embedding` prompt
+        (such as BedrockEmbedder), the query's `vector` from that prompt is
+        used when it is provided, instead of embedding the query again.
+        """
+        if self.embedder is None:
+            raise ValueError("retrieval index has not been built")
+        # Rebuild the index after the tree changed, once, although
+        # `extract_many` calls this from several worker threads.
+        with self._index_lock:
+            if self.vectors is None:
+                self.build_index(self.embedder, self.top_k)
+            nodes, vectors = self.nodes, self.vectors
+        k = min(k or self.top_k, len(nodes))
+        if (
+            vector is not None
+            and getattr(self.embedder, "prompt", None) == "embedding"
+            and len(vector) == vectors.shape[1]
+        ):
+            query_vector = normalize(np.asarray(vector, dtype=np.float32))
+        else:
+            query_vector = np.asarray(self.embedder([query]), dtype=np.float32)[0]
+        scores = vectors @ query_vector
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [nodes[i] for i in top[np.argsort(-scores[top], kind="stable")]]
+
+    def _restrict(self, nodes: List[SkillsNode]) -> SkillsNode:
+        """
+        Copy the tree, keeping only the `nodes` and their ancestors.
+        """
+        return self.root.subtree(nodes)
 
     def enrich(
         self,
         client: BedrockRuntimeClient,
         config_file: str = "",
+        workers: int = 1,
+        rounds: int = 1,
+        max_depth: int = 0,
+        max_calls: int = 0,
+        max_nodes: int = 0,
+        checkpoint: str = "",
+        resume: bool = False,
     ) -> None:
         """
         Enrich the taxonomy by expanding each leaf node through generative
         AI prompting. Skip leaf nodes that have been marked as terminal in
         previous iterations (e.g. if they contain duplicates of existing
         skills in the taxonomy).
+
+        Each round expands the current frontier of non-terminal leaves on a
+        pool of `workers` threads, then merges the expansions into the tree
+        in frontier order, so the result does not depend on the order in
+        which the prompts finish. Run up to `rounds` rounds, each expanding
+        the leaves added by the previous round. Optionally stop at budgets
+        of `max_depth` (leaves at this depth are not expanded), `max_calls`
+        prompt invocations, and `max_nodes` nodes in the tree.
+
+        Optionally, log each expansion to a `checkpoint` file as it is
+        merged (see EnrichCheckpoint). With `resume`, first replay the
+        checkpoint onto the tree and continue with the leaf nodes that were
+        not yet expanded; the budgets include the work that was replayed.
         """
         # Setup logging
         log = logging.getLogger("jobstruct.SkillsTaxonomyAI.enrich")
-        
+
         # Load prompts
         prompts = Prompts(client, config_file)
 
-        # Loop over each leaf node
-        for leaf in self.root.leaves():
-
-            # Skip terminal nodes, which expanded to duplicate skills in a previous iteration.
-            if leaf.attributes.get("terminal"):
-                log.info("skipping terminal node '{}'".format(leaf.name))
-
-            # Create a query tree that includes the leaf and its parent.
-            query = leaf.parent.to_dict()
-            query["children"] = leaf.to_dict()
-            result = Prompts.safe_json(
-                (
-                    prompts
-                    .invoke("taxonomy_enrich", json.dumps(query))
-                    .removeprefix("<tree>")
-                    .removesuffix("</tree>")
-                ),
-                {}
+        first, calls, resumed = 0, 0, None
+        log_file = EnrichCheckpoint(checkpoint) if checkpoint else None
+        if log_file:
+            if resume:
+                first, calls, resumed = self._replay(log_file)
+                log.info("resuming round {} after {} prompt calls".format(first + 1, calls))
+            else:
+                log_file.reset()
+
+        size = len(self.root.nodes())
+        last = first - 1
+        stop = False
+        for iteration in range(first, rounds):
+
+            if resumed is not None and iteration == first:
+                frontier = resumed
+            else:
+                # Collect the frontier of leaf nodes to expand in this round.
+                frontier = []
+                for leaf, depth in self._leaves():
+                    if leaf.attributes.get("terminal"):
+                        # Skip terminal nodes, which expanded to duplicate skills in a previous iteration.
+                        log.debug("skipping terminal node '{}'".format(leaf.name))
+                    elif leaf.parent is None:
+                        log.warning("skipping root node '{}', which has no parent".format(leaf.name))
+                    elif not max_depth or depth < max_depth:
+                        frontier.append(leaf)
+            if max_calls:
+                frontier = frontier[:max(0, max_calls - calls)]
+            if not frontier:
+                break
+            log.info("round {}: expanding {} leaf nodes".format(iteration + 1, len(frontier)))
+            if log_file:
+                log_file.append({
+                    "round": iteration,
+                    "frontier": [self._location(leaf) for leaf in frontier],
+                })
+
+            expansions = ordered_map(
+                lambda leaf: self._expand(prompts, leaf),
+                frontier,
+                workers,
             )
 
-            # Parse the prompt result.
-            try:
-                root = SkillsNode.from_tree_dict(result)
-            except:
-                log.warn(
-                    "could not parse prompt result for leaf node '{}': {}".format(
-                        leaf.name,
-                        result
-                    )
+            # Merge in frontier order.
+            added = 0
+            for i, (leaf, expansion) in enumerate(zip(frontier, expansions)):
+                calls += 1
+                children = []
+                if expansion is not None:
+
+                    # Determine if the result contains a duplicate of an existing skill.
+                    terminal = any(name in self.names for name in expansion.names()[1:])
+
+                    for child in expansion.children:
+                        if not child.name.endswith(" Skills"):
+                            subtree = child.names()
+                            if max_nodes and size + len(subtree) > max_nodes:
+                                log.info("stopping at the budget of {} nodes".format(max_nodes))
+                                stop = True
+                                break
+                            leaf.add_child(child)
+                            child.attributes["terminal"] = terminal
+                            size += len(subtree)
+                            added += len(subtree)
+                            children.append(child)
+
+                if log_file:
+                    log_file.append({
+                        "round": iteration,
+                        "path": self._location(leaf),
+                        "children": (
+                            [child.to_tree_dict(attributes=True) for child in children]
+                            if expansion is not None else None
+                        ),
+                    })
+                    if log_file.due() or stop:
+                        self._compact(log_file, iteration, calls, frontier[i + 1:])
+                if stop:
+                    break
+
+            log.info("round {}: added {} nodes with {} prompt calls in total".format(iteration + 1, added, calls))
+            if stop:
+                break
+            last = iteration
+
+        if log_file:
+            if not stop:
+                # Record the last completed round.
+                self._compact(log_file, last, calls, [])
+            log_file.close()
+        self.invalidate()
+
+    def _location(self, node: SkillsNode) -> List[int]:
+        """
+        Return the position of each node from the root to `node` among its
+        siblings, which identifies the node even if siblings share a name.
+        Enrichment only appends children, so positions remain valid.
+        """
+        tree = self.root.tree
+        path = self.index.path(node.index)
+        return [list(tree.children(parent)).index(child) for parent, child in zip(path, path[1:])]
+
+    def _find(self, location: List[int]) -> SkillsNode:
+        """
+        Return the node at `location` (as returned by `_location`).
+        """
+        tree = self.root.tree
+        i = self.root.index
+        for position in location:
+            i = next(itertools.islice(tree.children(i), position, None), -1)
+            if i < 0:
+                raise ValueError("location {} is not in the taxonomy".format(location))
+        return SkillsNode._view(tree, i)
+
+    def _compact(
+        self,
+        checkpoint: EnrichCheckpoint,
+        iteration: int,
+        calls: int,
+        remaining: List[SkillsNode],
+    ) -> None:
+        """
+        Replace the `checkpoint` log with a snapshot of the tree, in round
+        `iteration` after `calls` prompt calls, with the `remaining` leaf
+        nodes still to expand in that round.
+        """
+        checkpoint.compact({
+            "snapshot": self.root.to_tree_dict(attributes=True),
+            "round": iteration,
+            "calls": calls,
+            "frontier": [self._location(leaf) for leaf in remaining],
+        })
+
+    def _replay(self, checkpoint: EnrichCheckpoint) -> Tuple[int, int, Optional[List[SkillsNode]]]:
+        """
+        Replay the records in a `checkpoint` onto the tree. Return the round
+        to continue from, the number of prompt calls so far, and the leaf
+        nodes that remain to be expanded in that round (or None to start
+        the round from the current leaves).
+        """
+        iteration, calls, frontier = 0, 0, None
+        for record in checkpoint.read():
+            if "snapshot" in record:
+                self.root = SkillsNode.from_tree_dict(record["snapshot"])
+                iteration = record["round"]
+                calls = record["calls"]
+                frontier = {tuple(path): None for path in record["frontier"]}
+            elif "frontier" in record:
+                iteration = record["round"]
+                frontier = {tuple(path): None for path in record["frontier"]}
+            else:
+                calls += 1
+                frontier.pop(tuple(record["path"]), None)
+                leaf = self._find(record["path"])
+                for child_tree in record["children"] or []:
+                    leaf.add_child(SkillsNode.from_tree_dict(child_tree))
+
+        if frontier is None:
+            return 0, calls, None
+        if not frontier:
+            # The round was completed, so continue with the next round.
+            return iteration + 1, calls, None
+        return iteration, calls, [self._find(list(path)) for path in frontier]
+
+    def _leaves(self) -> List[Tuple[SkillsNode, int]]:
+        """
+        Return each leaf node with its depth below the root, in depth-first
+        order.
+        """
+        tree = self.root.tree
+        order = tree.preorder(self.root.index)
+        leaves = np.array(tree.first_child, dtype=np.int32)[order] < 0
+        return list(zip(
+            NodeList(tree, order[leaves]),
+            tree.depths(self.root.index)[leaves].tolist(),
+        ))
+
+    def _expand(self, prompts: Prompts, leaf: SkillsNode) -> Optional[SkillsNode]:
+        """
+        Expand a `leaf` node through the `taxonomy_enrich` prompt, and return
+        the expanded copy of the leaf with its new children, or None if the
+        prompt result is invalid. Does not modify the tree, so leaves can be
+        expanded concurrently.
+        """
+        log = logging.getLogger("jobstruct.SkillsTaxonomyAI.enrich")
+
+        # Create a query tree that includes the leaf and its parent.
+        query = leaf.parent.to_dict()
+        query["children"] = leaf.to_dict()
+        result = Prompts.safe_json(
+            (
+                prompts
+                .invoke("taxonomy_enrich", json.dumps(query))
+                .removeprefix("<tree>")
+                .removesuffix("</tree>")
+            ),
+            {}
+        )
+
+        # Parse the prompt result.
+        try:
+            root = SkillsNode.from_tree_dict(result)
+        except:
+            log.warning(
+                "could not parse prompt result for leaf node '{}': {}".format(
+                    leaf.name,
+                    result
                 )
-                continue
-            if len(root.children) != 1:
-                log.warn(
-                    "prompt result includes siblings of leaf node '{}': {}".format(
-                        leaf.name,
-                        root.to_tree_dict()
-                    )
+            )
+            return None
+        if len(root.children) != 1:
+            log.warning(
+                "prompt result includes siblings of leaf node '{}': {}".format(
+                    leaf.name,
+                    root.to_tree_dict()
                 )
-                continue
-            root = root.children[0]
-            if root.name != leaf.name:
-                log.warn(
-                    "prompt result does not align with leaf node '{}': {}".format(
-                        leaf.name,
-                        root.to_tree_dict()
-                    )
+            )
+            return None
+        root = root.children[0]
+        if root.name != leaf.name:
+            log.warning(
+                "prompt result does not align with leaf node '{}': {}".format(
+                    leaf.name,
+                    root.to_tree_dict()
                 )
-                continue
-
-            # Determine if the result contains a duplicate of an existing skill.
-            terminal = any(name in self.names for name in root.names()[1:])
+            )
+            return None
 
-            for child in root.children:
-                if not child.name.endswith(" Skills"):
-                    leaf.add_child(child)
-                    child.attributes["terminal"] = terminal
+        return root
 
     def refine(
         self,
@@ -144,6 +540,7 @@ class SkillsTaxonomyAI:
             self.root = SkillsNode.from_tree_dict(result)
         except:
             log.warn("could not parse prompt result: {}".format(result))
+        self.invalidate()
 
     def to_dict(self):
         """
@@ -0,0 +1,93 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+"""
+Offline stand-ins for the Bedrock runtime client used in the tests.
+"""
+
+import asyncio
+import io
+import json
+import os
+import threading
+from pathlib import Path
+
+DIR = Path(os.path.realpath(os.path.dirname(__file__)))
+
+with open(DIR / "SDE_II_JobStructAI.json") as f:
+    SDE_II = json.load(f)[0]
+
+
+def claude(text, stop_reason="end_turn"):
+    """
+    Response body of an Anthropic messages model returning `text`.
+    """
+    return {
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": stop_reason,
+    }
+
+
+def titan(vector):
+    """
+    Response body of a Titan embedding model returning `vector`.
+    """
+    return {"embedding": vector}
+
+
+def default_handler(modelId, body):
+    """
+    Answer each prompt with a canned response based on the SDE II example.
+    """
+    if "inputText" in body:
+        return titan([0.5, 0.5, 0.5, 0.5])
+    prompt = body["messages"][0]["content"][0]["text"]
+    if "<skills>" in prompt:
+        return claude('["Programming", "Writing"]')
+    if "Standard Occupational Classification" in prompt:
+        return claude('{"occupation": ["15-0000"]}')
+    fields = {k: v for k, v in SDE_II.items() if k not in ("skills", "occupation", "embedding")}
+    return claude("Here is the JSON:\n" + json.dumps(fields))
+
+
+class FakeClient:
+    """
+    A thread-safe fake of `BedrockRuntimeClient.invoke_model` that records
+    each request and returns the response body produced by `handler`.
+    """
+
+    def __init__(self, handler=default_handler):
+        self.handler = handler
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def invoke_model(self, body, modelId, accept="application/json", contentType="application/json"):
+        body = json.loads(body)
+        with self.lock:
+            self.requests.append((modelId, body))
+        response = self.handler(modelId, body)
+        if isinstance(response, Exception):
+            raise response
+        return {"body": io.BytesIO(json.dumps(response).encode("utf-8"))}
+
+
+class AsyncFakeClient(FakeClient):
+    """
+    An async fake of `invoke_model` that yields to the event loop before
+    responding and tracks the peak number of concurrent requests.
+    """
+
+    def __init__(self, handler=default_handler):
+        super().__init__(handler)
+        self.active = 0
+        self.peak = 0
+
+    async def invoke_model(self, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.001)
+            return FakeClient.invoke_model(self, **kwargs)
+        finally:
+            self.active -= 1
@@ -0,0 +1,43 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+"""
+The original HTML segmentation, as a reference for the conformance tests
+and benchmarks/bench_segment.py.
+"""
+
+import jobstruct
+
+
+class LegacyJobStructHTML(jobstruct.JobStructHTML):
+    """
+    The original segmenter, which calls `get_text` and searches the
+    subtree of every element.
+    """
+
+    def _segment(self):
+        segment = "other"
+        for element in self.soup.body.find_all(jobstruct.JobStructHTML.tags):
+            text = element.get_text(separator="\n").strip()
+            if text:
+                if len(text.split()) <= 5:
+                    segment = self._classify_segment(text.lower())
+                elif all(element.find(tag) is None for tag in jobstruct.JobStructHTML.tags):
+                    for line in text.split("\n"):
+                        if "equal opportunity employer" in line:
+                            self.segments["eeo"].append(line)
+                        else:
+                            self.segments[segment].append(line)
+
+
+def legacy_html_text(html):
+    """
+    The original text of the terminal elements of an `html` string.
+    """
+    soup = jobstruct.JobStructHTML.parse(html, "html.parser")
+    return "\n".join(
+        element.get_text(separator="\n").strip()
+        for element in soup.body.find_all(jobstruct.JobStructHTML.tags)
+        if all(element.find(tag) is None for tag in jobstruct.JobStructHTML.tags)
+    )
@@ -0,0 +1,66 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+from jobstruct.chunking import merge_results, split_text
+from jobstruct.prompts import Prompts
+from fakes import DIR
+
+
+def test_split_text():
+    with open(DIR / "SDE_II.txt") as f:
+        text = f.read()
+    assert split_text(text, 0) == [text]
+    assert split_text(text, 100000) == [text]
+
+    chunks = split_text(text, 200)
+    assert len(chunks) > 1
+    assert all(Prompts.estimate_tokens(chunk) <= 200 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+    # Chunks prefer to start at segment headings.
+    assert any(chunk.startswith("BASIC QUALIFICATIONS") for chunk in chunks)
+
+    # Text without paragraph breaks, and a single long paragraph.
+    lines = text.replace("\n\n", "\n")
+    assert " ".join(split_text(lines, 200)).split() == lines.split()
+    words = " ".join(text.split())
+    chunks = split_text(words, 50)
+    assert all(Prompts.estimate_tokens(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == words.split()
+
+
+def test_merge_results():
+    merged = merge_results([
+        {
+            "job_title": "Analyst",
+            "details": ["Analyze data", "Write reports"],
+            "required": {"education": "Bachelor's", "experience": 3, "qualifications": ["SQL"]},
+            "preferred": {"experience": 5},
+            "salary": [50000, 60000],
+            "remote": False,
+        },
+        {
+            "job_title": None,
+            "details": ["write  Reports", "Present findings"],
+            "required": {"education": None, "experience": "2", "qualifications": ["Python"]},
+            "preferred": {"experience": 7},
+            "salary": [55000, 70000],
+            "remote": True,
+        },
+        "not a result",
+    ])
+    assert merged == {
+        "job_title": "Analyst",
+        "details": ["Analyze data", "Write reports", "Present findings"],
+        "required": {"education": "Bachelor's", "experience": 2, "qualifications": ["SQL", "Python"]},
+        "preferred": {"experience": 7},
+        "salary": [50000.0, 70000.0],
+        "remote": True,
+    }
+    assert merge_results([{"job_title": "Analyst"}]) == {"job_title": "Analyst"}
+
+    # A chunk without experience returns 0, which is not the minimum.
+    merged = merge_results([{"required": {"experience": 0}}, {"required": {"experience": 3}}])
+    assert merged["required"]["experience"] == 3
+    assert merge_results([{"required": {"experience": 0}}, {}])["required"]["experience"] == 0
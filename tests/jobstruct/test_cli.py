@@ -0,0 +1,175 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import jobstruct
+import json
+import pytest
+import shutil
+import sys
+from fakes import DIR, SDE_II, FakeClient, claude, default_handler
+from importlib import resources
+from jobstruct import __main__ as cli
+
+
+def run(monkeypatch, client, *argv):
+    monkeypatch.setattr(cli, "get_client", lambda args, **kwargs: client)
+    monkeypatch.setattr(sys, "argv", ["jobstruct"] + list(argv))
+    cli.main()
+
+
+def test_extract_jsonl_resume(monkeypatch, tmp_path):
+    inputs = []
+    for i in range(3):
+        inputs.append(str(tmp_path / "posting{}.txt".format(i)))
+        shutil.copy(DIR / "SDE_II.txt", inputs[-1])
+    output = tmp_path / "output.jsonl"
+
+    # Simulate a crash after the first record and partway through the second.
+    client = FakeClient()
+    run(monkeypatch, client, "extract", "--format", "jsonl", "-o", str(output), inputs[0])
+    with open(output, "a") as f:
+        f.write('{"id": "')
+
+    client = FakeClient()
+    run(monkeypatch, client, "extract", "--format", "jsonl", "--resume", "-o", str(output), *inputs)
+    assert len(client.requests) == 2
+
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert [record["id"] for record in records] == inputs
+    assert all(record["job_title"] == SDE_II["job_title"] for record in records)
+
+
+def test_extract_embedding_store_resume(monkeypatch, tmp_path):
+    inputs = []
+    for i in range(3):
+        inputs.append(str(tmp_path / "posting{}.txt".format(i)))
+        shutil.copy(DIR / "SDE_II.txt", inputs[-1])
+    output = tmp_path / "output.jsonl"
+    store = tmp_path / "embeddings"
+    argv = ["extract", "--format", "jsonl", "--embedding-store", str(store), "-o", str(output)]
+
+    # Simulate a crash while writing the second record.
+    dumps = json.dumps
+
+    def crashing_dumps(value, *args, **kwargs):
+        if isinstance(value, dict) and value.get("id") == inputs[1]:
+            raise KeyboardInterrupt()
+        return dumps(value, *args, **kwargs)
+
+    with monkeypatch.context() as m:
+        m.setattr(json, "dumps", crashing_dumps)
+        try:
+            run(m, FakeClient(), *argv, *inputs)
+        except KeyboardInterrupt:
+            pass
+
+    run(monkeypatch, FakeClient(), *argv, "--resume", *inputs)
+    assert jobstruct.EmbeddingStore(store).ids == inputs
+    with open(output) as f:
+        assert all(json.loads(line)["embedding"] is None for line in f)
+
+
+def test_extract_batch_round_trip(monkeypatch, tmp_path):
+    inputs = [str(DIR / "SDE_II.txt"), str(DIR / "SDE_Amazon_Robotics.html")]
+    batch_input = tmp_path / "batch_input.jsonl"
+    batch_output = tmp_path / "batch_output.jsonl"
+    output = tmp_path / "output.json"
+
+    client = FakeClient()
+    run(monkeypatch, client, "extract", "--batch-export", str(batch_input), *inputs)
+    assert not client.requests
+
+    # Simulate the batch inference job, failing the second record.
+    with open(batch_input) as f, open(batch_output, "w") as g:
+        for i, line in enumerate(f):
+            record = json.loads(line)
+            if i == 0:
+                record["modelOutput"] = default_handler(None, record["modelInput"])
+            else:
+                record["error"] = {"errorCode": 400, "errorMessage": "bad request"}
+            g.write(json.dumps(record) + "\n")
+
+    run(monkeypatch, client, "extract", "--occupation", "--batch-import", str(batch_output), "-o", str(output))
+    assert len(client.requests) == 1
+
+    with open(output) as f:
+        results = json.load(f)
+    expected = {"id": inputs[0]}
+    expected.update(jobstruct.JobStructAI.from_file(inputs[0], FakeClient(), occupation=True).to_dict())
+    assert results[0] == expected
+    assert results[1]["id"] == inputs[1] and "error" in results[1]
+
+
+def test_batch_settings(monkeypatch, tmp_path):
+    # Settings that a batch record cannot apply are refused before export.
+    configs = json.loads(resources.read_text("jobstruct.data", "prompt_configs.json"))
+    configs["extract"]["chunk_tokens"] = 500
+    config_file = tmp_path / "prompt_configs.json"
+    config_file.write_text(json.dumps(configs))
+    batch_input = tmp_path / "batch_input.jsonl"
+    with pytest.raises(SystemExit, match="chunk_tokens"):
+        run(monkeypatch, FakeClient(), "--prompt-config", str(config_file), "extract",
+            "--batch-export", str(batch_input), str(DIR / "SDE_II.txt"))
+    assert not batch_input.exists() or not batch_input.read_text()
+
+    # Truncated outputs are continued on demand from the record's input.
+    text = json.dumps({"job_title": SDE_II["job_title"], "remote": False})
+    modelId, body = jobstruct.Prompts(None).request("extract", "text")
+    record = {
+        "recordId": "a",
+        "modelInput": json.loads(body),
+        "modelOutput": claude(text[:20], "max_tokens"),
+    }
+    client = FakeClient(lambda modelId, body: claude(text[20:]))
+    lines = [json.dumps(record)]
+    [(_, result)] = jobstruct.batch.import_batch(lines, prompts=jobstruct.Prompts(client))
+    assert result == text
+    assert client.requests[0][1]["messages"][-1] == {
+        "role": "assistant",
+        "content": [{"type": "text", "text": text[:20]}],
+    }
+    [(_, result)] = jobstruct.batch.import_batch(lines)
+    assert isinstance(result, RuntimeError)
+
+
+def test_extract_pack(monkeypatch, tmp_path):
+    inputs = [str(DIR / "SDE_II.txt")] * 3
+    output = tmp_path / "output.json"
+
+    # The fake client does not answer packed prompts with an array, so each
+    # posting is then extracted on its own.
+    client = FakeClient()
+    run(monkeypatch, client, "extract", "--pack", "-o", str(output), *inputs)
+    assert len(client.requests) == 4
+
+    with open(output) as f:
+        results = json.load(f)
+    assert [result["job_title"] for result in results] == [SDE_II["job_title"]] * 3
+
+
+def test_segment(monkeypatch, tmp_path):
+    inputs = [str(DIR / "SDE_Amazon_Robotics.html"), str(tmp_path / "missing.html")]
+    files_from = tmp_path / "files.txt"
+    with open(files_from, "w") as f:
+        f.write(inputs[0] + "\n")
+    output = tmp_path / "output.jsonl"
+
+    run(monkeypatch, None, "segment", "-p", "2", "--chunksize", "1", "--files-from", str(files_from), "-o", str(output), *inputs)
+
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    expected = {"id": inputs[0]}
+    expected.update(jobstruct.JobStructHTML.from_file(inputs[0]).to_dict())
+    assert records[0] == expected
+    assert records[2] == expected
+    assert records[1]["id"] == inputs[1] and "error" in records[1]
+
+    # Errors are identified by the same key as other records.
+    undecodable = tmp_path / "undecodable.html"
+    undecodable.write_bytes(b"<p>\xff\xfe</p>")
+    run(monkeypatch, None, "segment", "--key", "sha256", "-o", str(output), str(undecodable))
+    with open(output) as f:
+        record = json.loads(f.readline())
+    assert record["id"] == cli.input_key(str(undecodable), "sha256") and "error" in record
@@ -0,0 +1,73 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import jobstruct
+import json
+from fakes import DIR, SDE_II, FakeClient
+
+DISCLAIMER = "Applicants must be authorized to work in the United States without sponsorship."
+NAVIGATION = "Sign in to save this job and get alerts for similar jobs."
+
+
+def test_compact():
+    compactor = jobstruct.Compactor()
+    assert compactor.compact("  Job   Title:\tEngineer \n\n\n\nQualifications:\n - Python  \n") == (
+        "Job Title: Engineer\n\nQualifications:\n- Python"
+    )
+
+    # A wrapped EEO paragraph is removed, as are lines of the eeo segment.
+    with open(DIR / "SDE_II.txt") as f:
+        text = f.read()
+    compacted = compactor.compact(text)
+    assert "opportunity employer" not in compacted
+    assert "BASIC QUALIFICATIONS" in compacted
+    assert compactor.compact("Build robots.\nWe value diversity.", ["We value  diversity."]) == "Build robots."
+    assert jobstruct.Compactor(eeo=False).compact("We value diversity.", ["We value diversity."]) == "We value diversity."
+
+
+def test_boilerplate(tmp_path):
+    texts = [
+        "Posting {}\nBuild service number {} in Python. {}\n\n{}".format(i, i, DISCLAIMER, NAVIGATION)
+        for i in range(10)
+    ]
+    compactor = jobstruct.Compactor.from_corpus(texts, min_fraction=0.5, min_documents=2)
+    assert len(compactor.boilerplate) == 2
+    assert compactor.compact(texts[3]) == "Posting 3\nBuild service number 3 in Python."
+
+    # Short sentences are never boilerplate.
+    assert compactor.compact("Remote.\n" + NAVIGATION.upper()) == "Remote."
+
+    # Qualifications shared by the postings of one employer are kept.
+    requirement = "3+ years of non-internship professional software development experience."
+    texts = [
+        "Posting {}\n\nBASIC QUALIFICATIONS\n{}\n\nABOUT US\n{}".format(i, requirement, DISCLAIMER)
+        for i in range(10)
+    ]
+    compacted = jobstruct.Compactor.from_corpus(texts, min_fraction=0.5, min_documents=2).compact(texts[0])
+    assert requirement in compacted and DISCLAIMER not in compacted
+    assert jobstruct.Compactor(compactor.boilerplate).compact("Requirements:\n" + DISCLAIMER).endswith(DISCLAIMER)
+
+    filename = tmp_path / "boilerplate.json"
+    compactor.save(filename)
+    loaded = jobstruct.Compactor.from_file(filename)
+    assert loaded.boilerplate == compactor.boilerplate
+    assert loaded.compact(texts[3]) == compactor.compact(texts[3])
+
+
+def test_tokens_saved():
+    with open(DIR / "SDE_II.txt") as f:
+        text = f.read()
+    client = FakeClient()
+    j = jobstruct.JobStructAI(text, client, compactor=jobstruct.Compactor())
+    assert j.job_title == SDE_II["job_title"]
+    assert j.tokens_saved > 0
+    assert "opportunity employer" not in json.dumps(client.requests[0][1])
+    assert jobstruct.JobStructAI(text, FakeClient()).tokens_saved == 0
+
+    j = jobstruct.JobStructAI.from_html_file(
+        DIR / "SDE_Amazon_Robotics.html",
+        FakeClient(),
+        compactor=jobstruct.Compactor(),
+    )
+    assert j.tokens_saved > 0
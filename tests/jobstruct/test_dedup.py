@@ -0,0 +1,56 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import jobstruct
+import json
+import sys
+from fakes import DIR, FakeClient
+from jobstruct import __main__ as cli
+
+
+def test_cluster():
+    with open(DIR / "SDE_II.txt") as f:
+        text = f.read()
+    words = text.split()
+    edited = " ".join(words[:10] + ["Seattle"] + words[11:])
+    other = jobstruct.JobStructAI.html_text(open(DIR / "SDE_Amazon_Robotics.html").read())
+
+    dedup = jobstruct.NearDuplicates()
+    canonical = dedup.cluster(dedup.signatures([other, text, edited, text, "short"]))
+    assert canonical.tolist() == [0, 1, 1, 1, 4]
+
+
+def test_extract_dedup(monkeypatch, tmp_path):
+    inputs = []
+    with open(DIR / "SDE_II.txt") as f:
+        text = f.read()
+    for i, suffix in enumerate(["", " Apply today.", ""]):
+        inputs.append(str(tmp_path / "posting{}.txt".format(i)))
+        with open(inputs[-1], "w") as f:
+            f.write(text + suffix)
+    output = tmp_path / "output.jsonl"
+
+    client = FakeClient()
+    monkeypatch.setattr(cli, "get_client", lambda args, **kwargs: client)
+    monkeypatch.setattr(sys, "argv", ["jobstruct", "extract", "--dedup", "--format", "jsonl", "-o", str(output)] + inputs)
+    cli.main()
+    assert len(client.requests) == 1
+
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert [record["id"] for record in records] == inputs
+    assert [record.get("duplicate_of") for record in records] == [None, inputs[0], inputs[0]]
+    assert records[1]["job_title"] == records[0]["job_title"]
+
+    # Exact duplicates have the same sha256 key and are also extracted once.
+    client = FakeClient()
+    monkeypatch.setattr(cli, "get_client", lambda args, **kwargs: client)
+    monkeypatch.setattr(sys, "argv", ["jobstruct", "extract", "--dedup", "--key", "sha256", "--format", "jsonl", "-o", str(output)] + inputs)
+    cli.main()
+    assert len(client.requests) == 1
+
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert records[2]["id"] == records[0]["id"]
+    assert [record.get("duplicate_of") for record in records] == [None, records[0]["id"], records[0]["id"]]
@@ -0,0 +1,35 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import jobstruct
+import numpy as np
+from jobstruct.embeddings import normalize
+
+
+def test_embedding_store(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = normalize(rng.normal(size=(2000, 32)).astype(np.float32))
+    ids = ["posting{}".format(i) for i in range(len(vectors))]
+
+    store = jobstruct.EmbeddingStore(tmp_path, 32)
+    for start in range(0, len(vectors), 300):
+        store.append(ids[start:start + 300], vectors[start:start + 300])
+
+    # Simulate a crash partway through appending a row.
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\0" * 10)
+
+    store = jobstruct.EmbeddingStore(tmp_path)
+    assert len(store) == 2000
+    assert store.ids == ids
+
+    queries = vectors[:5] + 0.1 * rng.normal(size=(5, 32)).astype(np.float32)
+    rows, scores = store.search(queries, k=10, chunk=128)
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    assert (rows == expected).all()
+    assert (rows[:, 0] == np.arange(5)).all()
+
+    store.build_ivf(nlist=16)
+    rows, scores = store.search_approximate(queries, k=10, nprobe=4)
+    assert (rows[:, 0] == np.arange(5)).all()
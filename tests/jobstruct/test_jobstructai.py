@@ -0,0 +1,249 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import asyncio
+import jobstruct
+import json
+import numpy as np
+from importlib import resources
+from fakes import DIR, SDE_II, AsyncFakeClient, FakeClient, claude, default_handler, titan
+
+
+def test_extract():
+    client = FakeClient()
+    j = jobstruct.JobStructAI.from_file(DIR / "SDE_II.txt", client, occupation=True, embedding=True)
+    assert j.job_title == SDE_II["job_title"]
+    assert j.required == SDE_II["required"]
+    assert j.occupation == ["15-0000"]
+    assert j.embedding == [0.5, 0.5, 0.5, 0.5]
+    assert len(client.requests) == 3
+
+
+def test_extract_many():
+    def handler(modelId, body):
+        prompt = body["messages"][0]["content"][0]["text"]
+        if "posting 3" in prompt:
+            return RuntimeError("boom")
+        title = prompt.split("<text>\n")[1].split("\n</text>")[0]
+        return claude('{{"job_title": "{}"}}'.format(title))
+
+    client = FakeClient(handler)
+    texts = ["posting {}".format(i) for i in range(10)]
+    results = list(jobstruct.JobStructAI.extract_many(texts, client, workers=4))
+    assert len(results) == 10
+    assert isinstance(results[3], RuntimeError)
+    assert [r.job_title for i, r in enumerate(results) if i != 3] == [
+        t for i, t in enumerate(texts) if i != 3
+    ]
+
+
+def test_extract_many_loads_prompts_once(monkeypatch):
+    loads = []
+    monkeypatch.setattr(jobstruct.prompts.json, "load", lambda f: loads.append(f.name) or json.loads(f.read()))
+    texts = ["posting {}".format(i) for i in range(10)]
+    results = list(jobstruct.JobStructAI.extract_many(texts, FakeClient(), occupation=True, workers=4))
+    assert all(r.occupation == ["15-0000"] for r in results)
+    assert len(loads) == 1
+
+    loads.clear()
+    results = asyncio.run(jobstruct.JobStructAI.aextract_many(texts, AsyncFakeClient(), occupation=True))
+    assert all(r.occupation == ["15-0000"] for r in results)
+    assert len(loads) == 1
+
+
+def test_acreate():
+    client = AsyncFakeClient()
+    with open(DIR / "SDE_II.txt") as f:
+        text = f.read()
+    j = asyncio.run(jobstruct.JobStructAI.acreate(text, client, occupation=True, embedding=True))
+    assert j.to_dict() == jobstruct.JobStructAI(text, FakeClient(), occupation=True, embedding=True).to_dict()
+
+
+def test_aextract_many():
+    client = AsyncFakeClient()
+    texts = ["posting {}".format(i) for i in range(50)]
+    results = asyncio.run(jobstruct.JobStructAI.aextract_many(texts, client, concurrency=8))
+    assert len(results) == 50
+    assert all(r.job_title == SDE_II["job_title"] for r in results)
+    assert client.peak == 8
+
+
+def test_response_cache(tmp_path):
+    client = FakeClient()
+    cache = jobstruct.ResponseCache(tmp_path)
+    for _ in range(2):
+        j = jobstruct.JobStructAI.from_file(
+            DIR / "SDE_II.txt",
+            jobstruct.CachingClient(client, cache),
+            occupation=True,
+        )
+        assert j.occupation == ["15-0000"]
+    assert len(client.requests) == 2
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+    cache.close()
+
+    # Reopening with a tiny size limit evicts down to the limit.
+    cache = jobstruct.ResponseCache(tmp_path, max_size=100)
+    assert cache.size <= 100
+    cache.close()
+
+
+def test_occupation_classifier():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(3, 16))
+    labels = ["11-0000", "15-0000", "29-0000"]
+    y = rng.integers(0, 3, size=300)
+    X = centers[y] + 0.1 * rng.normal(size=(300, 16))
+    classifier = jobstruct.OccupationClassifier.fit(X, [[labels[i]] for i in y])
+    predicted, confidence = classifier.predict(X)
+    assert predicted == [labels[i] for i in y]
+    assert confidence.min() > 0.9
+
+    # Confident predictions skip the occupation prompt.
+    def handler(modelId, body):
+        if "inputText" in body:
+            return titan(centers[1].tolist())
+        return default_handler(modelId, body)
+    client = FakeClient(handler)
+    j = jobstruct.JobStructAI.from_file(DIR / "SDE_II.txt", client, occupation=classifier)
+    assert j.occupation == ["15-0000"]
+    assert j.embedding is None
+    assert len(client.requests) == 2
+
+    # Others fall back to it.
+    classifier.threshold = 1.01
+    client = AsyncFakeClient(handler)
+    j = asyncio.run(jobstruct.JobStructAI.acreate("text", client, occupation=classifier))
+    assert j.occupation == ["15-0000"]
+    assert len(client.requests) == 3
+
+
+def test_occupation_classifier_batches(monkeypatch):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(3, 16))
+    labels = ["11-0000", "15-0000", "29-0000"]
+    y = rng.integers(0, 3, size=300)
+    X = centers[y] + 0.1 * rng.normal(size=(300, 16))
+    classifier = jobstruct.OccupationClassifier.fit(X, [[labels[i]] for i in y])
+    classifier.threshold = 0.9
+    batches = []
+    predict = classifier.predict
+    monkeypatch.setattr(classifier, "predict", lambda X: batches.append(len(X)) or predict(X))
+    monkeypatch.setattr(jobstruct.JobStructAI, "predict_batch", 4)
+
+    # Odd postings embed between two occupations and fall back to the prompt.
+    def handler(modelId, body):
+        if "inputText" in body:
+            i = int(body["inputText"].split()[1])
+            return titan((centers[1] if i % 2 == 0 else (centers[0] + centers[2]) / 2).tolist())
+        prompt = body["messages"][0]["content"][0]["text"]
+        if "Standard Occupational Classification" in prompt:
+            return default_handler(modelId, body)
+        title = prompt.split("<text>\n")[1].split("\n</text>")[0]
+        return claude('{{"job_title": "{}"}}'.format(title))
+
+    texts = ["posting {}".format(i) for i in range(10)]
+    client = FakeClient(handler)
+    results = list(jobstruct.JobStructAI.extract_many(texts, client, occupation=classifier, workers=4))
+    assert [r.job_title for r in results] == texts
+    assert all(r.occupation == ["15-0000"] and r.embedding is None for r in results)
+    assert batches == [4, 4, 2]
+    assert sum("inputText" not in body for _, body in client.requests) == 10 + 5
+
+    batches.clear()
+    client = AsyncFakeClient(handler)
+    results = asyncio.run(jobstruct.JobStructAI.aextract_many(texts, client, occupation=classifier, embedding=True))
+    assert all(r.occupation == ["15-0000"] and len(r.embedding) == 16 for r in results)
+    assert batches == [10]
+    assert sum("inputText" not in body for _, body in client.requests) == 10 + 5
+
+
+def test_chunked_extract(tmp_path):
+    def handler(modelId, body):
+        prompt = body["messages"][0]["content"][0]["text"]
+        text = prompt.split("<text>\n")[1].split("\n</text>")[0]
+        if "BASIC QUALIFICATIONS" in text:
+            return claude(json.dumps({"required": {"experience": 3, "qualifications": ["Programming"]}, "salary": [115000]}))
+        return claude(json.dumps({"job_title": "SDE II", "details": ["Build runtimes"], "salary": [223600]}))
+
+    with resources.open_text("jobstruct.data", "prompt_configs.json") as f:
+        configs = json.load(f)
+    configs["extract"]["chunk_tokens"] = 200
+    config_file = tmp_path / "prompt_configs.json"
+    config_file.write_text(json.dumps(configs))
+
+    client = FakeClient(handler)
+    j = jobstruct.JobStructAI.from_file(DIR / "SDE_II.txt", client, config_file=config_file)
+    assert len(client.requests) > 1
+    assert all("chunk_tokens" not in body for _, body in client.requests)
+    assert j.job_title == "SDE II"
+    assert j.details == ["Build runtimes"]
+    assert j.required["experience"] == 3
+    assert j.required["qualifications"] == ["Programming"]
+    assert j.salary == [115000.0, 223600.0]
+
+    with open(DIR / "SDE_II.txt") as f:
+        text = f.read()
+    a = asyncio.run(jobstruct.JobStructAI.acreate(text, AsyncFakeClient(handler), config_file=config_file))
+    assert a.to_dict() == j.to_dict()
+
+
+def paged_handler(output, page_size):
+    """
+    Answer the `extract` prompt with `output` in pages of `page_size`
+    characters, continuing from the prefilled assistant message, if any.
+    """
+    def handler(modelId, body):
+        messages = body["messages"]
+        start = len(messages[1]["content"][0]["text"]) if len(messages) > 1 else 0
+        page = output[start:start + page_size]
+        stop_reason = "max_tokens" if start + page_size < len(output) else "end_turn"
+        return claude(page, stop_reason)
+    return handler
+
+
+def test_continuation(tmp_path):
+    fields = {k: v for k, v in SDE_II.items() if k not in ("skills", "occupation", "embedding")}
+    output = json.dumps(fields, indent=2)
+    page_size = len(output) // 3 + 1
+
+    client = FakeClient(paged_handler(output, page_size))
+    j = jobstruct.JobStructAI.from_file(DIR / "SDE_II.txt", client)
+    assert len(client.requests) == 3
+    assert client.requests[1][1]["messages"][1]["role"] == "assistant"
+    assert "max_continuations" not in client.requests[0][1]
+    assert j.details == SDE_II["details"]
+    assert j.remote == SDE_II["remote"]
+
+    a = asyncio.run(jobstruct.JobStructAI.acreate(
+        (DIR / "SDE_II.txt").read_text(),
+        AsyncFakeClient(paged_handler(output, page_size)),
+    ))
+    assert a.to_dict() == j.to_dict()
+
+    # Whitespace stripped from the prefill is kept, whether or not the model
+    # generates it again in the continuation.
+    spaced = '{"job_title": "Software   Development Engineer"}'
+    cut = spaced.index("Development")
+
+    def resuming_handler(modelId, body):
+        if len(body["messages"]) == 1:
+            return claude(spaced[:cut], "max_tokens")
+        return claude(spaced[cut:])
+
+    for handler in [resuming_handler, paged_handler(spaced, cut)]:
+        assert jobstruct.Prompts(FakeClient(handler)).invoke("extract", "text") == spaced
+        assert asyncio.run(jobstruct.Prompts(AsyncFakeClient(handler)).ainvoke("extract", "text")) == spaced
+
+    # Beyond the limit, the truncated output is parsed as far as it goes.
+    with resources.open_text("jobstruct.data", "prompt_configs.json") as f:
+        configs = json.load(f)
+    configs["extract"]["max_continuations"] = 1
+    config_file = tmp_path / "prompt_configs.json"
+    config_file.write_text(json.dumps(configs))
+    client = FakeClient(paged_handler(output, page_size))
+    j = jobstruct.JobStructAI.from_file(DIR / "SDE_II.txt", client, config_file=config_file)
+    assert len(client.requests) == 2
+    assert j.job_title == SDE_II["job_title"]
@@ -0,0 +1,85 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import importlib.util
+import jobstruct
+import json
+import pytest
+import random
+from fakes import DIR, FakeClient
+from legacy import LegacyJobStructHTML, legacy_html_text
+
+PARSERS = ["html.parser"] + [
+    parser
+    for parser, module in [("lxml", "lxml"), ("html5lib", "html5lib")]
+    if importlib.util.find_spec(module) is not None
+]
+
+
+def random_html(rng, depth=0):
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        choice = rng.random()
+        if choice < 0.4 and depth < 6:
+            tag = rng.choice(["div", "p", "h2", "span", "ul", "li", "b"])
+            parts.append("<{0}>{1}</{0}>".format(tag, random_html(rng, depth + 1)))
+        elif choice < 0.5:
+            parts.append(rng.choice([
+                "<!-- Benefits -->",
+                "<script>var x = 'Responsibilities';</script>",
+                "<br/>",
+                "\n  ",
+            ]))
+        else:
+            words = ["Benefits:", "Requirements", "duties", "we", "are", "an", "equal",
+                     "opportunity", "employer", "Python", "teams", "build", "Skills"]
+            parts.append(" ".join(rng.choice(words) for _ in range(rng.choice([1, 3, 5, 6, 12]))))
+    return "".join(parts)
+
+
+def test_segment_conformance():
+    assert jobstruct.JobStructHTML.default_parser == "html.parser"
+    html = open(DIR / "SDE_Amazon_Robotics.html").read()
+    assert (
+        jobstruct.JobStructHTML.from_string(html, "html.parser").to_dict()
+        == LegacyJobStructHTML.from_string(html, "html.parser").to_dict()
+    )
+
+    rng = random.Random(0)
+    for _ in range(300):
+        html = "<html><body>{}</body></html>".format(random_html(rng))
+        expected = LegacyJobStructHTML.from_string(html, "html.parser").to_dict()
+        assert jobstruct.JobStructHTML.from_string(html, "html.parser").to_dict() == expected, html
+        assert jobstruct.JobStructAI.html_text(html, "html.parser") == legacy_html_text(html), html
+
+
+def test_from_document():
+    document = jobstruct.HTMLDocument.from_file(DIR / "SDE_Amazon_Robotics.html")
+    j = jobstruct.JobStructHTML.from_document(document)
+    assert j.to_dict() == jobstruct.JobStructHTML.from_file(DIR / "SDE_Amazon_Robotics.html").to_dict()
+    assert j.qualifications is j.segments["qualifications"]
+
+    clients = [FakeClient(), FakeClient()]
+    jobstruct.JobStructAI.from_document(document, clients[0])
+    jobstruct.JobStructAI.from_html_file(DIR / "SDE_Amazon_Robotics.html", clients[1])
+    assert clients[0].requests == clients[1].requests
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_parser_conformance(parser):
+    with open(DIR / "SDE_Amazon_Robotics_JobStructHTML.json") as f:
+        expected = json.load(f)
+    html = open(DIR / "SDE_Amazon_Robotics.html").read()
+    assert jobstruct.JobStructHTML.from_string(html, parser).to_dict() == expected
+    assert jobstruct.JobStructAI.html_text(html, parser) == jobstruct.JobStructAI.html_text(html, "html.parser")
+
+
+def test_parser_fallback(caplog):
+    html = open(DIR / "SDE_Amazon_Robotics.html").read()
+    expected = jobstruct.JobStructHTML.from_string(html, "html.parser").to_dict()
+    assert jobstruct.JobStructHTML.from_string(html, "no-such-parser").to_dict() == expected
+    assert "no-such-parser" in caplog.text
+
+    parser = "lxml" if "lxml" in PARSERS else "html.parser"
+    assert jobstruct.JobStructHTML.parse(html, "auto").builder.NAME == parser
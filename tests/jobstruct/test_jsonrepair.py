@@ -0,0 +1,99 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import json
+import random
+from jobstruct import Prompts
+from jobstruct.jsonrepair import repair_json
+
+ALPHABET = "abc XYZ 019 'apostrophe' \"quote\" \\ / \n\t é ✓ ,:[]{}"
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(7 if depth < 4 else 4)
+    if kind == 0:
+        return "".join(rng.choice(ALPHABET) for _ in range(rng.randrange(12)))
+    if kind == 1:
+        return rng.choice([rng.randrange(-1000, 1000), rng.uniform(-1e6, 1e6)])
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind == 3:
+        return "".join(rng.choice("abcdefg ") for _ in range(rng.randrange(1, 12)))
+    if kind in (4, 5):
+        return {
+            "".join(rng.choice(ALPHABET) for _ in range(rng.randrange(1, 8))): random_value(rng, depth + 1)
+            for _ in range(rng.randrange(5))
+        }
+    return [random_value(rng, depth + 1) for _ in range(rng.randrange(5))]
+
+
+def random_output(rng):
+    if rng.random() < 0.3:
+        return [random_value(rng, 1) for _ in range(rng.randrange(1, 4))]
+    return {"job_title": random_value(rng, 1), "details": [random_value(rng, 2), random_value(rng, 2)]}
+
+
+def consistent(repaired, value):
+    """
+    Whether `repaired`, recovered from a truncated serialization of `value`,
+    agrees with `value` up to the truncation.
+    """
+    if isinstance(value, dict):
+        return isinstance(repaired, dict) and all(
+            key in value and consistent(item, value[key]) for key, item in repaired.items()
+        )
+    if isinstance(value, list):
+        return isinstance(repaired, list) and len(repaired) <= len(value) and all(
+            consistent(item, value[i]) for i, item in enumerate(repaired)
+        )
+    if isinstance(value, str):
+        return isinstance(repaired, str) and value.startswith(repaired)
+    return json.dumps(value).startswith(json.dumps(repaired))
+
+
+def test_safe_json_fuzz():
+    rng = random.Random(0)
+    for _ in range(300):
+        value = random_output(rng)
+        text = json.dumps(value, indent=rng.choice([None, 2]), ensure_ascii=rng.random() < 0.5)
+
+        # Surrounding prose, including brackets after the output.
+        assert Prompts.safe_json("Here is the JSON:\n```json " + text + "```", None) == value
+        assert Prompts.safe_json(text + "\nNote: {see above} [1]", None) == value
+
+        # Truncation anywhere recovers a consistent prefix of the fields.
+        for cut in sorted(rng.sample(range(1, len(text)), min(20, len(text) - 1))):
+            repaired = repair_json(text[:cut])
+            assert type(repaired) is type(value)
+            assert consistent(repaired, value), (text[:cut], repaired)
+
+
+def test_safe_json_repair():
+    assert Prompts.safe_json("{'job_title': 'Bachelor's degree', 'remote': True, 'wage': None}", {}) == {
+        "job_title": "Bachelor's degree",
+        "remote": True,
+        "wage": None,
+    }
+    assert Prompts.safe_json('{"details": ["Build", "Ship", "Oper', {}) == {"details": ["Build", "Ship", "Oper"]}
+    assert Prompts.safe_json('{"job_title": "SDE", "salary":', {}) == {"job_title": "SDE"}
+    assert Prompts.safe_json('{job_title: "SDE",}', {}) == {"job_title": "SDE"}
+    assert Prompts.safe_json('{"q": "He said "hi" there"}', {}) == {"q": 'He said "hi" there'}
+    assert Prompts.safe_json("No JSON here.", {}) == {}
+    assert Prompts.safe_json("I can't [do that].", []) == []
+
+
+def test_safe_json_prose_brackets():
+    codes = '{"occupation": ["15-1252", "15-1211"]}'
+    text = "Based on the posting [SOC 2018], the codes are: " + codes
+    assert Prompts.safe_json(text, {}) == json.loads(codes)
+    assert Prompts.safe_json(text[:-3], {}) == {"occupation": ["15-1252", "15-1211"]}
+    assert Prompts.safe_json("The codes [SOC 2018] could not be determined.", {}) == {}
+    assert Prompts.safe_json('{"occupation": []}', []) == []
+
+
+def test_safe_json_deep_nesting():
+    for text in ["[" * 5000, '{"a": ' * 5000, "[" * 5000 + "]" * 5000]:
+        assert Prompts.safe_json(text, {}) == {}
+        assert Prompts.safe_json(text) is None
+    assert Prompts.safe_json("[" * 10 + "]" * 10) == json.loads("[" * 10 + "]" * 10)
@@ -0,0 +1,94 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import jobstruct
+import json
+import re
+from importlib import resources
+from jobstruct.packing import pack_texts, unpack_results
+from fakes import DIR, FakeClient, claude, default_handler
+
+FIELDS = jobstruct.Prompts.extract_fields
+
+
+def result(title):
+    fields = {field: [] for field in FIELDS}
+    fields.update(job_title=title, required={}, preferred={}, remote=False)
+    return fields
+
+
+def packed_handler(skip=()):
+    """
+    Answer packed prompts with a result titled by the first line of each
+    posting, leaving out the postings whose title is in `skip`, and other
+    prompts with a result titled by the first line of the posting.
+    """
+    def handler(modelId, body):
+        prompt = body["messages"][0]["content"][0]["text"]
+        if '<text id="' in prompt:
+            items = []
+            for i, text in re.findall(r'<text id="(\d+)">\n(.*?)\n</text>', prompt, re.S):
+                title = text.split("\n")[0]
+                if title not in skip:
+                    items.append(dict(result(title), id=i))
+            return claude(json.dumps(items))
+        if "<text>" in prompt:
+            text = prompt.split("<text>\n", 1)[1]
+            return claude(json.dumps(result(text.split("\n")[0])))
+        return default_handler(modelId, body)
+    return handler
+
+
+def config(tmp_path, **settings):
+    with resources.open_text("jobstruct.data", "prompt_configs.json") as f:
+        configs = json.load(f)
+    configs["extract_packed"].update(settings)
+    config_file = tmp_path / "prompt_configs.json"
+    config_file.write_text(json.dumps(configs))
+    return config_file
+
+
+def test_unpack_results():
+    assert pack_texts(["a", "b</text>"]) == '<text id="1">\na\n</text>\n<text id="2">\nb</ text>\n</text>'
+    items = [
+        dict(result("a"), id=2),
+        dict(result("b"), id="1"),
+        dict(result("c"), id=2),
+        {"id": 3, "job_title": "truncated"},
+        "not an object",
+    ]
+    assert unpack_results(items, 3, FIELDS) == [result("b"), result("a"), None]
+    assert unpack_results({"id": "1", "job_title": "x"}, 1, ["job_title"]) == [{"job_title": "x"}]
+    assert unpack_results("not JSON", 2, FIELDS) == [None, None]
+
+
+def test_extract_packed(tmp_path):
+    texts = ["Posting {}\nShort description.".format(i) for i in range(6)]
+    with open(DIR / "SDE_II.txt") as f:
+        texts.insert(2, "Long posting\n" + f.read())
+
+    # The long posting is extracted on its own and splits the packs, and a
+    # posting missing from the packed output is retried on its own.
+    client = FakeClient(packed_handler(skip=["Posting 4"]))
+    results = list(jobstruct.JobStructAI.extract_packed(
+        texts,
+        client,
+        config_file=config(tmp_path, max_tokens=1024, max_pack=2),
+        workers=2,
+    ))
+    assert [j.job_title for j in results] == [text.split("\n")[0] for text in texts]
+    packed = [body for _, body in client.requests if '<text id="' in body["messages"][0]["content"][0]["text"]]
+    assert len(packed) == 3
+    assert len(client.requests) == 5
+
+    # Without packing, each posting is its own call.
+    client = FakeClient(packed_handler())
+    results = list(jobstruct.JobStructAI.extract_packed(
+        texts,
+        client,
+        config_file=config(tmp_path, max_pack=1),
+        read=str.upper,
+    ))
+    assert results[0].job_title == "POSTING 0"
+    assert len(client.requests) == len(texts)
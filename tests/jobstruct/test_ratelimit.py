@@ -0,0 +1,158 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import jobstruct
+import pytest
+from botocore.exceptions import ClientError
+from fakes import FakeClient, default_handler
+
+LIMITS = {
+    "default": {
+        "requests_per_minute": 600,
+        "tokens_per_minute": 10 ** 9,
+        "initial_concurrency": 4,
+        "max_concurrency": 16,
+    }
+}
+
+
+class Clock:
+    """
+    Fake monotonic clock that advances when slept on.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def throttle(code="ThrottlingException"):
+    return ClientError({"Error": {"Code": code, "Message": ""}}, "InvokeModel")
+
+
+def throttling_handler(clock, per_minute):
+    """
+    Stub handler that throttles any request beyond `per_minute` requests
+    in a sliding one-minute window.
+    """
+    accepted = []
+
+    def handler(modelId, body):
+        window = [t for t in accepted if t > clock() - 60]
+        if len(window) >= per_minute:
+            return throttle()
+        accepted.append(clock())
+        return default_handler(modelId, body)
+
+    return handler
+
+
+def test_token_bucket():
+    clock = Clock()
+    bucket = jobstruct.ratelimit.TokenBucket(60, clock=clock)
+    for _ in range(120):
+        clock.sleep(bucket.reserve(1))
+    assert clock() == pytest.approx(60.0)
+
+
+def test_token_bucket_adapts():
+    clock = Clock()
+    bucket = jobstruct.ratelimit.TokenBucket(60, maximum=90, clock=clock)
+    bucket.throttled()
+    bucket.throttled()
+    assert bucket.rate * 60 == 30
+    clock.sleep(1)
+    bucket.throttled()
+    assert bucket.rate * 60 == 15
+
+    # Sustained success while the bucket is limiting probes upward.
+    bucket = jobstruct.ratelimit.TokenBucket(60, maximum=90, clock=clock)
+    for _ in range(60):
+        clock.sleep(bucket.reserve(1))
+        bucket.succeeded(1)
+    assert bucket.rate * 60 < 61
+    for _ in range(60):
+        clock.sleep(bucket.reserve(1))
+        bucket.succeeded(1)
+    assert 65 < bucket.rate * 60 < 70
+    for _ in range(2000):
+        clock.sleep(bucket.reserve(1))
+        bucket.succeeded(1)
+    assert bucket.rate * 60 == 90
+
+
+def test_governor_retries_throttles():
+    clock = Clock()
+    governor = jobstruct.RateGovernor(
+        LIMITS,
+        max_attempts=10,
+        clock=clock,
+        sleep=clock.sleep,
+        jitter=lambda: 0.5,
+    )
+    client = jobstruct.GovernedClient(FakeClient(throttling_handler(clock, 20)), governor)
+    prompts = jobstruct.Prompts(client)
+    for _ in range(50):
+        assert prompts.invoke("occupation", "text") == '{"occupation": ["15-0000"]}'
+    assert governor.throttles > 0
+    assert governor.retries == governor.throttles
+    # 50 requests at 20 per minute need at least two minutes.
+    assert clock() >= 120
+    # The request rate backed off from the limit of 600 per minute.
+    assert max(governor.stats()["requests_per_minute"].values()) < 600
+
+
+def test_governor_refunds_retries():
+    def tokens(failures):
+        clock = Clock()
+        governor = jobstruct.RateGovernor(LIMITS, clock=clock, sleep=lambda seconds: None)
+        responses = iter([throttle()] * failures)
+        client = jobstruct.GovernedClient(
+            FakeClient(lambda modelId, body: next(responses, None) or default_handler(modelId, body)),
+            governor,
+        )
+        jobstruct.Prompts(client).invoke("occupation", "text")
+        assert governor.retries == failures
+        return sum(state["tokens"].tokens for state in governor.models.values())
+
+    # Failed attempts do not use up tokens.
+    assert tokens(3) == tokens(0)
+
+
+def test_aimd_limiter():
+    clock = Clock()
+    limiter = jobstruct.ratelimit.AIMDLimiter(8, maximum=16, clock=clock)
+    for _ in range(2):
+        limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+    clock.sleep(1)
+    for _ in range(4 + 5):
+        limiter.acquire()
+        limiter.release()
+    assert int(limiter.limit) == 5
+
+
+def test_governor_gives_up():
+    clock = Clock()
+    governor = jobstruct.RateGovernor(LIMITS, max_attempts=3, clock=clock, sleep=clock.sleep)
+    client = jobstruct.GovernedClient(FakeClient(lambda modelId, body: throttle()), governor)
+    with pytest.raises(ClientError):
+        jobstruct.Prompts(client).invoke("occupation", "text")
+    assert governor.throttles == 3
+
+    # Errors that are not retryable propagate immediately.
+    client = jobstruct.GovernedClient(
+        FakeClient(lambda modelId, body: throttle("ValidationException")),
+        governor,
+    )
+    with pytest.raises(ClientError):
+        jobstruct.Prompts(client).invoke("occupation", "text")
+    assert governor.retries == 2
@@ -0,0 +1,104 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import jobstruct
+import json
+from importlib import resources
+from fakes import DIR, SDE_II, FakeClient, default_handler
+
+
+def test_rule_extractor():
+    rules = jobstruct.RuleExtractor()
+    with open(DIR / "SDE_II.txt") as f:
+        assert rules.fill(f.read()) == {"salary": SDE_II["salary"]}
+
+    assert rules.fill("Pay: $18.50 - $22 per hour. Part-time, work from home.") == {
+        "wage": [18.5, 22.0],
+        "full_time": False,
+        "remote": True,
+    }
+    assert rules.fill("Job Title: Data Analyst\nSalary $120-150k annually, full time, on-site only.") == {
+        "job_title": "Data Analyst",
+        "salary": [120000.0, 150000.0],
+        "full_time": True,
+        "remote": False,
+    }
+
+    # Ambiguous values have low confidence.
+    found = rules.extract("We pay $55,000. Remote sensing experience. Full-time or part-time.")
+    assert found["salary"] == ([55000.0], 0.7)
+    assert found["remote"] == (True, 0.5)
+    assert "full_time" not in found
+    assert rules.fill("We pay $55,000. Remote sensing experience.") == {}
+
+
+def test_rule_extractor_pitfalls():
+    rules = jobstruct.RuleExtractor()
+
+    # Labeled values that are not shaped like titles.
+    assert rules.fill("Position: Full-time") == {"full_time": True}
+    assert rules.fill("Role: Lead the migration of our services to the cloud") == {}
+    assert rules.fill("Title: Senior Director of Data & Analytics") == {"job_title": "Senior Director of Data & Analytics"}
+
+    # Ranges take precedence, and bonuses and stipends are not pay.
+    assert rules.fill("$120,000 - $150,000 per year. Sign-on bonus up to $20,000 a year.") == {"salary": [120000.0, 150000.0]}
+    assert rules.fill("Salary: $90,000 per year. Salary: $120,000 - $150,000 per year.") == {"salary": [120000.0, 150000.0]}
+    assert rules.fill("Pay: $18.50/hour, plus a $500 annual stipend.") == {"wage": [18.5]}
+    assert rules.fill("Our 45,000 employees manage $300 in assets each.") == {}
+
+    # Conflicting ranges have low confidence.
+    found = rules.extract("Pay is $100,000-$120,000 a year in NY. Pay is $90,000-$110,000 a year elsewhere.")
+    assert found["salary"] == ([100000.0, 120000.0], 0.6)
+
+    # Negated remote phrases.
+    assert rules.fill("Remote work is not available for this role.") == {"remote": False}
+    assert rules.fill("This is a non-remote position.") == {"remote": False}
+
+
+def config(tmp_path, **settings):
+    with resources.open_text("jobstruct.data", "prompt_configs.json") as f:
+        configs = json.load(f)
+    configs["extract"].update(settings)
+    config_file = tmp_path / "prompt_configs.json"
+    config_file.write_text(json.dumps(configs))
+    return config_file
+
+
+def test_rules_fast_path(tmp_path):
+    stats = jobstruct.RuleStats()
+
+    # Rule-based fields are left out of the prompt's schema.
+    client = FakeClient()
+    j = jobstruct.JobStructAI.from_file(DIR / "SDE_II.txt", client, config_file=config(tmp_path, rules_confidence=0.8))
+    prompt = client.requests[0][1]["messages"][0]["content"][0]["text"]
+    assert "'salary':" not in prompt and "'wage':" in prompt
+    assert j.rule_fields == ["salary"]
+    assert j.salary == SDE_II["salary"]
+    assert j.details == SDE_II["details"]
+    stats.add(j.rule_fields, j.extract_calls)
+
+    # The prompt is skipped if rules fill all the requested fields.
+    client = FakeClient()
+    text = "Job Title: Data Analyst\nSalary $120-150k annually, full time, on-site only."
+    j = jobstruct.JobStructAI(text, client, config_file=config(tmp_path, rules_confidence=0.8, fields=["salary", "remote"]))
+    assert client.requests == []
+    assert j.salary == [120000.0, 150000.0]
+    assert j.remote is False
+    assert j.details == []
+    stats.add(j.rule_fields, j.extract_calls)
+
+    # Without rules, fields that are not requested are left empty.
+    client = FakeClient(default_handler)
+    j = jobstruct.JobStructAI(text, client, config_file=config(tmp_path, fields=["job_title"]))
+    assert len(client.requests) == 1
+    assert j.job_title == SDE_II["job_title"]
+    assert j.details == []
+    stats.add(j.rule_fields, j.extract_calls)
+
+    assert stats.summary() == {
+        "postings": 3,
+        "fields_filled": 3 / 15,
+        "calls_avoided": 1 / 3,
+        "calls_reduced": 1 / 3,
+    }
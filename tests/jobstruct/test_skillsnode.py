@@ -0,0 +1,107 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import jobstruct
+import json
+import pytest
+from importlib import resources
+
+
+def normalize(tree):
+    # The tree dict that the original recursive implementation returned.
+    children = tree.get("children", [])
+    if isinstance(children, dict):
+        children = [children]
+    return {
+        "name": tree["name"],
+        "children": [normalize(child) for child in children],
+        "attributes": tree.get("attributes", {}),
+    }
+
+
+def outline(tree, level=0):
+    lines = ["|{} {}".format("-" * level, tree["name"])]
+    for child in tree["children"]:
+        lines.extend(outline(child, level + 1))
+    return lines
+
+
+def test_round_trip():
+    with resources.open_text("jobstruct.data", "onet_taxonomy_renamed.json") as f:
+        tree = json.load(f)
+    root = jobstruct.SkillsNode.from_tree_dict(tree)
+    expected = normalize(tree)
+    assert root.to_tree_dict(attributes=True) == expected
+    assert root.to_tree_string() == "\n".join(outline(expected))
+    assert len(root.names()) == len(root.nodes()) == len(root.tree)
+    assert [leaf.name for leaf in root.leaves()] == [
+        node.name for node in root.nodes() if not node.children
+    ]
+
+    child = root.children[1]
+    assert child.parent == root and not child.root and root.root
+    assert child.to_tree_dict() == {
+        "name": expected["children"][1]["name"],
+        "children": [
+            {"name": c["name"], "children": [{"name": g["name"], "children": []} for g in c["children"]]}
+            for c in expected["children"][1]["children"]
+        ],
+    }
+
+
+def test_deep_tree():
+    tree = {"name": "0", "children": []}
+    node = tree
+    for i in range(1, 100000):
+        node["children"] = [{"name": str(i)}]
+        node = node["children"][0]
+    root = jobstruct.SkillsNode.from_tree_dict(tree)
+    assert len(root.names()) == 100000
+    assert root.leaves()[0].name == "99999"
+    assert root.tree.depths().max() == 99999
+
+
+def test_add_child_and_attributes():
+    root = jobstruct.SkillsNode("Skills")
+    writing = root.add_child(jobstruct.SkillsNode("Writing", {"code": 1}))
+    other = jobstruct.SkillsNode.from_tree_dict({"name": "Math", "children": [{"name": "Algebra"}]})
+    math = root.add_child(other)
+    assert math is other and math.tree is root.tree
+    assert root.names() == ["Skills", "Writing", "Math", "Algebra"]
+
+    # Attributes are written through to the columns of the tree.
+    math.attributes["terminal"] = True
+    assert math.attributes == {"terminal": True}
+    assert json.dumps(math.attributes) == '{"terminal": true}'
+    assert writing.attributes == {"code": 1}
+    del writing.attributes["code"]
+    assert root.to_tree_dict(attributes=True)["children"][0]["attributes"] == {}
+    assert root.children[0].attributes.setdefault("code", 2) == 2
+    writing.attributes = {"terminal": 1}
+    assert writing.attributes == {"terminal": 1} and type(writing.attributes["terminal"]) is int
+    assert math.attributes == {"terminal": True}
+    leaves = root.leaves()
+    assert [leaf.name for leaf in leaves] == ["Writing", "Algebra"]
+    assert leaves[1:] == [math.children[0]] and leaves.indices.tolist() == [1, 3]
+
+    # Children are a new list on each access, and appending adds a child.
+    algebra = math.children[0]
+    math.children.append(jobstruct.SkillsNode("Geometry"))
+    assert [child.name for child in math.children] == ["Algebra", "Geometry"]
+    with pytest.raises(TypeError):
+        math.children.insert(0, jobstruct.SkillsNode("Calculus"))
+    math.children.remove(algebra)
+    assert root.names() == ["Skills", "Writing", "Math", "Geometry"]
+    math.add_child(algebra)
+    math.children[0].remove()
+
+    # Moving a node within the tree.
+    math.add_child(writing)
+    assert root.names() == ["Skills", "Math", "Algebra", "Writing"]
+    with pytest.raises(ValueError):
+        writing.add_child(root)
+
+    copy = root.copy(keep={root, math, writing})
+    assert copy.names() == ["Skills", "Math", "Writing"]
+    assert copy.to_tree_dict(attributes=True)["children"][0]["attributes"] == {"terminal": True}
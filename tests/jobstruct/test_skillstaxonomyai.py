@@ -0,0 +1,194 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# Copyright National Association of State Workforce Agencies. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+
+import asyncio
+import functools
+import jobstruct
+import jobstruct.checkpoint
+import json
+import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fakes import DIR, AsyncFakeClient, FakeClient, claude
+
+
+def test_prompt_text():
+    skills = jobstruct.SkillsTaxonomyAI()
+    assert skills.prompt_text("json") == json.dumps(skills.to_dict())
+    assert json.loads(skills.prompt_text("names")) == skills.root.names()
+    tokens = {f: skills.prompt_tokens(f) for f in skills.prompt_formats}
+    assert tokens["outline"] < tokens["json"]
+    assert tokens["names"] < tokens["json"]
+
+    # The original serialization is the default.
+    assert skills.prompt_text() == skills.prompt_text("json")
+
+    # The memoized serialization is invalidated when the tree changes.
+    skills = jobstruct.SkillsTaxonomyAI(prompt_format="outline")
+    text = skills.prompt_text()
+    assert skills.prompt_text() is text
+    node = skills.root.add_child(jobstruct.SkillsNode("Juggling"))
+    assert skills.prompt_text().endswith("Juggling")
+    node.remove()
+    assert skills.prompt_text() == text
+
+
+def test_candidates():
+    skills = jobstruct.SkillsTaxonomyAI()
+    skills.build_index(jobstruct.HashingEmbedder(), top_k=5)
+    text = "Strong critical thinking and written communication"
+    assert skills.candidates(text)[0].name == "Critical Thinking"
+    outline = skills.prompt_text("outline", query=text)
+    assert outline.startswith("| Skills\n")
+    assert len(outline.split("\n")) == 6
+    assert skills.prompt_tokens(query=text) < skills.prompt_tokens()
+
+    # The restricted tree keeps the candidates and their ancestors in order.
+    nodes = skills.candidates(text)
+    keep = set()
+    for node in nodes:
+        while node is not None:
+            keep.add(node)
+            node = node.parent
+    assert skills._restrict(nodes).to_tree_dict() == skills.root.copy(keep).to_tree_dict()
+
+    # Concurrent postings rebuild the index once after the tree changed.
+    builds = []
+
+    def embedder(texts):
+        builds.append(len(texts))
+        time.sleep(0.01 * (len(texts) > 1))
+        return jobstruct.HashingEmbedder()(texts)
+
+    skills.build_index(embedder, top_k=5)
+    skills.invalidate()
+    builds.clear()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(skills.candidates, [text] * 16))
+    assert len([size for size in builds if size > 1]) == 1
+
+
+def test_candidates_reuse_embedding():
+    skills = jobstruct.SkillsTaxonomyAI()
+    skills.build_index(jobstruct.BedrockEmbedder(FakeClient()), top_k=5)
+
+    # The posting's embedding is the retrieval query, without another call.
+    client = FakeClient()
+    j = jobstruct.JobStructAI.from_file(DIR / "SDE_II.txt", client, skills, embedding=True)
+    assert [body.get("inputText") for _, body in client.requests].count(j._summary()) == 1
+
+    client = AsyncFakeClient()
+    asyncio.run(jobstruct.JobStructAI.acreate((DIR / "SDE_II.txt").read_text(), client, skills, embedding=True))
+    assert sum("inputText" in body for _, body in client.requests) == 1
+
+
+def enrich_handler(modelId, body):
+    """
+    Expand each leaf into two children, except leaves named "Duplicate",
+    which expand to an existing skill.
+    """
+    prompt = body["messages"][0]["content"][0]["text"]
+    query = json.loads(prompt.split("<tree>\n")[1].split("\n</tree>")[0])
+    leaf = query["children"]["name"]
+    if leaf == "Duplicate":
+        children = [{"name": "Writing"}]
+    else:
+        children = [{"name": leaf + " A"}, {"name": leaf + " B"}, {"name": "Other Skills"}]
+    query["children"]["children"] = children
+    return claude("<tree>" + json.dumps(query) + "</tree>")
+
+
+def test_enrich():
+    tree = {"name": "Skills", "children": [{"name": "Writing"}, {"name": "Duplicate"}, {"name": "Math"}]}
+
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    skills.enrich(FakeClient(enrich_handler))
+    assert [node.name for node in skills.root.leaves()] == ["Writing A", "Writing B", "Writing", "Math A", "Math B"]
+    assert skills.root.children[1].children[0].attributes["terminal"]
+
+    # Terminal nodes are skipped, and concurrent rounds merge deterministically.
+    client = FakeClient(enrich_handler)
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    skills.enrich(client, workers=4, rounds=2)
+    assert len(client.requests) == 3 + 4
+    serial = jobstruct.SkillsTaxonomyAI(tree)
+    serial.enrich(FakeClient(enrich_handler), rounds=2)
+    assert skills.to_dict() == serial.to_dict()
+
+    # Budgets
+    client = FakeClient(enrich_handler)
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    skills.enrich(client, rounds=5, max_depth=3)
+    assert len(client.requests) == 3 + 4
+    assert max(depth for _, depth in skills._leaves()) == 3
+
+    client = FakeClient(enrich_handler)
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    skills.enrich(client, rounds=5, max_calls=2)
+    assert len(client.requests) == 2
+
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    skills.enrich(FakeClient(enrich_handler), rounds=5, max_nodes=8)
+    assert len(skills.root.nodes()) == 8
+
+
+def test_index():
+    tree = {"name": "Skills", "children": [{"name": "Writing"}, {"name": "Duplicate"}, {"name": "Math"}]}
+
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    skills.enrich(FakeClient(enrich_handler))
+    assert set(skills.names) == set(skills.root.names())
+    [node] = skills.find("Math A")
+    assert skills.path(node) == ["Skills", "Math", "Math A"]
+    assert skills.find("math  a") == []
+    assert skills.find("math  a", normalized=True) == [node]
+    assert skills.validate(["Math A", " MATH a", "Cooking"]) == ["Math A", "Math A", None]
+
+    # Removed subtrees leave the index, and re-added subtrees rejoin it.
+    math = node.parent
+    math.remove()
+    assert "Math" not in skills.names and "Math A" not in skills.names
+    assert set(skills.names) == set(skills.root.names())
+    skills.root.children[0].add_child(math)
+    assert skills.path(node) == ["Skills", "Writing", "Math", "Math A"]
+    assert set(skills.names) == set(skills.root.names())
+
+
+@pytest.mark.parametrize("compact_every", [1000, 2])
+def test_enrich_resume(monkeypatch, tmp_path, compact_every):
+    monkeypatch.setattr(
+        jobstruct.skillstaxonomyai,
+        "EnrichCheckpoint",
+        functools.partial(jobstruct.checkpoint.EnrichCheckpoint, compact_every=compact_every),
+    )
+    # Siblings with the same name are replayed onto the right node.
+    tree = {"name": "Skills", "children": [{"name": "Writing"}, {"name": "Duplicate"}, {"name": "Math"}, {"name": "Math"}]}
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+
+    expected = jobstruct.SkillsTaxonomyAI(tree)
+    expected.enrich(FakeClient(enrich_handler), rounds=2)
+
+    # Crash partway through the second round.
+    def crashing_handler(modelId, body):
+        if len(client.requests) == 5:
+            return RuntimeError("crash")
+        return enrich_handler(modelId, body)
+
+    client = FakeClient(crashing_handler)
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    with pytest.raises(RuntimeError):
+        skills.enrich(client, rounds=2, checkpoint=checkpoint)
+
+    client = FakeClient(enrich_handler)
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    skills.enrich(client, rounds=2, checkpoint=checkpoint, resume=True)
+    assert len(client.requests) == 4
+    assert skills.to_dict() == expected.to_dict()
+
+    # A completed checkpoint resumes with the next round.
+    client = FakeClient(enrich_handler)
+    skills = jobstruct.SkillsTaxonomyAI(tree)
+    skills.enrich(client, rounds=2, checkpoint=checkpoint, resume=True)
+    assert not client.requests
+    assert skills.to_dict() == expected.to_dict()